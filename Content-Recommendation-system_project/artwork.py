@@ -0,0 +1,82 @@
+import os
+import re
+
+# Inside the app's static/ folder (next to app.py, wherever it is launched from), so the
+# thumbnails are served from the app's own origin
+DEFAULT_ARTWORK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'artwork')
+
+# Thumbnail edges in pixels: cards are about 300px wide, the small one is for narrow screens
+THUMB_SIZES = (160, 320)
+
+CONTENT_TYPES = {'.webp': 'image/webp', '.jpg': 'image/jpeg'}
+# <first two hex digits of the key>/<key>-<size>.<ext>, as stored on disk
+THUMB_PATH = re.compile(r'^([0-9a-f]{2})/\1[0-9a-f]{30}-\d+\.(webp|jpg)$')
+
+# Thumbnails are named after their content, so browsers may keep them forever
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Base URL browsers load thumbnails from, when they should not come from the app's
+# static route or the service's /artwork route (e.g. a CDN in front of the directory)
+ARTWORK_URL_ENV = 'EMOTIFY_ARTWORK_URL'
+# Where the app serves DEFAULT_ARTWORK_DIR: serve.py's artwork route, else Streamlit's
+# static route (server.enableStaticServing, without cache headers). Relative, so it
+# resolves against whatever host and base path the page was loaded from
+STATIC_ARTWORK_URL = 'app/static/artwork'
+
+
+def thumbnail_name(key, size):
+    stem, extension = os.path.splitext(key)
+    return f"{stem}-{size}{extension}"
+
+
+def thumbnail_path(name):
+    # Path of a thumbnail below the artwork root, which is also its path below the base URL
+    return f"{name[:2]}/{name}"
+
+
+def thumbnail_srcset(base_url, key, sizes=THUMB_SIZES):
+    # (src, srcset) for an <img>: the largest thumbnail, plus every size for the browser to pick
+    urls = [(f"{base_url}/{thumbnail_path(thumbnail_name(key, size))}", size) for size in sizes]
+    return urls[-1][0], ', '.join(f"{url} {size}w" for url, size in urls)
+
+
+# --- SERVING ---
+def artwork_response(root, path, if_none_match=None):
+    """
+    (status, headers, body) answering a GET for the thumbnail at `path` (as made by
+    thumbnail_path) below `root`, with long-lived cache headers, or None when there
+    is no such thumbnail.
+    """
+    if not THUMB_PATH.match(path):
+        return None
+    name = path.split('/')[1]
+    headers = {'ETag': f'"{name}"', 'Cache-Control': CACHE_CONTROL}
+    if if_none_match == headers['ETag']:
+        # Content-addressed: the same name always means the same bytes
+        return 304, headers, b''
+    try:
+        with open(os.path.join(root, path), 'rb') as f:
+            body = f.read()
+    except FileNotFoundError:
+        return None
+    headers['Content-Type'] = CONTENT_TYPES[os.path.splitext(name)[1]]
+    headers['Content-Length'] = str(len(body))
+    return 200, headers, body
+
+
+def send_artwork(handler, root, path):
+    """
+    Answer a GET for the thumbnail at `path` on a BaseHTTPRequestHandler (see
+    artwork_response). Returns False (nothing sent) when there is no such thumbnail.
+    """
+    found = artwork_response(root, path, handler.headers.get('If-None-Match'))
+    if found is None:
+        return False
+    status, headers, body = found
+    handler.send_response(status)
+    for key, value in headers.items():
+        handler.send_header(key, value)
+    handler.end_headers()
+    handler.wfile.write(body)
+    return True
+
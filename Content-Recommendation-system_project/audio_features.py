@@ -0,0 +1,260 @@
+import io
+import multiprocessing
+import os
+import subprocess
+import wave
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from functools import lru_cache
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from crawler import Crawler, MAX_CONSECUTIVE_FAILURES
+from metrics import incr
+from ttl_cache import TTLCache
+
+# Per-track results, so an interrupted extraction resumes (features never go stale)
+DEFAULT_AUDIO_CACHE_PATH = os.path.join('data', 'audio_features.sqlite')
+
+# Previews are AAC; anything but WAV is decoded by piping it through ffmpeg
+FFMPEG = os.environ.get('FFMPEG', 'ffmpeg')
+
+# Clips are analysed as mono at this rate; 11 kHz of bandwidth covers pitch and timbre
+SAMPLE_RATE = 22050
+FRAME_SIZE = 2048
+HOP_SIZE = 512
+
+# Frames quieter than this RMS are left out of the spectral centroid
+SILENCE_RMS = 1e-3
+
+# Tempo search range (beats per minute), and the centre of the one-octave-wide
+# log-normal prior that picks the beat over its multiples
+MIN_BPM, MAX_BPM = 60, 200
+TEMPO_PRIOR_BPM = 120
+
+PITCH_CLASSES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+FEATURE_NAMES = (['rms_mean', 'rms_std', 'centroid_mean', 'centroid_std', 'tempo'] +
+                 [f'chroma_{p}' for p in PITCH_CLASSES])
+N_FEATURES = len(FEATURE_NAMES)
+
+
+class DecoderUnavailable(Exception):
+    pass
+
+
+# --- DECODING ---
+def resample(samples, rate, sample_rate=SAMPLE_RATE):
+    if rate == sample_rate or not len(samples):
+        return samples
+    # Linear interpolation is plenty for frame-level statistics
+    n = int(len(samples) * sample_rate / rate)
+    return np.interp(np.arange(n) * (rate / sample_rate), np.arange(len(samples)), samples).astype(np.float32)
+
+
+def decode_wav(data, sample_rate=SAMPLE_RATE):
+    with wave.open(io.BytesIO(data)) as clip:
+        width, channels, rate = clip.getsampwidth(), clip.getnchannels(), clip.getframerate()
+        raw = clip.readframes(clip.getnframes())
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width in (2, 4):
+        dtype = np.int16 if width == 2 else np.int32
+        samples = np.frombuffer(raw, dtype=dtype).astype(np.float32) / np.iinfo(dtype).max
+    else:
+        raise ValueError(f"unsupported WAV sample width {width}")
+    samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+    return resample(samples, rate, sample_rate)
+
+
+def decode_clip(data, sample_rate=SAMPLE_RATE):
+    """
+    Mono float32 samples at `sample_rate` from an encoded clip. Raises ValueError for
+    data that can't be decoded and DecoderUnavailable when ffmpeg is needed but missing.
+    """
+    if data[:4] == b'RIFF' and data[8:12] == b'WAVE':
+        try:
+            return decode_wav(data, sample_rate)
+        except (wave.Error, EOFError) as e:
+            raise ValueError(f"bad WAV data: {e}")
+    try:
+        result = subprocess.run([FFMPEG, '-v', 'error', '-i', 'pipe:0', '-f', 'f32le', '-ac', '1',
+                                 '-ar', str(sample_rate), 'pipe:1'],
+                                input=data, capture_output=True, timeout=120)
+    except FileNotFoundError:
+        raise DecoderUnavailable(f"{FFMPEG} not found; install ffmpeg to decode previews")
+    if result.returncode != 0:
+        raise ValueError(result.stderr.decode('utf-8', 'replace').strip() or 'ffmpeg failed')
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+
+# --- FEATURES ---
+@lru_cache(maxsize=4)
+def spectral_tables(sample_rate=SAMPLE_RATE, frame_size=FRAME_SIZE):
+    # Window, bin frequencies and the (bins x 12) map from FFT bins to pitch classes
+    window = np.hanning(frame_size).astype(np.float32)
+    freqs = np.fft.rfftfreq(frame_size, 1 / sample_rate)
+    chroma_map = np.zeros((len(freqs), 12), dtype=np.float32)
+    # Below ~55 Hz a bin spans several semitones, so it says nothing about pitch
+    pitched = freqs >= 55
+    pitch_class = np.round(12 * np.log2(freqs[pitched] / 440.0)).astype(int) % 12
+    chroma_map[np.flatnonzero(pitched), (pitch_class + 9) % 12] = 1  # A is pitch class 9
+    return window, freqs, chroma_map
+
+
+def estimate_tempo(magnitudes, sample_rate=SAMPLE_RATE, hop_size=HOP_SIZE):
+    """
+    Beats per minute from the autocorrelation of the spectral-flux onset envelope
+    of (frames x bins) magnitudes; 0 when the clip is too short to tell.
+    """
+    flux = np.maximum(np.diff(np.log1p(magnitudes), axis=0), 0).sum(axis=1)
+    flux = flux - flux.mean()
+    frame_rate = sample_rate / hop_size
+    min_lag, max_lag = int(frame_rate * 60 / MAX_BPM), int(np.ceil(frame_rate * 60 / MIN_BPM))
+    if len(flux) < 2 * max_lag or not flux.any():
+        return 0.0
+    # Autocorrelation through the FFT, zero-padded so it is not circular
+    spectrum = np.fft.rfft(flux, 2 * len(flux))
+    autocorr = np.fft.irfft(spectrum * np.conj(spectrum))[:max_lag + 2]
+    # Onsets repeat at every multiple of the beat, and a beat that falls between two
+    # lags splits its peak, so twice the period can score higher than the period itself
+    lags = np.arange(min_lag, max_lag + 1)
+    prior = np.exp(-0.5 * np.log2(60 * frame_rate / lags / TEMPO_PRIOR_BPM) ** 2)
+    lag = min_lag + int(np.argmax(autocorr[min_lag:max_lag + 1] * prior))
+    # Parabolic interpolation between neighbouring lags for sub-frame precision
+    left, centre, right = autocorr[lag - 1], autocorr[lag], autocorr[lag + 1]
+    curvature = left - 2 * centre + right
+    offset = 0.5 * (left - right) / curvature if curvature < 0 else 0.0
+    return float(60 * frame_rate / (lag + offset))
+
+
+def clip_features(samples, sample_rate=SAMPLE_RATE):
+    """
+    Feature vector (FEATURE_NAMES, float32) of mono samples: RMS energy and spectral
+    centroid (mean and spread over frames), a tempo estimate and the share of spectral
+    energy in each pitch class.
+    """
+    samples = np.asarray(samples, dtype=np.float32)
+    if len(samples) < FRAME_SIZE:
+        raise ValueError("clip is shorter than one analysis frame")
+    window, freqs, chroma_map = spectral_tables(sample_rate)
+    frames = sliding_window_view(samples, FRAME_SIZE)[::HOP_SIZE]
+    rms = np.sqrt(np.mean(np.square(frames), axis=1))
+    magnitudes = np.abs(np.fft.rfft(frames * window, axis=1)).astype(np.float32)
+
+    voiced = rms > SILENCE_RMS
+    if voiced.any():
+        energy = magnitudes[voiced].sum(axis=1)
+        centroid = (magnitudes[voiced] @ freqs) / np.maximum(energy, 1e-10)
+        centroid_mean, centroid_std = centroid.mean(), centroid.std()
+    else:
+        centroid_mean = centroid_std = 0.0
+    chroma = np.square(magnitudes).sum(axis=0) @ chroma_map
+    chroma = chroma / chroma.sum() if chroma.sum() > 0 else chroma
+    tempo = estimate_tempo(magnitudes, sample_rate)
+    return np.array([rms.mean(), rms.std(), centroid_mean, centroid_std, tempo, *chroma], dtype=np.float32)
+
+
+def analyse_clip(data, sample_rate=SAMPLE_RATE):
+    """
+    Process-pool task: ('ok', features as a list), ('invalid', reason) for clips that
+    can't be decoded or analysed, or ('unavailable', reason) when no decoder is installed.
+    """
+    try:
+        return 'ok', clip_features(decode_clip(data, sample_rate), sample_rate).tolist()
+    except DecoderUnavailable as e:
+        return 'unavailable', str(e)
+    except ValueError as e:
+        return 'invalid', str(e)
+
+
+# --- PIPELINE ---
+def open_audio_cache(path=DEFAULT_AUDIO_CACHE_PATH):
+    return TTLCache(maxsize=4096, ttl=None, path=path)
+
+
+def extract_audio_features(df, cache=None, crawler=None, max_workers=None, window=None):
+    """
+    Float32 (len(df), N_FEATURES) matrix of audio features from every row's
+    `preview_url`, with NaN rows where none could be computed.
+
+    Previews are downloaded on threads through `crawler` and analysed on a pool of
+    `max_workers` processes (default: one per core), a window of clips at a time so
+    memory stays bounded. Every result is checkpointed by track id as it lands, so an
+    interrupted run resumes; clips that can't be decoded are remembered as such,
+    failed downloads are retried on the next run.
+    """
+    cache = cache or open_audio_cache()
+    crawler = crawler or Crawler(max_workers=8, rate=8.0, per_host=8)
+    max_workers = max_workers or os.cpu_count() or 1
+    window = window or max_workers * 8
+    ids = df['id'].astype(str).tolist()
+
+    results, pending = {}, []
+    for track_id, url in zip(ids, df['preview_url']):
+        if track_id in results or not isinstance(url, str) or not url:
+            continue
+        cached = cache.get(track_id, default=cache)
+        if cached is not cache:
+            results[track_id] = cached
+        else:
+            results[track_id] = None
+            pending.append((track_id, url))
+    print(f"Extracting audio features: {len(results) - len(pending)} known, {len(pending)} to analyse "
+          f"on {max_workers} process(es)...")
+
+    def fetch(url):
+        return crawler.get_content(url, span_name='preview_fetch')
+
+    windows = [pending[i:i + window] for i in range(0, len(pending), window)]
+    failed = streak = done = 0
+    stop = None
+    # Spawned workers import only this module, and never inherit the download threads'
+    # locks the way forked ones can
+    context = multiprocessing.get_context('spawn')
+    with ThreadPoolExecutor(max_workers=crawler.max_workers) as downloads, \
+            ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+        fetching = [downloads.submit(fetch, url) for _, url in windows[0]] if windows else []
+        for w, batch in enumerate(windows):
+            analyses = {}
+            for (track_id, _), future in zip(batch, fetching):
+                data = future.result()
+                if data is None:
+                    failed += 1
+                    streak += 1
+                    incr('audio_features', result='failed')
+                    if streak >= MAX_CONSECUTIVE_FAILURES:
+                        stop = f"{streak} downloads failed in a row"
+                        break
+                    continue
+                streak = 0
+                analyses[pool.submit(analyse_clip, data)] = track_id
+            # The next window downloads while this one is analysed
+            fetching = []
+            if stop is None and w + 1 < len(windows):
+                fetching = [downloads.submit(fetch, url) for _, url in windows[w + 1]]
+            for future in as_completed(analyses):
+                track_id = analyses[future]
+                status, result = future.result()
+                incr('audio_features', result=status)
+                if status == 'ok':
+                    cache.put(track_id, result)
+                    results[track_id] = result
+                elif status == 'invalid':
+                    cache.put(track_id, None)
+                else:
+                    stop = result
+            done += len(batch)
+            print(f"  {done}/{len(pending)} previews processed")
+            if stop is not None:
+                for future in fetching:
+                    future.cancel()
+                print(f"  stopping early: {stop} (re-run to resume)")
+                break
+
+    features = np.full((len(df), N_FEATURES), np.nan, dtype=np.float32)
+    for row, track_id in enumerate(ids):
+        if results.get(track_id) is not None:
+            features[row] = results[track_id]
+    available = ~np.isnan(features).any(axis=1)
+    print(f"  {available.sum()}/{len(df)} tracks have audio features ({failed} downloads failed)")
+    return features
@@ -0,0 +1,140 @@
+import io
+import json
+import threading
+import time
+import wave
+import zlib
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from train_model import GLOBAL_NEGATIVE
+
+WORDS = ['love', 'night', 'dance', 'rain', 'fire', 'dream', 'road', 'sky', 'gold', 'river', 'moon', 'song']
+
+
+def mock_results(term, limit):
+    """
+    Deterministic iTunes-shaped results for `term`: the same term always gives the
+    same tracks, and roughly one in ten carries a negative keyword.
+    """
+    seed = zlib.crc32(term.encode('utf-8'))
+    results = []
+    for i in range(limit):
+        track_id = 100_000_000 + (seed + i * 7919) % 900_000_000
+        name = f"{WORDS[(seed + i) % len(WORDS)].title()} {term.split()[0].title()} {i}"
+        if (seed + i) % 10 == 0:
+            name += f" ({GLOBAL_NEGATIVE[(seed + i) % len(GLOBAL_NEGATIVE)]})"
+        results.append({
+            'trackId': track_id,
+            'trackName': name,
+            'artistName': f"Mock Artist {(seed + i) % 97}",
+            'collectionName': f"Mock Album {(seed + i) % 31}",
+            'artworkUrl100': f"https://example.invalid/{track_id}/100x100bb.jpg",
+            'previewUrl': f"https://example.invalid/{track_id}.m4a",
+        })
+    return results
+
+
+@lru_cache(maxsize=256)
+def fixture_image(name, size=600):
+    """
+    Deterministic JPEG cover art for `name`, the size iTunes hands out.
+    """
+    seed = zlib.crc32(name.encode('utf-8'))
+    image = Image.new('RGB', (size, size), ((seed >> 16) & 255, (seed >> 8) & 255, seed & 255))
+    draw = ImageDraw.Draw(image)
+    for i in range(8):
+        inset = i * size // 16
+        draw.ellipse((inset, inset, size - inset, size - inset), outline=((seed >> i) & 255, 255 - i * 20, 128), width=6)
+    out = io.BytesIO()
+    image.save(out, 'JPEG', quality=90)
+    return out.getvalue()
+
+
+def fixture_tempo(name):
+    # Beats per minute of the clip served for `name`
+    return 70 + zlib.crc32(name.encode('utf-8')) % 110
+
+
+@lru_cache(maxsize=64)
+def fixture_clip(name, seconds=30, sample_rate=22050):
+    """
+    Deterministic preview for `name` as 16-bit mono WAV: a chord whose root depends on
+    the name, plus a percussive click on every beat at fixture_tempo(name).
+    """
+    seed = zlib.crc32(name.encode('utf-8'))
+    t = np.arange(seconds * sample_rate) / sample_rate
+    root = 220 * 2 ** ((seed % 12) / 12)
+    signal = sum(np.sin(2 * np.pi * root * ratio * t) for ratio in (1, 1.26, 1.5)) / 6
+    beat = (t * fixture_tempo(name) / 60) % 1
+    signal += 0.5 * np.exp(-beat * 40) * np.random.default_rng(seed).standard_normal(len(t))
+    pcm = (np.clip(signal, -1, 1) * 32000).astype('<i2')
+    out = io.BytesIO()
+    with wave.open(out, 'wb') as clip:
+        clip.setnchannels(1)
+        clip.setsampwidth(2)
+        clip.setframerate(sample_rate)
+        clip.writeframes(pcm.tobytes())
+    return out.getvalue()
+
+
+class MockITunes:
+    """
+    Local stand-in for the iTunes Search API on a free port. `latency` (seconds) is
+    added to every response; `url` is the search endpoint to hand to Crawler or
+    fetch_itunes_results. Cover images are served under `artwork_url` and WAV
+    previews under `preview_url`. Use as a context manager.
+    """
+
+    def __init__(self, latency=0.0, host='127.0.0.1'):
+        self.latency = latency
+        self.requests = 0
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                mock.requests += 1
+                url = urlsplit(self.path)
+                if mock.latency:
+                    time.sleep(mock.latency)
+                if url.path.startswith('/artwork/'):
+                    body, content_type = fixture_image(url.path[len('/artwork/'):]), 'image/jpeg'
+                elif url.path.startswith('/preview/'):
+                    body, content_type = fixture_clip(url.path[len('/preview/'):]), 'audio/wav'
+                else:
+                    params = parse_qs(url.query)
+                    term = params.get('term', [''])[-1]
+                    limit = int(params.get('limit', ['10'])[-1])
+                    results = mock_results(term, limit)
+                    body = json.dumps({'resultCount': len(results), 'results': results}).encode('utf-8')
+                    content_type = 'application/json'
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer((host, 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}/search"
+        self.artwork_url = f"http://{host}:{self.server.server_address[1]}/artwork"
+        self.preview_url = f"http://{host}:{self.server.server_address[1]}/preview"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
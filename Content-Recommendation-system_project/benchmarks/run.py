@@ -0,0 +1,392 @@
+import argparse
+import ast
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from artwork_enrichment import ArtworkStore, enrich_artwork
+from audio_features import extract_audio_features, open_audio_cache
+from benchmarks.mock_itunes import MockITunes
+from benchmarks.synthetic import parse_size, size_label, synthetic_frame, ensure_synthetic_catalogue
+from crawler import Crawler
+from dedup import cluster_tracks
+from engine import RecommendationEngine, open_catalogue, fetch_itunes_results
+from liked_store import LikedStore
+from recommender import mmr_rerank, DIVERSITY_POOL, MAX_PER_ARTIST, MAX_PER_ALBUM
+from train_model import apply_filters, build_dataset
+from transport import Cassette, Transport
+from ttl_cache import TTLCache
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(HERE)
+DEFAULT_BASELINE = os.path.join(HERE, 'baseline.json')
+DEFAULT_CACHE_DIR = os.path.join(HERE, '.cache')
+DEFAULT_SIZES = '10k,100k'
+
+# A benchmark regresses when its median is this much slower than the baseline...
+DEFAULT_TOLERANCE = 0.5
+# ...and slower by at least this many milliseconds (sub-millisecond swings are mostly noise)
+MIN_DELTA_MS = 0.5
+
+# apply_filters and cluster_tracks work on an in-memory DataFrame; larger catalogues are timed at this size
+FILTER_MAX_ROWS = 1_000_000
+
+# Covers downloaded and thumbnailed per artwork benchmark run
+ARTWORK_IMAGES = 100
+
+# Synthesized 30-second previews analysed per audio benchmark run
+AUDIO_CLIPS = 32
+
+# Tracks per Top Picks page re-ranked in the diversity benchmark
+DIVERSITY_K = 48
+
+# Replayed crawl: per-request latency (+/- jitter) and share of injected 503s and
+# connection failures, roughly what the real iTunes API serves under load
+REPLAY_LATENCY = 0.02
+REPLAY_JITTER = 0.5
+REPLAY_ERROR_RATE = 0.02
+REPLAY_FAILURE_RATE = 0.01
+
+# Cold-start budgets: milliseconds to import everything an entry point imports at the
+# top, as reported by `python -X importtime`. Streamlit and pandas alone take most of
+# the app's; train_model needs scikit-learn up front.
+COLD_START_BUDGET_MS = {'app': 1500, 'train_model': 3000}
+COLD_START_REPEAT = 5
+# Heaviest packages listed per entry point in the report
+IMPORT_REPORT_TOP = 8
+
+
+def measure(fn, repeat, warmup=1):
+    """
+    Run `fn` `warmup` + `repeat` times and summarise the timed runs in milliseconds.
+    """
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    times = np.asarray(times)
+    return {'median_ms': float(np.median(times)), 'p95_ms': float(np.percentile(times, 95)),
+            'min_ms': float(times.min()), 'repeat': repeat}
+
+
+def cycle(values):
+    state = {'i': -1}
+    def next_value():
+        state['i'] = (state['i'] + 1) % len(values)
+        return values[state['i']]
+    return next_value
+
+
+def entry_imports(script):
+    # Modules a script imports at its top level, i.e. before it does anything
+    with open(os.path.join(PROJECT_DIR, script), encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def parse_importtime(stderr):
+    """
+    (total ms, {top-level package: ms spent in its own modules}) from the
+    `-X importtime` output of one interpreter.
+    """
+    total, packages = 0.0, {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if not name[1:].startswith(' '):
+            # Not indented: imported directly rather than by another module
+            total += int(cumulative_us) / 1000
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0.0) + int(self_us) / 1000
+    return total, packages
+
+
+def import_benchmark(script, repeat=COLD_START_REPEAT):
+    """
+    Cold-start import time of an entry point: everything it imports at the top, in a
+    fresh interpreter each run. Also returns the heaviest packages of the median run.
+    """
+    statement = 'import ' + ', '.join(entry_imports(script))
+    runs = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], cwd=PROJECT_DIR,
+                                capture_output=True, text=True, check=True)
+        runs.append(parse_importtime(result.stderr))
+    runs.sort(key=lambda run: run[0])
+    times = np.asarray([total for total, _ in runs])
+    heaviest = sorted(runs[len(runs) // 2][1].items(), key=lambda item: -item[1])[:IMPORT_REPORT_TOP]
+    return {'median_ms': float(np.median(times)), 'p95_ms': float(np.percentile(times, 95)),
+            'min_ms': float(times.min()), 'repeat': repeat,
+            'heaviest': [[package, round(ms, 3)] for package, ms in heaviest]}
+
+
+def catalogue_benchmarks(path, n_rows, mock_url, workdir):
+    """
+    Hot paths of the app/service against one synthetic catalogue.
+    """
+    results = {}
+    results['artifact_load'] = measure(lambda: open_catalogue(path), repeat=10)
+
+    catalogue = open_catalogue(path)
+    engine = RecommendationEngine(
+        catalogue,
+        liked_store=LikedStore(os.path.join(workdir, f'likes-{n_rows}.sqlite'), legacy_json=None),
+        search_cache=TTLCache(maxsize=4096, ttl=600),
+        search_fn=partial(fetch_itunes_results, url=mock_url))
+    languages = catalogue.partitions.languages
+    emojis = catalogue.partitions.emojis
+    queries = cycle([(e, l) for l in languages for e in emojis])
+
+    def sample():
+        emoji, lang = queries()
+        engine.sample(emoji, lang, 20)
+    results['filter_sample'] = measure(sample, repeat=200)
+
+    rng = np.random.default_rng(0)
+    liked = catalogue.records(rng.integers(0, n_rows, 20))
+    for song in liked:
+        engine.like('bench', song)
+    def recommend():
+        emoji, lang = queries()
+        engine.recommend(emoji, lang, 20, user='bench')
+    results['personalized_picks'] = measure(recommend, repeat=50)
+
+    ids = cycle([r['id'] for r in catalogue.records(rng.integers(0, n_rows, 100))])
+    results['similar'] = measure(lambda: engine.similar(ids()), repeat=200)
+
+    songs = cycle(catalogue.records(rng.integers(0, n_rows, 100)))
+    def toggle():
+        song = songs()
+        engine.like('bench', song)
+        engine.unlike('bench', song['id'])
+    results['like_toggle'] = measure(toggle, repeat=100)
+
+    counter = iter(range(10 ** 9))
+    results['search_uncached'] = measure(lambda: engine.search_remote(f"love {next(counter)}", 'English', 48), repeat=50)
+    results['search_cached'] = measure(lambda: engine.search_remote("love", 'English', 48), repeat=200)
+    if engine.search_index is not None:
+        search_queries = cycle(["love", "golden ri", "midnigt rain", "artist 00001", "beautifull sunset ocean"])
+        results['search_local'] = measure(lambda: engine.search_local(search_queries(), 'English', 48), repeat=100)
+    return results
+
+
+def filter_benchmark(df):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return measure(lambda: apply_filters(df), repeat=3)
+
+
+def dedup_benchmark(df):
+    # Normalisation, MinHash signatures, LSH banding and clustering, as in training
+    return measure(lambda: cluster_tracks(df), repeat=3)
+
+
+def crawl_benchmark(mock_url):
+    # Full build_dataset (crawl plan, concurrent fetch, filters, dedup) against the mock
+    def crawl():
+        crawler = Crawler(rate=1000, burst=1000, search_url=mock_url)
+        with contextlib.redirect_stdout(io.StringIO()):
+            build_dataset(crawler=crawler, cache=None)
+    return measure(crawl, repeat=3)
+
+
+def replay_benchmark(mock_url, workdir):
+    # The crawl is recorded against the mock once, then replayed offline with injected
+    # latency and errors, so concurrency, retries and backoff are timed deterministically
+    cassette = Cassette(os.path.join(workdir, 'cassette.sqlite'))
+    recorder = Crawler(rate=1000, burst=1000, search_url=mock_url, transport=Transport('record', cassette))
+    with contextlib.redirect_stdout(io.StringIO()):
+        build_dataset(crawler=recorder, cache=None)
+    def crawl():
+        transport = Transport('replay', cassette, latency=REPLAY_LATENCY, jitter=REPLAY_JITTER,
+                              error_rate=REPLAY_ERROR_RATE, failure_rate=REPLAY_FAILURE_RATE, seed=0)
+        crawler = Crawler(rate=1000, burst=1000, backoff=0.01, search_url=mock_url, transport=transport)
+        with contextlib.redirect_stdout(io.StringIO()):
+            build_dataset(crawler=crawler, cache=None)
+    return measure(crawl, repeat=3)
+
+
+def diversity_benchmark(pool=DIVERSITY_POOL, k=DIVERSITY_K):
+    # MMR with artist and album caps over a full candidate pool of 32-d unit vectors
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((pool, 32), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    relevance = rng.random(pool, dtype=np.float32)
+    groups = [(rng.integers(0, pool // 20, pool), MAX_PER_ARTIST), (rng.integers(0, pool // 10, pool), MAX_PER_ALBUM)]
+    return measure(lambda: mmr_rerank(vectors, relevance, k, groups=groups), repeat=20)
+
+
+def artwork_benchmark(artwork_url, workdir):
+    # Parallel download and thumbnailing into an empty store, against the mock's fixture images
+    df = pd.DataFrame({'image_url': [f"{artwork_url}/{i}.jpg" for i in range(ARTWORK_IMAGES)]})
+    runs = iter(range(10 ** 9))
+    def fetch():
+        run = next(runs)
+        store = ArtworkStore(os.path.join(workdir, f'artwork-{run}'),
+                             index_path=os.path.join(workdir, f'artwork-index-{run}.sqlite'))
+        crawler = Crawler(rate=1000, burst=1000, per_host=8)
+        with contextlib.redirect_stdout(io.StringIO()):
+            enrich_artwork(df, store=store, crawler=crawler)
+    return measure(fetch, repeat=3)
+
+
+def audio_benchmark(preview_url, workdir, max_workers):
+    # Preview download, decode and feature extraction on `max_workers` processes
+    df = pd.DataFrame({'id': [str(i) for i in range(AUDIO_CLIPS)],
+                       'preview_url': [f"{preview_url}/{i}.wav" for i in range(AUDIO_CLIPS)]})
+    runs = iter(range(10 ** 9))
+    def extract():
+        cache = open_audio_cache(os.path.join(workdir, f'audio-{max_workers}-{next(runs)}.sqlite'))
+        crawler = Crawler(rate=1000, burst=1000, per_host=8)
+        with contextlib.redirect_stdout(io.StringIO()):
+            extract_audio_features(df, cache=cache, crawler=crawler, max_workers=max_workers)
+    return measure(extract, repeat=3)
+
+
+def run_benchmarks(sizes, cache_dir=DEFAULT_CACHE_DIR, log=print):
+    results = {}
+    for name in COLD_START_BUDGET_MS:
+        log(f"cold-start imports of {name}.py...")
+        results[f'cold_start_{name}'] = import_benchmark(f'{name}.py')
+    with MockITunes() as mock, tempfile.TemporaryDirectory() as workdir:
+        log("build_dataset against mock iTunes...")
+        results['build_dataset_mock'] = crawl_benchmark(mock.url)
+        log("build_dataset replayed with injected latency and errors...")
+        results['build_dataset_replay'] = replay_benchmark(mock.url, workdir)
+        log("artwork thumbnails against mock iTunes...")
+        results['artwork_mock'] = artwork_benchmark(mock.artwork_url, workdir)
+        log("diversity re-ranking...")
+        results[f'mmr_rerank@{size_label(DIVERSITY_POOL)}'] = diversity_benchmark()
+        # Once on one process and once per core, to show how extraction scales
+        for workers in sorted({1, os.cpu_count() or 1}):
+            log(f"audio features on {workers} process(es)...")
+            results[f'audio_features_mock@{workers}p'] = audio_benchmark(mock.preview_url, workdir, workers)
+        for n_rows in sizes:
+            label = size_label(n_rows)
+            log(f"{label}: preparing synthetic catalogue...")
+            path = ensure_synthetic_catalogue(cache_dir, n_rows)
+            log(f"{label}: running...")
+            for name, result in catalogue_benchmarks(path, n_rows, mock.url, workdir).items():
+                results[f'{name}@{label}'] = result
+            df = synthetic_frame(min(n_rows, FILTER_MAX_ROWS))
+            results[f'apply_filters@{label}'] = filter_benchmark(df)
+            results[f'cluster_tracks@{label}'] = dedup_benchmark(df)
+            del df
+    return {
+        'meta': {
+            'timestamp': time.time(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Regressions against a baseline report: (key, baseline ms, current ms) for every
+    benchmark whose median slowed down beyond the tolerance.
+    """
+    regressions = []
+    for key, result in report['results'].items():
+        base = baseline.get('results', {}).get(key)
+        if base is None:
+            continue
+        current, previous = result['median_ms'], base['median_ms']
+        if current > previous * (1 + tolerance) and current - previous > MIN_DELTA_MS:
+            regressions.append((key, previous, current))
+    return regressions
+
+
+def print_report(report, baseline=None):
+    print(f"{'benchmark':<32}{'median ms':>12}{'p95 ms':>12}{'baseline':>12}{'ratio':>8}")
+    for key, result in report['results'].items():
+        base = (baseline or {}).get('results', {}).get(key)
+        ratio = f"{result['median_ms'] / base['median_ms']:.2f}" if base and base['median_ms'] else '-'
+        previous = f"{base['median_ms']:.3f}" if base else '-'
+        print(f"{key:<32}{result['median_ms']:>12.3f}{result['p95_ms']:>12.3f}{previous:>12}{ratio:>8}")
+
+
+def over_budget(report):
+    # (entry point, median ms, budget ms) for every cold start over its budget
+    return [(name, report['results'][f'cold_start_{name}']['median_ms'], budget)
+            for name, budget in COLD_START_BUDGET_MS.items()
+            if report['results'].get(f'cold_start_{name}', {}).get('median_ms', 0) > budget]
+
+
+def print_import_report(report):
+    for name, budget in COLD_START_BUDGET_MS.items():
+        result = report['results'].get(f'cold_start_{name}')
+        if result is None:
+            continue
+        print(f"\n{name}.py cold start: {result['median_ms']:.1f} ms (budget {budget} ms)")
+        for package, ms in result['heaviest']:
+            print(f"  {package:<30}{ms:>10.1f} ms")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the catalogue, crawl and search hot paths.")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help="Comma-separated catalogue sizes: 10k, 100k, 1m, 10m or a row count.")
+    parser.add_argument('--output', help="Write the JSON report here.")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline report to compare against.")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed slowdown of a median before it counts as a regression.")
+    parser.add_argument('--update-baseline', action='store_true', help="Save this run as the new baseline.")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="Where synthetic catalogues are kept.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    sizes = [parse_size(s) for s in args.sizes.split(',') if s]
+    report = run_benchmarks(sizes, args.cache_dir)
+
+    baseline = None
+    if not args.update_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    print_import_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    regressions = compare(report, baseline, args.tolerance) if baseline else []
+    for key, previous, current in regressions:
+        print(f"REGRESSION {key}: {previous:.3f} ms -> {current:.3f} ms")
+    budgets = over_budget(report)
+    for name, current, budget in budgets:
+        print(f"OVER BUDGET {name}.py cold start: {current:.1f} ms > {budget} ms")
+    if regressions or budgets:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from catalogue import CatalogueWriter, catalogue_path, load_catalogue
+from mood_model import train_mood_model
+from search_index import SearchIndexBuilder, search_documents
+from similarity import fit_text_encoder, EMBEDDING_DIM, TOP_K
+from train_model import EMOJI_MAPPING, LANGUAGES, GLOBAL_NEGATIVE
+
+# Same columns, in the same order, as data/music_dataset.csv
+COLUMNS = ['id', 'name', 'artist', 'album', 'image_url', 'preview_url',
+           'predicted_emoji', 'mood_label', 'language', 'video_id', 'artwork']
+
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000, '10m': 10_000_000}
+
+# Rows generated per chunk; bounds memory at any catalogue size
+CHUNK_ROWS = 250_000
+
+# Share of names carrying a negative keyword, so the crawl filters have work to do
+NEGATIVE_SHARE = 0.03
+
+# Rows used to fit the mood classifier and text encoder stored with the catalogue
+MODEL_SAMPLE_ROWS = 10_000
+
+# Share of rows that are another release of an earlier row, for one-per-cluster sampling
+DUPLICATE_SHARE = 0.05
+
+# Largest catalogue given a search index (building one is slow and memory-hungry beyond)
+SEARCH_INDEX_MAX_ROWS = 1_000_000
+
+WORDS = np.array("""
+    love night heart dance summer rain fire dream light road sky blue gold river
+    home star moon wild song city girl boy time world baby soul kiss feel happy
+    sad lonely sleep calm focus party energy angry sweet golden broken young
+    forever tonight beautiful crazy slow fast lost found deep high low shine ocean
+    storm shadow paradise sunrise sunset midnight morning winter spring autumn
+    """.split(), dtype=object)
+
+VIDEO_ID_ALPHABET = np.frombuffer(
+    b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_', dtype=np.uint8)
+
+
+def parse_size(text):
+    return SIZES[text.lower()] if text.lower() in SIZES else int(text)
+
+
+def size_label(n_rows):
+    labels = {v: k for k, v in SIZES.items()}
+    return labels.get(n_rows, str(n_rows))
+
+
+def words(rng, n):
+    return WORDS[rng.integers(0, len(WORDS), n)] + ' ' + WORDS[rng.integers(0, len(WORDS), n)]
+
+
+def synthetic_chunk(start, n, lang, emoji, rng, n_artists):
+    """
+    `n` rows of one (language, emoji) partition, starting at global row `start`.
+    """
+    # A stride per row plus jitter keeps ids unique across the whole catalogue
+    ids = (1_000_000_000 + np.arange(start, start + n, dtype=np.int64) * 7 + rng.integers(0, 7, n)).astype(str)
+    names = words(rng, n)
+    negative = rng.random(n) < NEGATIVE_SHARE
+    keywords = np.array(GLOBAL_NEGATIVE, dtype=object)[rng.integers(0, len(GLOBAL_NEGATIVE), negative.sum())]
+    names[negative] = names[negative] + ' (' + keywords + ')'
+    artists = np.char.add('Artist ', np.char.zfill(rng.integers(0, n_artists, n).astype(str), 7))
+    video_ids = VIDEO_ID_ALPHABET[rng.integers(0, 64, (n, 11))].view('S11').ravel().astype(str)
+    # Thumbnail keys have the shape of real ones (32 hex digits); no files exist for them
+    artwork = np.char.add(np.array([rng.bytes(16 * n).hex()]).view('U32'), '.webp')
+    return pd.DataFrame({
+        'id': ids.astype(object),
+        'name': names,
+        'artist': artists.astype(object),
+        'album': words(rng, n),
+        'image_url': np.char.add(np.char.add('https://is1-ssl.mzstatic.com/image/thumb/Music/', ids),
+                                 '/600x600bb.jpg').astype(object),
+        'preview_url': np.char.add(np.char.add('https://audio-ssl.itunes.apple.com/itunes-assets/', ids),
+                                   '.m4a').astype(object),
+        'predicted_emoji': emoji,
+        'mood_label': EMOJI_MAPPING[emoji]['label'],
+        'language': lang,
+        'video_id': video_ids.astype(object),
+        'artwork': artwork.astype(object),
+    }, columns=COLUMNS)
+
+
+def iter_synthetic_chunks(n_rows, seed=0, chunk_rows=CHUNK_ROWS):
+    """
+    Yield DataFrames with the music_dataset.csv schema, `n_rows` in total. Rows come
+    out in the catalogue's sorted partition order (language, then emoji), so a
+    CatalogueWriter can take them without reordering.
+    """
+    rng = np.random.default_rng(seed)
+    n_artists = max(10, n_rows // 20)
+    cells = [(lang, emoji) for lang in sorted(LANGUAGES) for emoji in sorted(EMOJI_MAPPING)]
+    counts = rng.multinomial(n_rows, np.full(len(cells), 1 / len(cells)))
+    start = 0
+    for (lang, emoji), count in zip(cells, counts):
+        for offset in range(0, count, chunk_rows):
+            n = min(chunk_rows, count - offset)
+            yield synthetic_chunk(start, n, lang, emoji, rng, n_artists)
+            start += n
+
+
+def write_synthetic_csv(path, n_rows, seed=0):
+    # Streamed chunk by chunk, so even 10M rows never sit in memory at once
+    for i, chunk in enumerate(iter_synthetic_chunks(n_rows, seed)):
+        chunk.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+
+
+def synthetic_frame(n_rows, seed=0):
+    return pd.concat(iter_synthetic_chunks(n_rows, seed), ignore_index=True)
+
+
+def synthetic_spec(n_rows, seed):
+    # Recorded in the manifest, so a cached catalogue built differently is rebuilt
+    return {'n_rows': n_rows, 'seed': seed, 'search_index': n_rows <= SEARCH_INDEX_MAX_ROWS,
+            'duplicate_share': DUPLICATE_SHARE, 'album_codes': True}
+
+
+def build_synthetic_catalogue(path, n_rows, seed=0):
+    """
+    Write a catalogue directory of `n_rows` synthetic tracks with the same columns,
+    arrays and models as a trained one. Embeddings, neighbours, near-duplicate clusters
+    and album codes are random; the mood model and text encoder are fitted on a small sample,
+    which is enough for timing.
+    Catalogues above SEARCH_INDEX_MAX_ROWS are written without a search index.
+    """
+    rng = np.random.default_rng(seed + 1)
+    writer = CatalogueWriter(path)
+    index = SearchIndexBuilder() if synthetic_spec(n_rows, seed)['search_index'] else None
+    sample = []
+    for chunk in iter_synthetic_chunks(n_rows, seed):
+        writer.append(chunk)
+        if index is not None:
+            # Chunks arrive in partition order, so index rows match catalogue rows
+            index.add(search_documents(chunk))
+        sample.append(chunk.sample(min(len(chunk), MODEL_SAMPLE_ROWS // 10 + 1), random_state=seed))
+    sample = pd.concat(sample, ignore_index=True)
+    sample = sample.sample(min(len(sample), MODEL_SAMPLE_ROWS), random_state=seed).reset_index(drop=True)
+
+    embeddings = writer.open_array('embeddings', (n_rows, EMBEDDING_DIM), np.float32)
+    neighbours = writer.open_array('neighbours', (n_rows, TOP_K), np.int32)
+    scores = writer.open_array('neighbour_scores', (n_rows, TOP_K), np.float32)
+    clusters = writer.open_array('cluster_id', (n_rows,), np.int32)
+    albums = writer.open_array('album_code', (n_rows,), np.int32)
+    for start in range(0, n_rows, CHUNK_ROWS):
+        stop = min(start + CHUNK_ROWS, n_rows)
+        block = rng.standard_normal((stop - start, EMBEDDING_DIM), dtype=np.float32)
+        embeddings[start:stop] = block / np.linalg.norm(block, axis=1, keepdims=True)
+        neighbours[start:stop] = rng.integers(0, n_rows, (stop - start, TOP_K), dtype=np.int32)
+        scores[start:stop] = -np.sort(-rng.random((stop - start, TOP_K), dtype=np.float32), axis=1)
+        # A duplicate points at the row before it (its canonical release)
+        rows = np.arange(start, stop, dtype=np.int32)
+        duplicate = (rng.random(stop - start) < DUPLICATE_SHARE) & (rows > 0)
+        clusters[start:stop] = np.where(duplicate, rows - 1, rows)
+        # About ten tracks per album
+        albums[start:stop] = rng.integers(0, max(1, n_rows // 10), stop - start, dtype=np.int32)
+    del embeddings, neighbours, scores, clusters, albums
+
+    model, report = train_mood_model(sample)
+    encoder, _, _ = fit_text_encoder(sample)
+    return writer.close(arrays=index.finish() if index is not None else None,
+                        objects={'mood_model': model, 'text_encoder': encoder},
+                        extra={'synthetic': synthetic_spec(n_rows, seed)})
+
+
+def ensure_synthetic_catalogue(root, n_rows, seed=0):
+    """
+    Path of a cached synthetic catalogue under `root`, building it on first use.
+    """
+    path = os.path.join(root, f'catalogue-{size_label(n_rows)}-{seed}')
+    if catalogue_path(path) is not None:
+        if load_catalogue(path).manifest.get('synthetic') == synthetic_spec(n_rows, seed):
+            return path
+    os.makedirs(root, exist_ok=True)
+    build_synthetic_catalogue(path, n_rows, seed)
+    return path
@@ -0,0 +1,805 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+CATALOGUE_DIR = 'catalogue'
+FORMAT_VERSION = 2
+MANIFEST_NAME = 'manifest.json'
+
+# A catalogue root holds versioned directories and a pointer naming the live one.
+# Training assembles a new version next to the old ones and then replaces the pointer
+# in one rename, so readers only ever open complete versions. The newest
+# KEEP_VERSIONS stay on disk; older ones are deleted even if a process still uses
+# them, which is safe because load_catalogue opens every file of a version up front
+# (an open file outlives its directory entry on POSIX, and blocks deletion on Windows).
+CURRENT_NAME = 'current.json'
+VERSIONS_DIR = 'versions'
+KEEP_VERSIONS = 3
+
+# Staging directories left by crashed publishes are removed after this long
+STALE_STAGING_SECONDS = 24 * 3600
+
+# Low-cardinality text columns stored as integer codes plus a dictionary
+CATEGORICAL_COLUMNS = ['language', 'mood_label', 'predicted_emoji', 'artist']
+
+# Rows are sorted language-major by these columns so every (language, emoji) pair,
+# and every language as a whole, is one contiguous block of rows
+PARTITION_COLUMNS = ['language', 'predicted_emoji']
+
+
+# --- ENCODING ---
+def encode_strings(values):
+    """
+    Pack a sequence of strings into a UTF-8 heap plus int64 offsets. Missing values are
+    stored as empty strings and flagged in the returned null mask (None if there are none).
+    """
+    nulls = np.fromiter((pd.isna(v) for v in values), dtype=bool, count=len(values))
+    encoded = [b'' if null else str(v).encode('utf-8') for v, null in zip(values, nulls)]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    heap = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return heap, offsets, (nulls if nulls.any() else None)
+
+
+def encode_categories(values):
+    """
+    Dictionary-encode a column: (codes, categories) with -1 for missing values.
+    """
+    codes, categories = pd.factorize(pd.Series(values, dtype=object), sort=True)
+    dtype = np.int16 if len(categories) < np.iinfo(np.int16).max else np.int32
+    return codes.astype(dtype), [str(c) for c in categories]
+
+
+# --- COLUMNS ---
+class StringColumn:
+    def __init__(self, heap, offsets, nulls=None):
+        self.heap = heap
+        self.offsets = offsets
+        self.nulls = nulls
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if self.nulls is not None and self.nulls[i]:
+            return None
+        return bytes(self.heap[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
+
+    def take(self, positions):
+        return [self[int(i)] for i in positions]
+
+
+class CategoryColumn:
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = categories
+        self._lookup = {c: i for i, c in enumerate(categories)}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        code = self.codes[i]
+        return None if code < 0 else self.categories[code]
+
+    def code(self, value):
+        """
+        Integer code for `value`, or -1 if it never occurs in the column.
+        """
+        return self._lookup.get(value, -1)
+
+    def take(self, positions):
+        return [None if c < 0 else self.categories[c] for c in self.codes[positions]]
+
+
+class NumericColumn:
+    def __init__(self, values):
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        return self.values[i].item()
+
+    def take(self, positions):
+        return self.values[positions].tolist()
+
+
+# --- PARTITION INDEX ---
+class PartitionIndex:
+    """
+    Offsets of every (language, emoji) block in the partition-sorted catalogue.
+    Slot 0 of each axis holds rows where that value is missing.
+    """
+
+    def __init__(self, languages, emojis, offsets):
+        self.languages = languages
+        self.emojis = emojis
+        self.offsets = offsets
+        self._lang_lookup = {v: i + 1 for i, v in enumerate(languages)}
+        self._emoji_lookup = {v: i + 1 for i, v in enumerate(emojis)}
+        self.width = len(emojis) + 1
+
+    def ranges(self, emoji=None, lang=None):
+        """
+        (start, stop) row ranges covering the rows that match `emoji` and `lang`
+        (None matches everything). Unknown values give no ranges.
+        """
+        if lang is None:
+            lang_slots = range(len(self.languages) + 1)
+        elif lang in self._lang_lookup:
+            lang_slots = [self._lang_lookup[lang]]
+        else:
+            return []
+        if emoji is not None and emoji not in self._emoji_lookup:
+            return []
+
+        ranges = []
+        for l in lang_slots:
+            if emoji is None:
+                start, stop = l * self.width, (l + 1) * self.width
+            else:
+                start = l * self.width + self._emoji_lookup[emoji]
+                stop = start + 1
+            if self.offsets[stop] > self.offsets[start]:
+                ranges.append((int(self.offsets[start]), int(self.offsets[stop])))
+        return ranges
+
+    def to_manifest(self):
+        return {'columns': PARTITION_COLUMNS, 'languages': self.languages, 'emojis': self.emojis}
+
+
+def partition_frame(df):
+    """
+    Stable-sort `df` into partition order and build the matching PartitionIndex.
+    """
+    lang_codes, languages = encode_categories(df['language'].tolist())
+    emoji_codes, emojis = encode_categories(df['predicted_emoji'].tolist())
+    width = len(emojis) + 1
+    keys = (lang_codes.astype(np.int64) + 1) * width + (emoji_codes.astype(np.int64) + 1)
+    order = np.argsort(keys, kind='stable')
+    counts = np.bincount(keys, minlength=(len(languages) + 1) * width)
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return df.iloc[order].reset_index(drop=True), PartitionIndex(languages, emojis, offsets)
+
+
+# --- ID INDEX ---
+def numeric_ids(ids):
+    # iTunes track ids are integers; anything unparseable maps to -1 (never found)
+    return pd.to_numeric(pd.Series(list(ids), dtype=object), errors='coerce').fillna(-1).to_numpy(np.int64)
+
+
+def build_id_index(ids):
+    """
+    Sorted numeric ids plus the row position of each, for O(log n) id -> row lookups.
+    """
+    return id_index_from_keys(numeric_ids(ids))
+
+
+def id_index_from_keys(keys):
+    order = np.argsort(keys, kind='stable')
+    return {'id_sorted': keys[order], 'id_order': order.astype(np.int64)}
+
+
+def track_keys(ids):
+    """
+    Exact int64 keys for deduplicating track ids: numeric ids map to themselves, and
+    anything else to a 64-bit hash with the sign bit set, so the two never collide.
+    """
+    ids = pd.Series(list(ids), dtype=object).map(str)
+    keys = (pd.util.hash_array(ids.to_numpy(dtype=object)) | np.uint64(1 << 63)).view(np.int64)
+    # Canonical integers only, so '0123' stays distinct from '123'
+    numeric = ids.str.fullmatch(r'0|[1-9]\d{0,17}').to_numpy()
+    keys[numeric] = ids[numeric].astype(np.int64).to_numpy()
+    return keys
+
+
+class IdSet:
+    """
+    Compact set of int64 keys for streaming deduplication (8 bytes per key). Keys are
+    kept in sorted NumPy runs that are merged as they grow, so there are O(log n) runs
+    and every lookup and insert is a vectorised searchsorted/sort over a whole batch.
+    """
+
+    def __init__(self):
+        self.runs = []  # disjoint sorted int64 arrays, largest first
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def nbytes(self):
+        return sum(run.nbytes for run in self.runs)
+
+    def contains(self, keys):
+        keys = np.asarray(keys, dtype=np.int64)
+        found = np.zeros(len(keys), dtype=bool)
+        for run in self.runs:
+            positions = np.minimum(np.searchsorted(run, keys), len(run) - 1)
+            found |= run[positions] == keys
+        return found
+
+    def add_new(self, keys):
+        """
+        Add `keys` and return a mask of those that were new: not already in the set and
+        not repeated earlier in `keys` (so the first occurrence wins, as in
+        drop_duplicates).
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        new = np.zeros(len(keys), dtype=bool)
+        new[np.unique(keys, return_index=True)[1]] = True
+        new &= ~self.contains(keys)
+        run = np.sort(keys[new])
+        self.n += len(run)
+        # Merge into the previous run while it is no bigger than the new one
+        while len(run) and self.runs and len(self.runs[-1]) <= len(run):
+            run = np.sort(np.concatenate([self.runs.pop(), run]))
+        if len(run):
+            self.runs.append(run)
+        return new
+
+
+# --- CATALOGUE ---
+class Catalogue:
+    """
+    Read-only columnar view of the song catalogue. Columns loaded from disk are
+    memory-mapped, so worker processes share the page cache instead of each holding
+    a private copy, and only the rows actually rendered are ever decoded.
+    """
+
+    def __init__(self, columns, partitions, manifest=None, path=None, arrays=None, objects=None,
+                 object_files=None):
+        self.columns = columns
+        self.partitions = partitions
+        self.manifest = manifest or {}
+        self.path = path
+        # Extra artifacts stored next to the columns: memory-mapped indexes, and models
+        # deserialised on first use from files opened when the catalogue was loaded
+        self._arrays = dict(arrays or {})
+        self._objects = dict(objects or {})
+        self._object_files = dict(object_files or {})
+        self._objects_lock = threading.Lock()
+        if 'n_rows' in self.manifest:
+            self.n_rows = self.manifest['n_rows']
+        else:
+            self.n_rows = len(next(iter(columns.values()))) if columns else 0
+
+    def __len__(self):
+        return self.n_rows
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def column(self, name):
+        return self.columns[name]
+
+    def has_artifact(self, name):
+        return name in self._arrays or name in self._objects or name in self._object_files
+
+    def array(self, name):
+        """
+        A NumPy array stored with the catalogue (memory-mapped), or None if absent.
+        """
+        return self._arrays.get(name)
+
+    @property
+    def version(self):
+        # None for catalogues published before versioning and for in-memory ones
+        return self.manifest.get('version')
+
+    def reuse_objects(self, other):
+        """
+        Take over the objects `other` (e.g. the version this one replaces) has already
+        loaded whose stored bytes are identical, so a reload skips deserialising them.
+        """
+        hashes, other_hashes = self.manifest.get('object_hashes', {}), other.manifest.get('object_hashes', {})
+        with self._objects_lock:
+            for name, obj in other._objects.items():
+                if name not in self._objects and name in hashes and hashes[name] == other_hashes.get(name):
+                    self._objects[name] = obj
+                    self._close_object_file(name)
+
+    def loaded_objects(self):
+        # Names of the objects deserialised (or reused) so far
+        return list(self._objects)
+
+    def _close_object_file(self, name):
+        f = self._object_files.pop(name, None)
+        if f is not None:
+            f.close()
+
+    def load_object(self, name):
+        """
+        A joblib-serialised object (e.g. a fitted model) stored with the catalogue, or None.
+        """
+        if name in self._objects:
+            return self._objects[name]
+        with self._objects_lock:
+            if name not in self._objects:
+                if name not in self._object_files:
+                    return None
+                # joblib (and whatever the object unpickles, e.g. scikit-learn) loads on first use
+                import joblib
+                self._objects[name] = joblib.load(self._object_files[name])
+                self._close_object_file(name)
+        return self._objects[name]
+
+    def positions_of(self, ids):
+        """
+        Row position for each track id (-1 where the id is not in the catalogue).
+        """
+        sorted_ids, order = self.array('id_sorted'), self.array('id_order')
+        keys = numeric_ids(ids)
+        if sorted_ids is None or len(sorted_ids) == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+        idx = np.minimum(np.searchsorted(sorted_ids, keys), len(sorted_ids) - 1)
+        found = (sorted_ids[idx] == keys) & (keys >= 0)
+        return np.where(found, order[idx], -1)
+
+    def records(self, positions, columns=None):
+        """
+        Materialise rows at `positions` as a list of dicts (same shape as
+        DataFrame.to_dict('records')).
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        names = columns or list(self.columns)
+        values = {name: self.columns[name].take(positions) for name in names}
+        return [dict(zip(names, row)) for row in zip(*(values[name] for name in names))]
+
+    def sample(self, emoji=None, lang=None, k=20, rng=None):
+        """
+        Row positions of up to `k` distinct tracks drawn uniformly from the (emoji, lang)
+        partition. Draws offsets into the partition's ranges directly, so the cost depends
+        on k rather than on the size of the partition or the catalogue.
+        """
+        rng = rng or np.random.default_rng()
+        ranges = self.partitions.ranges(emoji, lang)
+        if not ranges:
+            return np.zeros(0, dtype=np.int64)
+        starts = np.array([r[0] for r in ranges], dtype=np.int64)
+        sizes = np.array([r[1] - r[0] for r in ranges], dtype=np.int64)
+        bounds = np.cumsum(sizes)
+        picks = rng.choice(int(bounds[-1]), size=min(k, int(bounds[-1])), replace=False)
+        block = np.searchsorted(bounds, picks, side='right')
+        return starts[block] + picks - (bounds[block] - sizes[block])
+
+    def to_frame(self, columns=None):
+        names = columns or list(self.columns)
+        every_row = np.arange(self.n_rows)
+        return pd.DataFrame({name: self.columns[name].take(every_row) for name in names})
+
+    @classmethod
+    def from_frame(cls, df, arrays=None, objects=None):
+        """
+        Build an in-memory catalogue straight from a DataFrame (no files involved).
+        Row-aligned `arrays` must already follow partition order (see partition_frame).
+        """
+        df, partitions = partition_frame(df)
+        arrays = {**build_id_index(df['id']), **(arrays or {})}
+        return cls(_encode_frame(df)[0], partitions, arrays=arrays, objects=objects)
+
+
+def _encode_frame(df):
+    columns, schema = {}, {}
+    for name in df.columns:
+        values = df[name].tolist()
+        if name in CATEGORICAL_COLUMNS:
+            codes, categories = encode_categories(values)
+            columns[name] = CategoryColumn(codes, categories)
+            schema[name] = {'kind': 'category'}
+        elif pd.api.types.is_numeric_dtype(df[name]) and name != 'id':
+            columns[name] = NumericColumn(df[name].to_numpy())
+            schema[name] = {'kind': 'numeric'}
+        else:
+            heap, offsets, nulls = encode_strings(values)
+            columns[name] = StringColumn(heap, offsets, nulls)
+            schema[name] = {'kind': 'string'}
+    return columns, schema
+
+
+# --- ON-DISK FORMAT ---
+def _write_strings(path, prefix, heap, offsets, nulls):
+    heap.tofile(os.path.join(path, f'{prefix}.heap'))
+    np.save(os.path.join(path, f'{prefix}.offsets.npy'), offsets)
+    if nulls is not None:
+        np.save(os.path.join(path, f'{prefix}.nulls.npy'), nulls)
+
+
+def _read_strings(path, prefix):
+    heap_path = os.path.join(path, f'{prefix}.heap')
+    # np.memmap refuses empty files, and an empty heap has nothing to map anyway
+    if os.path.getsize(heap_path):
+        heap = np.memmap(heap_path, dtype=np.uint8, mode='r')
+    else:
+        heap = np.zeros(0, dtype=np.uint8)
+    offsets = np.load(os.path.join(path, f'{prefix}.offsets.npy'), mmap_mode='r')
+    nulls_path = os.path.join(path, f'{prefix}.nulls.npy')
+    nulls = np.load(nulls_path, mmap_mode='r') if os.path.exists(nulls_path) else None
+    return StringColumn(heap, offsets, nulls)
+
+
+# --- PUBLISHING ---
+def new_version():
+    # Sorts by publish time, down to the microsecond (pruning relies on that order);
+    # the random suffix keeps two publishes in the same microsecond apart
+    now = time.time()
+    return f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{int(now % 1 * 1e6):06d}-{os.urandom(2).hex()}"
+
+
+def staging_path(root, version):
+    return os.path.join(root, VERSIONS_DIR, f'{version}.tmp')
+
+
+def read_current(root=CATALOGUE_DIR):
+    """
+    The pointer to the live version of a catalogue root, or None when there is none.
+    """
+    try:
+        with open(os.path.join(root, CURRENT_NAME)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def catalogue_path(root=CATALOGUE_DIR):
+    """
+    Directory of the live catalogue under `root`: its current version, or `root`
+    itself when it is a flat (unversioned) catalogue. None when nothing is published.
+    """
+    current = read_current(root)
+    if current is not None:
+        return os.path.join(root, VERSIONS_DIR, current['version'])
+    return root if os.path.exists(os.path.join(root, MANIFEST_NAME)) else None
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _remove_flat_layout(root):
+    # A catalogue written before versioning; everything but the versions and the
+    # pointer to them goes
+    for name in os.listdir(root):
+        if name == VERSIONS_DIR or name.startswith(CURRENT_NAME):
+            continue
+        path = os.path.join(root, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+
+
+def _prune_versions(root, current, keep=KEEP_VERSIONS):
+    # Old versions may still be mapped by a reader (Windows refuses to delete those),
+    # so failures are ignored and retried by the next publish
+    versions_dir = os.path.join(root, VERSIONS_DIR)
+    names = sorted(os.listdir(versions_dir))
+    published = [n for n in names if not n.endswith('.tmp')]
+    for name in published[:-keep]:
+        if name != current:
+            shutil.rmtree(os.path.join(versions_dir, name), ignore_errors=True)
+    for name in names:
+        path = os.path.join(versions_dir, name)
+        if name.endswith('.tmp') and time.time() - os.path.getmtime(path) > STALE_STAGING_SECONDS:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def publish_version(tmp_path, root, version, manifest):
+    """
+    Finish the catalogue assembled in `tmp_path` (its manifest is written here), move
+    it into `root` as `version` and atomically point `root` at it. Returns the manifest.
+
+    The manifest also records how many ids were added and removed since the version
+    it replaces, and a hash of every stored object, so a process reloading the
+    catalogue can keep the objects that did not change.
+    """
+    previous_path = catalogue_path(root)
+    if previous_path is not None and os.path.exists(os.path.join(previous_path, 'id_sorted.npy')):
+        with open(os.path.join(previous_path, MANIFEST_NAME)) as f:
+            previous = json.load(f)
+        old_keys = np.load(os.path.join(previous_path, 'id_sorted.npy'), mmap_mode='r')
+        new_keys = np.load(os.path.join(tmp_path, 'id_sorted.npy'), mmap_mode='r')
+        added = len(new_keys) - np.isin(new_keys, old_keys, assume_unique=True).sum()
+        removed = len(old_keys) - np.isin(old_keys, new_keys, assume_unique=True).sum()
+        manifest['delta'] = {'base_version': previous.get('version'), 'added': int(added), 'removed': int(removed)}
+    manifest['version'] = version
+    manifest['object_hashes'] = {name: _file_hash(os.path.join(tmp_path, f'{name}.joblib'))
+                                 for name in manifest['objects']}
+    with open(os.path.join(tmp_path, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    os.rename(tmp_path, os.path.join(root, VERSIONS_DIR, version))
+    current = {'version': version, 'created_at': manifest['created_at'], 'n_rows': manifest['n_rows'],
+               'delta': manifest.get('delta')}
+    pointer_tmp = os.path.join(root, f'{CURRENT_NAME}.{version}.tmp')
+    with open(pointer_tmp, 'w') as f:
+        json.dump(current, f, indent=2)
+    os.replace(pointer_tmp, os.path.join(root, CURRENT_NAME))
+    # Only now that readers follow the pointer can a pre-versioning catalogue go
+    if os.path.exists(os.path.join(root, MANIFEST_NAME)):
+        _remove_flat_layout(root)
+    _prune_versions(root, version)
+    return manifest
+
+
+def write_catalogue(df, path=CATALOGUE_DIR, arrays=None, objects=None, extra=None):
+    """
+    Write `df` as a columnar catalogue directory: string columns as a UTF-8 heap plus
+    offsets, categorical columns as codes plus a dictionary heap, numerics as .npy.
+    `arrays` (saved as .npy) and `objects` (saved with joblib) ride along with the
+    columns; row-aligned arrays must follow partition order, so callers that build
+    them should run partition_frame first. `extra` is merged into the manifest.
+    `path` is a catalogue root: the directory is assembled as a new version beside the
+    current one and published with publish_version.
+    """
+    version = new_version()
+    tmp_path = staging_path(path, version)
+    os.makedirs(tmp_path)
+
+    df, partitions = partition_frame(df)
+    columns, schema = _encode_frame(df)
+    for name, col in columns.items():
+        if isinstance(col, CategoryColumn):
+            np.save(os.path.join(tmp_path, f'{name}.codes.npy'), col.codes)
+            _write_strings(tmp_path, f'{name}.dict', *encode_strings(col.categories))
+        elif isinstance(col, NumericColumn):
+            np.save(os.path.join(tmp_path, f'{name}.npy'), col.values)
+        else:
+            _write_strings(tmp_path, name, col.heap, col.offsets, col.nulls)
+    np.save(os.path.join(tmp_path, 'partition.offsets.npy'), partitions.offsets)
+    arrays = {**build_id_index(df['id']), **(arrays or {})}
+    for name, values in arrays.items():
+        np.save(os.path.join(tmp_path, f'{name}.npy'), values)
+    if objects:
+        import joblib
+        for name, obj in objects.items():
+            joblib.dump(obj, os.path.join(tmp_path, f'{name}.joblib'))
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'created_at': time.time(),
+        'n_rows': len(df),
+        'columns': schema,
+        'partition': partitions.to_manifest(),
+        'arrays': sorted(arrays),
+        'objects': sorted(objects or {}),
+        **(extra or {}),
+    }
+    return publish_version(tmp_path, path, version, manifest)
+
+
+# Rows gathered per step when CatalogueWriter reorders a staged string column
+WRITE_BLOCK_ROWS = 1 << 16
+
+
+class CatalogueWriter:
+    """
+    Build a catalogue directory from DataFrame chunks in bounded memory. Columns are
+    staged on disk as chunks arrive; close() puts the rows into partition order (a
+    plain rename when they already arrived in order) and writes the same files as
+    write_catalogue. Column kinds are fixed by the first chunk, so pass string
+    columns with an object dtype even when a chunk holds only missing values.
+
+    Row-aligned arrays can be passed to append() with each chunk and are reordered
+    with the rows; arrays from open_array() must be filled in the final,
+    partition-sorted order.
+    """
+
+    def __init__(self, path=CATALOGUE_DIR):
+        self.path = path
+        self.version = new_version()
+        self.tmp_path = staging_path(path, self.version)
+        self.staging = os.path.join(self.tmp_path, 'staging')
+        os.makedirs(self.staging)
+        self.kinds = None
+        self.lookups = {}  # category column -> {value: first-seen code}
+        self.dtypes = {}  # numeric column -> dtype
+        self.files = {}
+        self.opened_arrays = {}
+        self.row_arrays = {}  # name -> (dtype, shape of one row)
+        self.n_rows = 0
+
+    def _stage(self, name, values):
+        if name not in self.files:
+            self.files[name] = open(os.path.join(self.staging, name), 'wb')
+        self.files[name].write(np.ascontiguousarray(values).tobytes())
+
+    def _staged(self, name, dtype):
+        # np.memmap refuses empty files
+        path = os.path.join(self.staging, name)
+        if not os.path.exists(path) or not os.path.getsize(path):
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r')
+
+    def append(self, df, arrays=None):
+        if self.kinds is None:
+            self.kinds = {}
+            for name in df.columns:
+                if name in CATEGORICAL_COLUMNS:
+                    self.kinds[name] = 'category'
+                    self.lookups[name] = {}
+                elif pd.api.types.is_numeric_dtype(df[name]) and name != 'id':
+                    self.kinds[name] = 'numeric'
+                    self.dtypes[name] = df[name].to_numpy().dtype
+                else:
+                    self.kinds[name] = 'string'
+        for name, kind in self.kinds.items():
+            if kind == 'category':
+                lookup = self.lookups[name]
+                codes = [-1 if pd.isna(v) else lookup.setdefault(str(v), len(lookup)) for v in df[name].tolist()]
+                self._stage(f'{name}.codes', np.asarray(codes, dtype=np.int32))
+            elif kind == 'numeric':
+                self._stage(name, df[name].to_numpy().astype(self.dtypes[name]))
+            else:
+                heap, offsets, nulls = encode_strings(df[name].tolist())
+                self._stage(f'{name}.heap', heap)
+                self._stage(f'{name}.lengths', np.diff(offsets))
+                self._stage(f'{name}.nulls', nulls if nulls is not None else np.zeros(len(df), dtype=bool))
+        self._stage('id.keys', numeric_ids(df['id']))
+        for name, values in (arrays or {}).items():
+            values = np.asarray(values)
+            self.row_arrays.setdefault(name, (values.dtype, values.shape[1:]))
+            dtype, row_shape = self.row_arrays[name]
+            self._stage(f'array.{name}', values.astype(dtype).reshape((len(df),) + row_shape))
+        self.n_rows += len(df)
+
+    def open_array(self, name, shape, dtype):
+        """
+        A writable memory-mapped .npy stored with the catalogue, for row-aligned
+        arrays too large to build in memory.
+        """
+        array = np.lib.format.open_memmap(os.path.join(self.tmp_path, f'{name}.npy'), mode='w+',
+                                          dtype=dtype, shape=shape)
+        self.opened_arrays[name] = array
+        return array
+
+    def _final_codes(self, name):
+        # First-seen codes -> codes into the sorted dictionary, as encode_categories gives
+        lookup = self.lookups[name]
+        categories = sorted(lookup)
+        remap = np.full(len(lookup) + 1, -1, dtype=np.int64)  # last slot maps -1 to -1
+        for code, value in enumerate(categories):
+            remap[lookup[value]] = code
+        dtype = np.int16 if len(categories) < np.iinfo(np.int16).max else np.int32
+        return remap[self._staged(f'{name}.codes', np.int32)].astype(dtype), categories
+
+    def _write_row_array(self, name, order):
+        dtype, row_shape = self.row_arrays[name]
+        staged = self._staged(f'array.{name}', dtype).reshape((self.n_rows,) + row_shape)
+        out = np.lib.format.open_memmap(os.path.join(self.tmp_path, f'{name}.npy'), mode='w+',
+                                        dtype=dtype, shape=staged.shape)
+        for i in range(0, len(order), WRITE_BLOCK_ROWS):
+            out[i:i + WRITE_BLOCK_ROWS] = staged[order[i:i + WRITE_BLOCK_ROWS]]
+        out.flush()
+
+    def _write_string_column(self, name, order, in_order):
+        lengths = self._staged(f'{name}.lengths', np.int64)
+        heap_path = os.path.join(self.staging, f'{name}.heap')
+        out_path = os.path.join(self.tmp_path, f'{name}.heap')
+        if in_order:
+            os.replace(heap_path, out_path)
+            new_lengths = lengths
+        else:
+            heap = self._staged(f'{name}.heap', np.uint8)
+            starts = np.zeros(len(lengths), dtype=np.int64)
+            np.cumsum(lengths[:-1], out=starts[1:])
+            new_lengths = lengths[order]
+            with open(out_path, 'wb') as out:
+                for i in range(0, len(order), WRITE_BLOCK_ROWS):
+                    block = order[i:i + WRITE_BLOCK_ROWS]
+                    block_lengths = lengths[block]
+                    # Byte positions of every gathered string, built without a Python loop
+                    dest = np.zeros(len(block), dtype=np.int64)
+                    np.cumsum(block_lengths[:-1], out=dest[1:])
+                    index = np.repeat(starts[block] - dest, block_lengths) + np.arange(block_lengths.sum())
+                    out.write(heap[index].tobytes())
+        offsets = np.zeros(len(new_lengths) + 1, dtype=np.int64)
+        np.cumsum(new_lengths, out=offsets[1:])
+        np.save(os.path.join(self.tmp_path, f'{name}.offsets.npy'), offsets)
+        nulls = self._staged(f'{name}.nulls', bool)
+        if nulls.any():
+            np.save(os.path.join(self.tmp_path, f'{name}.nulls.npy'), nulls if in_order else nulls[order])
+
+    def close(self, arrays=None, objects=None, extra=None):
+        """
+        Finish the catalogue and publish it as a new version. Returns the manifest.
+        """
+        for f in self.files.values():
+            f.close()
+        codes = {name: self._final_codes(name) for name in self.lookups}
+
+        # Partition order, exactly as partition_frame would sort the rows
+        (lang_codes, languages), (emoji_codes, emojis) = (codes[c] for c in PARTITION_COLUMNS)
+        width = len(emojis) + 1
+        keys = (lang_codes.astype(np.int64) + 1) * width + (emoji_codes.astype(np.int64) + 1)
+        order = np.argsort(keys, kind='stable')
+        in_order = bool(np.all(order == np.arange(len(order))))
+        counts = np.bincount(keys, minlength=(len(languages) + 1) * width)
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        partitions = PartitionIndex(languages, emojis, offsets)
+
+        schema = {}
+        for name, kind in self.kinds.items():
+            schema[name] = {'kind': kind}
+            if kind == 'category':
+                values, categories = codes[name]
+                np.save(os.path.join(self.tmp_path, f'{name}.codes.npy'), values[order])
+                _write_strings(self.tmp_path, f'{name}.dict', *encode_strings(categories))
+            elif kind == 'numeric':
+                values = self._staged(name, self.dtypes[name])
+                np.save(os.path.join(self.tmp_path, f'{name}.npy'), values[order])
+            else:
+                self._write_string_column(name, order, in_order)
+        np.save(os.path.join(self.tmp_path, 'partition.offsets.npy'), offsets)
+        for name in self.row_arrays:
+            self._write_row_array(name, order)
+
+        arrays = {**id_index_from_keys(self._staged('id.keys', np.int64)[order]), **(arrays or {})}
+        for name, values in arrays.items():
+            np.save(os.path.join(self.tmp_path, f'{name}.npy'), values)
+        for array in self.opened_arrays.values():
+            array.flush()
+        if objects:
+            import joblib
+            for name, obj in objects.items():
+                joblib.dump(obj, os.path.join(self.tmp_path, f'{name}.joblib'))
+
+        manifest = {
+            'format_version': FORMAT_VERSION,
+            'created_at': time.time(),
+            'n_rows': self.n_rows,
+            'columns': schema,
+            'partition': partitions.to_manifest(),
+            'arrays': sorted(set(arrays) | set(self.opened_arrays) | set(self.row_arrays)),
+            'objects': sorted(objects or {}),
+            **(extra or {}),
+        }
+        self.opened_arrays.clear()
+        shutil.rmtree(self.staging)
+        return publish_version(self.tmp_path, self.path, self.version, manifest)
+
+
+def load_catalogue(path=CATALOGUE_DIR, columns=None):
+    """
+    Memory-map a catalogue: the live version of a catalogue root, or one version's
+    directory. Pass `columns` to open only what a view needs. Every stored array is
+    mapped and every stored object's file opened now (objects are only deserialised
+    on first use), so the catalogue keeps working after its version is pruned.
+    """
+    path = catalogue_path(path) or path
+    with open(os.path.join(path, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported catalogue format {manifest.get('format_version')} in {path}")
+
+    loaded = {}
+    for name, spec in manifest['columns'].items():
+        if columns is not None and name not in columns:
+            continue
+        if spec['kind'] == 'category':
+            codes = np.load(os.path.join(path, f'{name}.codes.npy'), mmap_mode='r')
+            categories = _read_strings(path, f'{name}.dict')
+            loaded[name] = CategoryColumn(codes, categories.take(range(len(categories))))
+        elif spec['kind'] == 'numeric':
+            loaded[name] = NumericColumn(np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r'))
+        else:
+            loaded[name] = _read_strings(path, name)
+    partitions = PartitionIndex(manifest['partition']['languages'], manifest['partition']['emojis'],
+                                np.load(os.path.join(path, 'partition.offsets.npy')))
+    arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in manifest.get('arrays', [])}
+    object_files = {name: open(os.path.join(path, f'{name}.joblib'), 'rb') for name in manifest.get('objects', [])}
+    return Catalogue(loaded, partitions, manifest, path=path, arrays=arrays, object_files=object_files)
@@ -0,0 +1,212 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import requests
+
+from metrics import span, incr
+from transport import get_transport
+
+ITUNES_SEARCH_URL = "https://itunes.apple.com/search"
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Enrichment stages stop after this many failed calls in a row (e.g. no network);
+# whatever succeeded so far is cached and the next run resumes from there
+MAX_CONSECUTIVE_FAILURES = 20
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Refills `rate` tokens per second up to `capacity`;
+    every request takes one token, so bursts are bounded and the long-run rate is capped.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class Crawler:
+    """
+    Concurrent iTunes fetch engine: a bounded thread pool behind a shared token bucket,
+    with a per-host concurrency cap and exponential backoff on 429/5xx responses
+    (Retry-After is honoured up to the longest backoff, backoff * 2 ** max_retries).
+    Requests go through `transport` (the process default unless given), so a crawl can
+    be recorded and replayed offline.
+    """
+
+    def __init__(self, max_workers=8, rate=8.0, burst=None, per_host=4,
+                 max_retries=4, backoff=0.5, timeout=10, search_url=ITUNES_SEARCH_URL,
+                 transport=None):
+        self.max_workers = max_workers
+        self.bucket = TokenBucket(rate, burst)
+        self.per_host = per_host
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        # Overridable so benchmarks can point the crawler at a local mock
+        self.search_url = search_url
+        self.transport = transport or get_transport()
+        self._host_slots = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _session(self):
+        # requests.Session is not safe to share across threads, so keep one per worker
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self.transport.session()
+            self._local.session = session
+        return session
+
+    def _host_slot(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_slots[host]
+
+    def _retry_delay(self, attempt, response=None):
+        # Honour Retry-After when the server sends one, otherwise back off exponentially.
+        # None when Retry-After is longer than the longest backoff: the request then
+        # fails rather than parking a worker for as long as the server likes
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                delay = float(retry_after)
+                return delay if delay <= self.backoff * (2 ** self.max_retries) else None
+        return self.backoff * (2 ** attempt) + random.uniform(0, self.backoff)
+
+    def get_json(self, url, params):
+        """
+        GET `url` and decode the JSON body. Returns None once retries are exhausted.
+        """
+        return self._get(url, params, lambda response: response.json(), 'itunes_fetch')
+
+    def get_content(self, url, params=None, span_name='http_fetch'):
+        """
+        GET `url` and return the raw body (e.g. artwork). None once retries are exhausted.
+        """
+        return self._get(url, params, lambda response: response.content, span_name)
+
+    def _get(self, url, params, decode, span_name):
+        params = params or {}
+        slot = self._host_slot(url)
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            response = None
+            try:
+                with slot, span(span_name):
+                    response = self._session().get(url, params=params, timeout=self.timeout)
+                incr('http_responses', status=response.status_code)
+                if response.status_code == 200:
+                    return decode(response)
+                incr('http_errors', kind='status')
+                if response.status_code not in RETRY_STATUS:
+                    print(f"HTTP {response.status_code} for {params.get('term', url)}")
+                    return None
+            except (requests.RequestException, ValueError) as e:
+                incr('http_errors', kind=type(e).__name__)
+                print(f"Error fetching {params.get('term', url)}: {e}")
+            if attempt < self.max_retries:
+                delay = self._retry_delay(attempt, response)
+                if delay is None:
+                    incr('http_errors', kind='retry_after')
+                    print(f"Giving up on {params.get('term', url)}: asked to retry after "
+                          f"{response.headers['Retry-After']} s")
+                    return None
+                incr('http_retries')
+                time.sleep(delay)
+        return None
+
+    def _search(self, term, limit):
+        params = {'term': term, 'media': 'music', 'entity': 'song', 'limit': limit}
+        payload = self.get_json(self.search_url, params)
+        if payload is None:
+            return None
+        return payload.get('results', [])
+
+    def search(self, term, limit=10):
+        return self._search(term, limit) or []
+
+    def _search_and_hand_off(self, term, limit, on_result):
+        # Runs on the worker, so the future only keeps whether the fetch succeeded
+        term_results = self._search(term, limit)
+        if term_results is None:
+            return None
+        if on_result is not None:
+            on_result(term, limit, term_results)
+        return True
+
+    def search_many(self, terms, limit=10, on_result=None, collect=True):
+        """
+        Fetch every distinct term concurrently. Returns {term: results}; identical
+        terms in `terms` are only requested once. `on_result(term, limit, results)` is
+        called for each successful fetch as it lands (failed terms are not reported).
+        With `collect=False` results are only handed to `on_result` (from the worker
+        threads) and {} is returned, so a large crawl never holds every response.
+        """
+        unique_terms = list(dict.fromkeys(terms))
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            if collect:
+                futures = {pool.submit(self._search, term, limit): term for term in unique_terms}
+            else:
+                futures = {pool.submit(self._search_and_hand_off, term, limit, on_result): term
+                           for term in unique_terms}
+            for done, future in enumerate(as_completed(futures), 1):
+                term = futures[future]
+                term_results = future.result()
+                incr('crawl_terms', result='failed' if term_results is None else 'fetched')
+                if collect:
+                    if term_results is not None and on_result is not None:
+                        on_result(term, limit, term_results)
+                    results[term] = term_results or []
+                if done % 25 == 0 or done == len(futures):
+                    print(f"  fetched {done}/{len(futures)} terms")
+        return results
+
+
+def run_until_failure_streak(fn, items, max_workers, state, noun='calls', progress='done',
+                             max_failures=MAX_CONSECUTIVE_FAILURES):
+    """
+    Call `fn(item)` for every item on a pool of `max_workers` threads and yield
+    (item, succeeded, result) as the calls finish; `fn` returns (succeeded, result).
+    After `max_failures` failures in a row the calls not yet started are cancelled
+    and `state['stopped']` is set, so later chunks of a stage can skip their calls.
+    """
+    items = list(items)
+    streak = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(fn, item): item for item in items}
+        for done, future in enumerate(as_completed(futures), 1):
+            succeeded, result = future.result()
+            yield futures[future], succeeded, result
+            streak = 0 if succeeded else streak + 1
+            if done % 100 == 0:
+                print(f"  {done}/{len(items)} {progress}")
+            if streak >= max_failures:
+                print(f"  {streak} {noun} failed in a row; stopping early (re-run to resume)")
+                state['stopped'] = True
+                for pending in futures:
+                    pending.cancel()
+                return
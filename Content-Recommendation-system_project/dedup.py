@@ -0,0 +1,170 @@
+import re
+import zlib
+
+import numpy as np
+import pandas as pd
+
+# MinHash signature length over title shingles, split into BANDS bands for LSH. Two
+# titles share a band (and become candidates) with probability 1 - (1 - J^4)^8 for
+# Jaccard similarity J: ~96% at J = 0.7, ~4% at J = 0.3.
+NUM_HASHES = 32
+BANDS = 8
+
+# Hashes over artist tokens; candidates must share at least one to count as the same artist
+ARTIST_HASHES = 8
+
+# Estimated title similarity a candidate pair needs to be merged
+MIN_TITLE_SIMILARITY = 0.7
+
+# Rows drawn per requested track when sampling one per cluster, so a few duplicates
+# among the draws still leave enough distinct songs
+CLUSTER_OVERSAMPLE = 2
+
+# Distinct strings hashed per block; bounds the per-shingle temporaries
+BLOCK_ROWS = 100_000
+
+# Bracketed or dash-separated parts that mark a version of a song rather than a new one
+VARIANT_WORDS = r'from|remaster(?:ed)?|version|mix|remix|edit|feat\.?|ft\.?|featuring|with|live|mono|stereo|' \
+                r'deluxe|explicit|clean|radio|original|soundtrack|ost|instrumental|reprise|extended'
+VARIANT_PART = re.compile(rf'\s*(?:[\(\[][^\)\]]*\b(?:{VARIANT_WORDS})\b[^\)\]]*[\)\]]|\s-\s.*\b(?:{VARIANT_WORDS})\b.*$)',
+                          re.IGNORECASE)
+FEATURING = re.compile(r'\s+(?:feat\.?|ft\.?|featuring)\s+.*$', re.IGNORECASE)
+ARTIST_SEPARATORS = re.compile(r'\s*(?:,|&|\band\b|\bx\b|\bfeat\.?|\bft\.?|\bwith\b)\s*', re.IGNORECASE)
+NON_WORD = re.compile(r'[\W_]+')
+
+# Universal hashing (a * x + b) mod P over 32-bit shingle hashes; fixed seed, so
+# clusters are reproducible
+PRIME = (1 << 32) + 15
+_rng = np.random.default_rng(20240601)
+HASH_A = _rng.integers(1, PRIME, NUM_HASHES + ARTIST_HASHES, dtype=np.uint64)
+HASH_B = _rng.integers(0, PRIME, NUM_HASHES + ARTIST_HASHES, dtype=np.uint64)
+# Odd multipliers folding a band's values into one 64-bit bucket key
+BAND_MIX = _rng.integers(1, 1 << 63, NUM_HASHES // BANDS, dtype=np.uint64) | np.uint64(1)
+
+
+def normalize_title(name):
+    """
+    (base title, whether a variant marker was stripped): "Song (From "Film")",
+    "Song - 2011 Remaster" and "Song (feat. X)" all become "song".
+    """
+    name = str(name or '')
+    base = FEATURING.sub('', VARIANT_PART.sub('', name))
+    base = NON_WORD.sub(' ', base.casefold()).strip()
+    if not base:
+        # Nothing left once the markers go (e.g. a title that is all brackets)
+        return NON_WORD.sub(' ', name.casefold()).strip(), False
+    return base, len(base) < len(NON_WORD.sub(' ', name.casefold()).strip())
+
+
+def artist_tokens(artist):
+    # Every credited artist as one token, so "A & B" and "B" share "b"
+    parts = ARTIST_SEPARATORS.split(str(artist or '').casefold())
+    return {NON_WORD.sub('', p) for p in parts} - {''}
+
+
+def title_shingles(title):
+    padded = f" {title} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)} or {padded}
+
+
+def _minhash(shingle_sets, a, b):
+    # (n, len(a)) signatures: the minimum of each universal hash over a row's shingles
+    lengths = np.fromiter((len(s) for s in shingle_sets), dtype=np.int64, count=len(shingle_sets))
+    values = np.fromiter((zlib.crc32(s.encode('utf-8')) for shingles in shingle_sets for s in shingles),
+                         dtype=np.uint64, count=int(lengths.sum()))
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    signatures = np.empty((len(shingle_sets), len(a)), dtype=np.uint32)
+    for j in range(len(a)):
+        signatures[:, j] = np.minimum.reduceat((a[j] * values + b[j]) % PRIME, offsets)
+    return signatures
+
+
+def _band_edges(band, artist_key):
+    # Candidate pairs: neighbours in (band bucket, artist) order within one bucket, so a
+    # bucket of n rows gives n - 1 pairs instead of n^2
+    bucket = np.zeros(len(band), dtype=np.uint64)
+    for column, mix in zip(band.T, BAND_MIX):
+        # Wrapping arithmetic is the point here; colliding buckets only add candidates
+        bucket = (bucket ^ column.astype(np.uint64)) * mix
+    order = np.lexsort((artist_key, bucket))
+    same = bucket[order[1:]] == bucket[order[:-1]]
+    return order[:-1][same], order[1:][same]
+
+
+def _signatures(shingle_sets, a, b):
+    signatures = np.empty((len(shingle_sets), len(a)), dtype=np.uint32)
+    for start in range(0, len(shingle_sets), BLOCK_ROWS):
+        signatures[start:start + BLOCK_ROWS] = _minhash(shingle_sets[start:start + BLOCK_ROWS], a, b)
+    return signatures
+
+
+def cluster_tracks(df):
+    """
+    Near-duplicate clusters for a catalogue frame: the same song under different
+    track ids (soundtrack and compilation re-releases, remasters, workout mixes).
+
+    Titles are normalised (variant markers stripped) and MinHash/LSH over their
+    character shingles proposes candidate pairs in time linear in the catalogue; a
+    pair is merged when its estimated title similarity is at least
+    MIN_TITLE_SIMILARITY and the artists share a credit. Returns an int32 array with, for every row,
+    the row of its cluster's canonical track: the unmarked original with the
+    shortest title, else the first row.
+    """
+    # SciPy is only needed to build clusters, not to serve them with one_per_cluster
+    import scipy.sparse as sp
+    from scipy.sparse.csgraph import connected_components
+    n = len(df)
+    if n == 0:
+        return np.zeros(0, dtype=np.int32)
+    # Names and artists repeat across a catalogue, so each distinct string is hashed once
+    name_codes, names = pd.factorize(df['name'].fillna(''))
+    normalized = [normalize_title(name) for name in names]
+    title_codes, titles = pd.factorize(pd.Series([t for t, _ in normalized], dtype=object))
+    variant = np.array([v for _, v in normalized], dtype=bool)[name_codes]
+    title_sig = _signatures([title_shingles(t) for t in titles], HASH_A[:NUM_HASHES],
+                            HASH_B[:NUM_HASHES])[title_codes[name_codes]]
+    artist_codes, artists = pd.factorize(df['artist'].fillna(''))
+    # An artist with no usable tokens still only matches itself
+    artist_sig = _signatures([artist_tokens(a) or {f'#{a}'} for a in artists], HASH_A[NUM_HASHES:],
+                             HASH_B[NUM_HASHES:])[artist_codes]
+
+    rows_per_band = NUM_HASHES // BANDS
+    sources, targets = [], []
+    for band in range(BANDS):
+        left, right = _band_edges(title_sig[:, band * rows_per_band:(band + 1) * rows_per_band], artist_sig[:, 0])
+        similarity = (title_sig[left] == title_sig[right]).mean(axis=1)
+        # Same title by another artist is a cover or a different song, not a re-release
+        same_artist = (artist_sig[left] == artist_sig[right]).any(axis=1)
+        keep = (similarity >= MIN_TITLE_SIMILARITY) & same_artist
+        sources.append(left[keep])
+        targets.append(right[keep])
+    sources, targets = np.concatenate(sources), np.concatenate(targets)
+    graph = sp.csr_matrix((np.ones(len(sources), dtype=np.int8), (sources, targets)), shape=(n, n))
+    _, labels = connected_components(graph, directed=False)
+
+    # Canonical member per cluster: unmarked first, then the shortest raw title, then the first row
+    raw_length = df['name'].fillna('').str.len().to_numpy()
+    order = np.lexsort((np.arange(n), raw_length, variant, labels))
+    first = np.ones(n, dtype=bool)
+    first[1:] = labels[order[1:]] != labels[order[:-1]]
+    canonical = np.empty(labels.max() + 1, dtype=np.int32)
+    canonical[labels[order[first]]] = order[first]
+    return canonical[labels]
+
+
+def one_per_cluster(positions, cluster_ids, k, exclude_positions=()):
+    """
+    The first `k` of `positions` (row positions, best or random first) that fall in
+    distinct clusters, in their original order, skipping the clusters of
+    `exclude_positions`. Without clusters, the first `k`.
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    if cluster_ids is None or not len(positions):
+        return positions[:k]
+    clusters = np.asarray(cluster_ids[positions])
+    exclude_positions = np.asarray(exclude_positions, dtype=np.int64)
+    if len(exclude_positions):
+        keep = ~np.isin(clusters, np.asarray(cluster_ids[exclude_positions[exclude_positions >= 0]]))
+        positions, clusters = positions[keep], clusters[keep]
+    _, first = np.unique(clusters, return_index=True)
+    return positions[np.sort(first)[:k]]
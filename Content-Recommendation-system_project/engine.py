@@ -0,0 +1,356 @@
+import os
+import threading
+
+from catalogue import Catalogue, load_catalogue, catalogue_path, read_current, CATALOGUE_DIR
+from dedup import CLUSTER_OVERSAMPLE, one_per_cluster
+from liked_store import LikedStore
+from metrics import span, timed, register, incr
+from recommender import TasteProfile, diverse_picks, DIVERSITY
+from search_index import SearchIndex
+from ttl_cache import TTLCache
+
+DEFAULT_SEARCH_CACHE_PATH = os.path.join('data', 'search_cache.sqlite')
+
+# Seconds between checks for a newly published catalogue version
+RELOAD_INTERVAL = 5.0
+
+
+def open_catalogue(path=CATALOGUE_DIR, legacy_path='model.pkl'):
+    """
+    The columnar catalogue if it has been built, else the legacy pickled DataFrame
+    wrapped as a Catalogue, else None.
+    """
+    # Columnar catalogue is memory-mapped, so every server process shares one copy
+    if catalogue_path(path) is not None:
+        with span('artifact_load', kind='catalogue'):
+            return load_catalogue(path)
+    # Legacy artifact: a pickled dict holding the whole DataFrame
+    if os.path.exists(legacy_path):
+        import joblib
+        with span('artifact_load', kind='legacy'):
+            df = joblib.load(legacy_path)['data']
+        # Ensure language column exists for compatibility
+        if 'language' not in df.columns:
+            df['language'] = 'English'
+        return Catalogue.from_frame(df)
+    return None
+
+
+def fetch_itunes_results(query, limit=10, url=None):
+    # Raises on failure so errors are never cached as "no results". The HTTP stack is
+    # imported on the first search; browsing the catalogue never needs it.
+    from crawler import ITUNES_SEARCH_URL
+    from transport import get_transport
+    url = url or ITUNES_SEARCH_URL
+    params = {'term': query, 'media': 'music', 'entity': 'song', 'limit': limit}
+    with span('itunes_search'):
+        response = get_transport().thread_session().get(url, params=params, timeout=5)
+    response.raise_for_status()
+    results = []
+    for item in response.json().get('results', []):
+        results.append({
+            'id': str(item.get('trackId')),
+            'name': item.get('trackName'),
+            'artist': item.get('artistName'),
+            'album': item.get('collectionName'),
+            'image_url': (item.get('artworkUrl100') or '').replace('100x100', '600x600'),
+            'preview_url': item.get('previewUrl'),
+        })
+    return results
+
+
+def preload(catalogue, objects=None):
+    """
+    Open the catalogue's lazily-loaded arrays and models now, e.g. in a server's parent
+    process so forked workers share them instead of each loading a copy. `objects`
+    limits the models loaded (all of them by default).
+    """
+    for name in catalogue.manifest.get('arrays', []):
+        catalogue.array(name)
+    for name in catalogue.manifest.get('objects', []) if objects is None else objects:
+        catalogue.load_object(name)
+    return catalogue
+
+
+class CatalogueView:
+    """
+    One catalogue version and what the engine derives from it. Engine methods read
+    the current view once per call, so a reload swapping in a new version mid-request
+    never mixes rows of two versions.
+    """
+
+    def __init__(self, catalogue):
+        self.catalogue = catalogue
+        # Full-text index over name/artist/album (absent for legacy and sampled catalogues)
+        self.search_index = SearchIndex.from_catalogue(catalogue)
+
+    @property
+    def mood_model(self):
+        # Trained mood classifier (absent for legacy model.pkl datasets). Loaded on the
+        # first live search, so a cold start doesn't pay for importing scikit-learn.
+        return self.catalogue.load_object('mood_model')
+
+
+class RecommendationEngine:
+    """
+    Everything the UI asks of the catalogue: mood/language picks, trending, similar
+    tracks, labelled search and per-user likes. The Streamlit app calls it in-process,
+    and service.py exposes the same methods over HTTP.
+
+    Every track list it returns is annotated with `video_id` (when the catalogue has
+    one) and `has_similar` (whether "more like this" can be answered for it). When the
+    catalogue has near-duplicate clusters, lists drawn from it hold one track per song.
+
+    reload() (or a CatalogueWatcher calling it) swaps in a newly published catalogue
+    version without interrupting requests.
+    """
+
+    def __init__(self, catalogue, liked_store=None, search_cache=None, search_fn=fetch_itunes_results):
+        self.liked_store = liked_store or LikedStore()
+        self.search_cache = search_cache or TTLCache(maxsize=512, ttl=600, path=DEFAULT_SEARCH_CACHE_PATH)
+        self.search_fn = search_fn
+        register('search_cache', self.search_cache.stats)
+        self.view = CatalogueView(catalogue)
+        # user -> (store version, TasteProfile); rebuilt when another process changed the likes
+        self.profiles = {}
+        self.lock = threading.Lock()
+
+    @property
+    def catalogue(self):
+        return self.view.catalogue
+
+    @property
+    def search_index(self):
+        return self.view.search_index
+
+    # --- RELOADING ---
+    def reload(self, root=CATALOGUE_DIR):
+        """
+        Load the version currently published under `root` and swap it in, unless it
+        is the one being served. Requests are answered from the old version until the
+        swap, so call this off the request path (CatalogueWatcher does). Only the models
+        the old version had loaded are loaded up front, and those whose stored bytes did
+        not change are reused rather than loaded again; the rest stay lazy. Cached taste
+        profiles survive when the text encoder they were embedded with did.
+        Returns whether a new version was swapped in.
+        """
+        current = read_current(root)
+        old = self.view
+        if current is None or current['version'] == old.catalogue.version:
+            return False
+        with span('artifact_load', kind='reload'):
+            catalogue = load_catalogue(root)
+            catalogue.reuse_objects(old.catalogue)
+            preload(catalogue, objects=old.catalogue.loaded_objects())
+            view = CatalogueView(catalogue)
+        encoder = catalogue.manifest.get('object_hashes', {}).get('text_encoder')
+        same_space = encoder is not None and encoder == old.catalogue.manifest.get('object_hashes', {}).get('text_encoder')
+        with self.lock:
+            self.view = view
+            if not same_space:
+                self.profiles = {}
+        incr('catalogue_reloads')
+        delta = catalogue.manifest.get('delta') or {}
+        print(f"Catalogue {catalogue.version} loaded ({len(catalogue)} tracks, "
+              f"+{delta.get('added', '?')}/-{delta.get('removed', '?')} since {delta.get('base_version')})")
+        return True
+
+    # --- ANNOTATION ---
+    def annotate(self, records, view=None):
+        catalogue = (view or self.view).catalogue
+        known = [-1] * len(records)
+        if records:
+            known = catalogue.positions_of([r['id'] for r in records]).tolist()
+        has_neighbours = catalogue.has_artifact('neighbours')
+        video_ids = catalogue.column('video_id') if 'video_id' in catalogue else None
+        for record, position in zip(records, known):
+            record['has_similar'] = has_neighbours and position >= 0
+            if video_ids is not None and position >= 0 and not record.get('video_id'):
+                record['video_id'] = video_ids[position]
+        return records
+
+    def _records(self, view, positions):
+        return self.annotate(view.catalogue.records(positions), view)
+
+    # --- BROWSING ---
+    def languages(self):
+        return list(self.catalogue.partitions.languages)
+
+    @timed('sample')
+    def sample(self, emoji=None, lang=None, k=20):
+        # Draw straight from the prebuilt (mood, language) partition; only sampled rows are decoded.
+        # Re-releases share a cluster id, so a few extra draws leave k distinct songs.
+        view = self.view
+        clusters = view.catalogue.array('cluster_id')
+        positions = view.catalogue.sample(emoji, lang, k * CLUSTER_OVERSAMPLE if clusters is not None else k)
+        return self._records(view, one_per_cluster(positions, clusters, k))
+
+    def trending(self, lang=None, k=12):
+        return self.sample(lang=lang, k=k) or self.sample(k=k)
+
+    @timed('recommend')
+    def recommend(self, emoji=None, lang=None, k=20, user=None, diversity=DIVERSITY):
+        # Rank the partition against the user's likes (a random draw without any), then
+        # re-rank so artists, albums and songs don't repeat; `diversity` trades relevance
+        # (0) for variety (1). Catalogues without embeddings fall back to a plain draw.
+        view = self.view
+        profile = self.taste_profile(user, view) if user is not None else None
+        if profile is not None and not len(profile):
+            profile = None
+        picks = diverse_picks(view.catalogue, profile, emoji, lang, k, diversity,
+                              exclude_ids=list(profile.members) if profile is not None else ())
+        if len(picks):
+            return self._records(view, picks)
+        return self.sample(emoji, lang, k)
+
+    @timed('similar')
+    def similar(self, track_id, k=12):
+        # Neighbours are precomputed at training time, so this is a row lookup
+        view = self.view
+        neighbours = view.catalogue.array('neighbours')
+        position = int(view.catalogue.positions_of([track_id])[0])
+        if neighbours is None or position < 0:
+            return []
+        row = neighbours[position]
+        # Other releases of the same song are the closest neighbours, but not "more like this"
+        return self._records(view, one_per_cluster(row[row >= 0], view.catalogue.array('cluster_id'), k,
+                                                   exclude_positions=[position]))
+
+    def search(self, query, lang=None, limit=10):
+        """
+        Catalogue matches first, topped up from iTunes when they don't fill `limit`.
+        """
+        local = self.search_local(query, lang, limit)
+        if len(local) >= limit:
+            return local
+        remote = self.search_remote(query, lang, limit, exclude_ids=[song['id'] for song in local])
+        return local + remote[:limit - len(local)]
+
+    @timed('search_local')
+    def search_local(self, query, lang=None, limit=10):
+        """
+        Ranked catalogue tracks matching `query` (fuzzy and prefix trigram matching),
+        limited to `lang` when given. Answered offline from the prebuilt index; [] when
+        the catalogue has none.
+        """
+        view = self.view
+        if view.search_index is None:
+            return []
+        ranges = view.catalogue.partitions.ranges(lang=lang) if lang else None
+        if ranges == []:
+            return []
+        return self._records(view, view.search_index.search(query, limit, ranges))
+
+    @timed('search_remote')
+    def search_remote(self, query, lang=None, limit=10, exclude_ids=()):
+        """
+        Live iTunes search (cached and coalesced), with every result labelled with a
+        mood by one batched classifier call. Tracks in `exclude_ids` (e.g. those already
+        found locally) are dropped. Returns [] when the search fails.
+        """
+        key = f"{query.strip().lower()}|{limit}"
+        try:
+            cached = self.search_cache.get_or_load(key, lambda: self.search_fn(query, limit))
+        except Exception:
+            return []
+        exclude_ids = set(exclude_ids)
+        # Results are annotated in place, so work on copies of the cached dicts
+        results = [dict(r) for r in cached if r['id'] not in exclude_ids]
+        view = self.view
+        if view.mood_model is not None and results:
+            for song in results:
+                song['language'] = lang
+            from mood_model import predict_moods
+            with span('mood_labelling'):
+                emojis = predict_moods(view.mood_model, results)
+            for song, emoji in zip(results, emojis):
+                song['predicted_emoji'] = emoji
+        return self.annotate(results, view)
+
+    # --- LIKES ---
+    def taste_profile(self, user, view=None):
+        """
+        The user's taste profile, built once from their likes and kept in step with
+        like()/unlike(). Likes written by another process are picked up via the store
+        version.
+        """
+        view = view or self.view
+        version = self.liked_store.version(user)
+        with self.lock:
+            cached = self.profiles.get(user)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+        profile = TasteProfile.from_likes(view.catalogue, self.liked_store.songs(user))
+        with self.lock:
+            # Not cached when a reload swapped the catalogue (and its embeddings) meanwhile
+            if self.view is view:
+                self.profiles[user] = (version, profile)
+        return profile
+
+    def likes(self, user):
+        return self.annotate(self.liked_store.songs(user))
+
+    def _update_likes(self, user, write, adjust):
+        # Keep the cached profile only if no other process changed this user's likes
+        # since it was built; then apply the O(dim) adjustment instead of a rebuild
+        with self.lock:
+            view = self.view
+            cached = self.profiles.pop(user, None)
+        fresh = cached is not None and cached[1] is not None and cached[0] == self.liked_store.version(user)
+        write()
+        if fresh:
+            adjust(cached[1], view.catalogue)
+            with self.lock:
+                if self.view is view:
+                    self.profiles[user] = (self.liked_store.version(user), cached[1])
+
+    def like(self, user, song):
+        self._update_likes(user, lambda: self.liked_store.add(user, song),
+                           lambda profile, catalogue: profile.like(catalogue, song))
+
+    def unlike(self, user, track_id):
+        self._update_likes(user, lambda: self.liked_store.remove(user, track_id),
+                           lambda profile, catalogue: profile.unlike(track_id))
+
+    def stats(self):
+        catalogue = self.catalogue
+        return {'search_cache': self.search_cache.stats(), 'n_tracks': len(catalogue),
+                'catalogue_version': catalogue.version, 'cached_profiles': len(self.profiles)}
+
+
+class CatalogueWatcher:
+    """
+    Background thread that checks a catalogue root every `interval` seconds and
+    hot-reloads `engine` when training has published a new version. One per process:
+    forked service workers each start their own.
+    """
+
+    def __init__(self, engine, root=CATALOGUE_DIR, interval=RELOAD_INTERVAL):
+        self.engine = engine
+        self.root = root
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = None
+        # A version that failed to load is not retried until another is published
+        self.failed_version = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='catalogue-watcher', daemon=True)
+        self.thread.start()
+        return self
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            current = read_current(self.root)
+            if current is None or current['version'] == self.failed_version:
+                continue
+            try:
+                self.engine.reload(self.root)
+            except Exception as e:
+                # The old version keeps serving
+                self.failed_version = current['version']
+                incr('catalogue_reload_errors')
+                print(f"Catalogue {current['version']} failed to load: {e}")
+
+    def stop(self):
+        self.stopped.set()
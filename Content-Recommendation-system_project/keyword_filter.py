@@ -0,0 +1,86 @@
+import re
+
+import pandas as pd
+
+
+def compile_terms(terms, word_boundary=False):
+    """
+    One alternation regex for a list of keywords, longest first so overlapping terms
+    ('mix' / 'remix') report the more specific one. Returns None for an empty list.
+    """
+    terms = sorted({t.lower() for t in terms if t}, key=len, reverse=True)
+    if not terms:
+        return None
+    pattern = '|'.join(re.escape(t) for t in terms)
+    if word_boundary:
+        pattern = rf'\b(?:{pattern})\b'
+    return re.compile(f'({pattern})')
+
+
+class KeywordFilter:
+    """
+    Precompiled negative-keyword matcher for one mood: the global rules are checked
+    first, then the mood's own list, mirroring the order of the original scan.
+    """
+
+    def __init__(self, global_terms, mood_terms=(), word_boundary=False):
+        self.global_re = compile_terms(global_terms, word_boundary)
+        self.mood_re = compile_terms(mood_terms, word_boundary)
+
+    def reject_reason(self, text):
+        """
+        'global:<term>' or 'mood:<term>' for the rule that rejects `text`, else None.
+        """
+        text = text.lower()
+        for scope, regex in (('global', self.global_re), ('mood', self.mood_re)):
+            if regex is not None:
+                match = regex.search(text)
+                if match:
+                    return f'{scope}:{match.group(1)}'
+        return None
+
+    def classify(self, texts):
+        """
+        Vectorised reject_reason over a Series of texts; kept rows come back as NaN.
+        """
+        texts = texts.fillna('').astype(str).str.lower()
+        reasons = pd.Series(pd.NA, index=texts.index, dtype=object)
+        for scope, regex in (('global', self.global_re), ('mood', self.mood_re)):
+            if regex is None:
+                continue
+            pending = reasons.isna()
+            if not pending.any():
+                break
+            hits = texts[pending].str.extract(regex, expand=False).dropna()
+            reasons.loc[hits.index] = scope + ':' + hits
+        return reasons
+
+
+def build_filters(emoji_mapping, global_terms, word_boundary=False):
+    """
+    One KeywordFilter per mood emoji, built once and reused for every batch.
+    """
+    return {
+        emoji: KeywordFilter(global_terms, data.get('negative', []), word_boundary)
+        for emoji, data in emoji_mapping.items()
+    }
+
+
+def track_text(frame):
+    # Same "name artist album" haystack the crawl has always matched against
+    return (frame['name'].fillna('').astype(str) + ' ' +
+            frame['artist'].fillna('').astype(str) + ' ' +
+            frame['album'].fillna('').astype(str))
+
+
+def classify_tracks(frame, filters):
+    """
+    Reject reason for every row of `frame` (NaN where the track is kept). Rows are
+    grouped by `predicted_emoji` so each mood's matcher runs once over its whole batch.
+    """
+    texts = track_text(frame)
+    reasons = pd.Series(pd.NA, index=frame.index, dtype=object)
+    for emoji, index in frame.groupby('predicted_emoji', sort=False).groups.items():
+        if emoji in filters:
+            reasons.loc[index] = filters[emoji].classify(texts.loc[index])
+    return reasons
@@ -0,0 +1,99 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_STORE_PATH = 'liked_songs.sqlite'
+LEGACY_JSON_PATH = 'liked_songs.json'
+DEFAULT_USER = 'default'
+
+
+class LikedStore:
+    """
+    Liked songs in SQLite (WAL mode), one namespace per user. Each like or unlike is a
+    single-row transaction, so concurrent sessions never clobber each other's writes.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH, legacy_json=LEGACY_JSON_PATH):
+        self.path = path
+        # Streamlit runs sessions on separate threads; one connection, serialised by a lock
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS likes (
+                    user TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    liked_at REAL NOT NULL,
+                    song TEXT NOT NULL,
+                    PRIMARY KEY (user, id)
+                )
+            """)
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        if legacy_json:
+            self.migrate_json(legacy_json)
+
+    def migrate_json(self, json_path, user=DEFAULT_USER):
+        """
+        One-time import of the old whole-file liked_songs.json into `user`'s namespace.
+        Returns the number of songs imported (0 if already migrated or no file).
+        """
+        if not os.path.exists(json_path):
+            return 0
+        key = f'migrated:{os.path.abspath(json_path)}'
+        with self.lock, self.conn:
+            # Check, import and mark in one write transaction, so processes opening the
+            # store at once (e.g. the service's forked workers) import the file only once
+            self.conn.execute("BEGIN IMMEDIATE")
+            if self.conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+                return 0
+            with open(json_path, 'r') as f:
+                songs = json.load(f)
+            now = time.time()
+            # Keep the JSON order by spacing timestamps a microsecond apart
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO likes (user, id, liked_at, song) VALUES (?, ?, ?, ?)",
+                [(user, str(s['id']), now + i * 1e-6, json.dumps(s)) for i, s in enumerate(songs)])
+            self.conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)", (key, str(now)))
+        return len(songs)
+
+    def add(self, user, song):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO likes (user, id, liked_at, song) VALUES (?, ?, ?, ?)",
+                (user, str(song['id']), time.time(), json.dumps(song)))
+
+    def remove(self, user, song_id):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM likes WHERE user = ? AND id = ?", (user, str(song_id)))
+
+    def songs(self, user):
+        """
+        The user's liked songs, oldest first.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT song FROM likes WHERE user = ? ORDER BY liked_at", (user,)).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def ids(self, user):
+        with self.lock:
+            rows = self.conn.execute("SELECT id FROM likes WHERE user = ?", (user,)).fetchall()
+        return {r[0] for r in rows}
+
+    def version(self, user):
+        """
+        Cheap fingerprint of the user's likes; changes on every add or remove, so
+        per-process caches built from songs() can tell when they are stale.
+        """
+        with self.lock:
+            count, newest = self.conn.execute(
+                "SELECT COUNT(*), MAX(liked_at) FROM likes WHERE user = ?", (user,)).fetchone()
+        return count, newest
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,182 @@
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import requests
+
+# Weighted request mix: (name, weight). Search is left out by default because it
+# goes out to iTunes; add it with --mix search=1 to include it.
+DEFAULT_MIX = {'recommendations': 5, 'trending': 2, 'similar': 3, 'likes': 1}
+
+MOODS = ['😊', '😢', '😌', '🔥', '💪', '😴', '🥰', '😠', '🎉']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_local_service(workers):
+    """
+    Start service.py on a free port in a subprocess and wait until it answers.
+    Returns (process, base_url).
+    """
+    port = free_port()
+    here = os.path.dirname(os.path.abspath(__file__))
+    process = subprocess.Popen([sys.executable, os.path.join(here, 'service.py'),
+                                '--port', str(port), '--workers', str(workers)])
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        try:
+            requests.get(f"{url}/health", timeout=1)
+            return process, url
+        except requests.RequestException:
+            if process.poll() is not None:
+                sys.exit("service.py exited during startup")
+            time.sleep(0.1)
+    process.terminate()
+    sys.exit("service.py did not come up")
+
+
+def make_request(session, url, name, languages, track_ids, user):
+    if name == 'recommendations':
+        return session.get(f"{url}/recommendations", params={
+            'emoji': random.choice(MOODS), 'lang': random.choice(languages), 'k': 20, 'user': user})
+    if name == 'trending':
+        return session.get(f"{url}/trending", params={'lang': random.choice(languages), 'k': 12})
+    if name == 'similar':
+        return session.get(f"{url}/similar", params={'id': random.choice(track_ids), 'k': 12})
+    if name == 'likes':
+        return session.get(f"{url}/users/{user}/likes")
+    if name == 'search':
+        return session.get(f"{url}/search", params={'q': random.choice(['love', 'rain', 'night', 'dance'])})
+    raise ValueError(f"unknown request type {name}")
+
+
+def run_load(url, duration=10.0, concurrency=8, mix=None, users=20, seed=0):
+    """
+    Hammer `url` from `concurrency` threads (one keep-alive Session each) for
+    `duration` seconds. Returns a report dict with throughput and p50/p99 per endpoint.
+    """
+    mix = mix or DEFAULT_MIX
+    names, weights = list(mix), list(mix.values())
+    setup = requests.Session()
+    languages = setup.get(f"{url}/languages").json() or [None]
+    tracks = setup.get(f"{url}/trending", params={'k': 200}).json()
+    track_ids = [t['id'] for t in tracks]
+    # Give some users a few likes so personalised ranking is exercised too
+    user_ids = [f"loadtest-{i}" for i in range(users)]
+    seeded = [(user, track) for user in user_ids[:users // 2]
+              for track in random.Random(user).sample(tracks, min(5, len(tracks)))]
+    for user, track in seeded:
+        setup.put(f"{url}/users/{user}/likes/{track['id']}", json=track)
+
+    samples = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        session = requests.Session()
+        local = {name: [] for name in names}
+        failed = {name: 0 for name in names}
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                ok = make_request(session, url, name, languages, track_ids, rng.choice(user_ids)).ok
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - started
+            if ok:
+                local[name].append(elapsed)
+            else:
+                failed[name] += 1
+        with lock:
+            for name in names:
+                samples[name].extend(local[name])
+                errors[name] += failed[name]
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    for user, track in seeded:
+        setup.delete(f"{url}/users/{user}/likes/{track['id']}")
+
+    def summary(latencies, n_errors):
+        ms = np.asarray(latencies) * 1000
+        return {'requests': len(ms), 'errors': n_errors,
+                'throughput_rps': len(ms) / wall,
+                'p50_ms': float(np.percentile(ms, 50)) if len(ms) else None,
+                'p99_ms': float(np.percentile(ms, 99)) if len(ms) else None}
+
+    every = [x for name in names for x in samples[name]]
+    return {'url': url, 'duration_s': wall, 'concurrency': concurrency,
+            'overall': summary(every, sum(errors.values())),
+            'endpoints': {name: summary(samples[name], errors[name]) for name in names}}
+
+
+def print_report(report):
+    print(f"{report['concurrency']} clients for {report['duration_s']:.1f}s against {report['url']}")
+    print(f"{'endpoint':<16}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    rows = list(report['endpoints'].items()) + [('overall', report['overall'])]
+    for name, row in rows:
+        p50 = f"{row['p50_ms']:.2f}" if row['p50_ms'] is not None else '-'
+        p99 = f"{row['p99_ms']:.2f}" if row['p99_ms'] is not None else '-'
+        print(f"{name:<16}{row['requests']:>10}{row['errors']:>8}{row['throughput_rps']:>10.1f}{p50:>10}{p99:>10}")
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load-test the recommendation service.")
+    parser.add_argument('--url', help="Service to test. Without it a local service.py is started.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Worker processes for the local service.")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds to run.")
+    parser.add_argument('--concurrency', type=int, default=8, help="Concurrent client threads.")
+    parser.add_argument('--mix', type=parse_mix, default=None,
+                        help="Request mix, e.g. 'recommendations=5,similar=3,search=1'.")
+    parser.add_argument('--json', help="Also write the report to this JSON file.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_local_service(args.workers)
+    try:
+        report = run_load(url.rstrip('/'), args.duration, args.concurrency, args.mix)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Every exported metric name starts with this
+PREFIX = 'emotify'
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Set to a file path to have the app export its metrics there periodically
+METRICS_FILE_ENV = 'EMOTIFY_METRICS_FILE'
+
+DEFAULT_PROFILE_DIR = os.path.join('data', 'profiles')
+
+# Reruns slower than this (seconds) are kept when profiling is on
+DEFAULT_PROFILE_THRESHOLD = 0.5
+
+
+def label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def escape_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{escape_value(v)}"' for k, v in labels) + '}'
+
+
+class Metrics:
+    """
+    Thread-safe registry of counters and latency histograms for one process.
+
+    span() times a block, incr() bumps a counter, and register() adds a collector:
+    a callable returning {key: number} (e.g. TTLCache.stats) that is read at export
+    time. Export as Prometheus text (to_prometheus) or as a JSON snapshot; write()
+    picks the format from the file extension.
+    """
+
+    def __init__(self, prefix=PREFIX, buckets=BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        # Added to every exported series, e.g. the worker pid in a pre-forked service
+        self.const_labels = {}
+        self.counters = {}  # (name, labels) -> value
+        self.timings = {}  # (name, labels) -> {'buckets': [...], 'count', 'sum', 'max'}
+        self.collectors = {}  # name -> callable
+        self.lock = threading.Lock()
+
+    def incr(self, name, value=1, **labels):
+        key = (name, label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, label_key(labels))
+        with self.lock:
+            timing = self.timings.get(key)
+            if timing is None:
+                timing = {'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0, 'max': 0.0}
+                self.timings[key] = timing
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    timing['buckets'][i] += 1
+                    break
+            timing['count'] += 1
+            timing['sum'] += seconds
+            timing['max'] = max(timing['max'], seconds)
+
+    @contextmanager
+    def span(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def timed(self, name, **labels):
+        """
+        Decorator form of span().
+        """
+        def decorate(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name, **labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def register(self, name, collector):
+        # A later registration under the same name replaces the earlier one
+        with self.lock:
+            self.collectors[name] = collector
+
+    def _collect(self):
+        with self.lock:
+            collectors = list(self.collectors.items())
+        collected = {}
+        for name, collector in collectors:
+            try:
+                values = collector()
+            except Exception as e:
+                print(f"Metrics collector {name} failed: {e}")
+                continue
+            collected[name] = {k: v for k, v in values.items()
+                               if isinstance(v, (int, float)) and not isinstance(v, bool)}
+        return collected
+
+    def snapshot(self):
+        """
+        JSON-ready view of everything recorded so far.
+        """
+        with self.lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            timings = [{'name': name, 'labels': dict(labels), 'count': t['count'],
+                        'total_ms': t['sum'] * 1000, 'mean_ms': t['sum'] * 1000 / t['count'],
+                        'max_ms': t['max'] * 1000}
+                       for (name, labels), t in sorted(self.timings.items())]
+        return {'timestamp': time.time(), 'labels': dict(self.const_labels), 'counters': counters,
+                'timings': timings, 'collected': self._collect()}
+
+    def to_prometheus(self):
+        """
+        Prometheus text exposition format (version 0.0.4).
+        """
+        const = label_key(self.const_labels)
+        with self.lock:
+            counters = sorted(self.counters.items())
+            timings = sorted((key, dict(t, buckets=list(t['buckets']))) for key, t in self.timings.items())
+        lines = []
+        typed = set()
+
+        def declare(metric, kind):
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} {kind}")
+
+        for (name, labels), value in counters:
+            metric = f"{self.prefix}_{name}_total"
+            declare(metric, 'counter')
+            lines.append(f"{metric}{format_labels(const + labels)} {value}")
+        for (name, labels), t in timings:
+            metric = f"{self.prefix}_{name}_seconds"
+            declare(metric, 'histogram')
+            cumulative = 0
+            for bound, count in zip(self.buckets, t['buckets']):
+                cumulative += count
+                lines.append(f"{metric}_bucket{format_labels(const + labels + (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{metric}_bucket{format_labels(const + labels + (('le', '+Inf'),))} {t['count']}")
+            lines.append(f"{metric}_sum{format_labels(const + labels)} {t['sum']}")
+            lines.append(f"{metric}_count{format_labels(const + labels)} {t['count']}")
+        for name, values in self._collect().items():
+            for key, value in sorted(values.items()):
+                metric = f"{self.prefix}_{name}_{key}"
+                declare(metric, 'gauge')
+                lines.append(f"{metric}{format_labels(const)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """
+        Atomically write Prometheus text (for a `.prom` path, the node_exporter
+        textfile format) or a JSON snapshot (anything else).
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            if path.endswith('.prom'):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    def start_exporter(self, path, interval=10.0):
+        """
+        Rewrite `path` every `interval` seconds from a daemon thread.
+        """
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.write(path)
+                except OSError as e:
+                    print(f"Metrics export to {path} failed: {e}")
+        thread = threading.Thread(target=loop, name='metrics-exporter', daemon=True)
+        thread.start()
+        return thread
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.timings.clear()
+
+
+# Process-wide registry used by every module
+REGISTRY = Metrics()
+span = REGISTRY.span
+timed = REGISTRY.timed
+incr = REGISTRY.incr
+observe = REGISTRY.observe
+register = REGISTRY.register
+
+
+# --- PROFILING ---
+# The interpreter allows one profiler at a time, so concurrent sessions take turns
+_profiler_lock = threading.Lock()
+
+
+class Profiler:
+    """
+    Opt-in profiler for slow runs (e.g. one per Streamlit session with ?profile=1).
+
+    start()/stop() bracket a run; a run that was never stopped (the script was cut
+    short by a rerun) is finished by the next start(). Runs slower than `threshold`
+    seconds are saved under `out_dir` and summarised in `last_report`. Uses
+    pyinstrument when asked for and installed, else cProfile.
+    """
+
+    def __init__(self, threshold=DEFAULT_PROFILE_THRESHOLD, out_dir=DEFAULT_PROFILE_DIR, backend='cprofile'):
+        self.threshold = threshold
+        self.out_dir = out_dir
+        self.backend = backend
+        self.active = None  # (profiler, label, started)
+        self.last_report = None
+        self.last_path = None
+
+    def _new_profiler(self):
+        if self.backend == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler as InstrumentProfiler
+                return InstrumentProfiler()
+            except ImportError:
+                print("pyinstrument is not installed; profiling with cProfile")
+                self.backend = 'cprofile'
+        return cProfile.Profile()
+
+    def start(self, label='run'):
+        self.stop()
+        if not _profiler_lock.acquire(blocking=False):
+            return False
+        profiler = self._new_profiler()
+        try:
+            if isinstance(profiler, cProfile.Profile):
+                profiler.enable()
+            else:
+                profiler.start()
+        except Exception:
+            _profiler_lock.release()
+            raise
+        self.active = (profiler, label, time.perf_counter())
+        return True
+
+    def stop(self):
+        """
+        Finish the current run. Returns the saved profile's path if it was slow enough.
+        """
+        if self.active is None:
+            return None
+        profiler, label, started = self.active
+        self.active = None
+        try:
+            if isinstance(profiler, cProfile.Profile):
+                profiler.disable()
+            else:
+                profiler.stop()
+        finally:
+            _profiler_lock.release()
+        elapsed = time.perf_counter() - started
+        observe('profiled_run', elapsed, label=label)
+        if elapsed < self.threshold:
+            return None
+        incr('slow_runs', label=label)
+        return self._save(profiler, label, elapsed)
+
+    def _save(self, profiler, label, elapsed):
+        os.makedirs(self.out_dir, exist_ok=True)
+        stem = os.path.join(self.out_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{label}-{int(elapsed * 1000)}ms")
+        if isinstance(profiler, cProfile.Profile):
+            path = f"{stem}.prof"
+            profiler.dump_stats(path)
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(25)
+            report = out.getvalue()
+        else:
+            path = f"{stem}.html"
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(profiler.output_html())
+            report = profiler.output_text()
+        self.last_path = path
+        self.last_report = f"{label}: {elapsed * 1000:.0f} ms, saved to {path}\n{report}"
+        return path
@@ -0,0 +1,146 @@
+import time
+
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import make_pipeline, make_union
+
+# Track fields the classifier reads, in document order
+TEXT_FIELDS = ['name', 'artist', 'album', 'language']
+
+# Batch size used for the latency report (one page of search results)
+LATENCY_BATCH = 10
+
+# Smaller catalogues are fitted without scoring a held-out split first
+MIN_HELD_OUT_ROWS = 50
+
+
+def track_documents(records):
+    """
+    One lowercase "name artist album language" document per track record (dict).
+    """
+    return [' '.join(str(r.get(f) or '') for f in TEXT_FIELDS).lower() for r in records]
+
+
+class MoodModel:
+    """
+    Inference wrapper around the fitted pipeline. Scores with a C-contiguous float32
+    weight matrix instead of the classifier's predict(), which transposes the
+    (classes x features) coefficients on every call and dominates small batches.
+    """
+
+    def __init__(self, pipeline):
+        self.features = pipeline[:-1]
+        classifier = pipeline[-1]
+        self.weights = np.ascontiguousarray(classifier.coef_.T, dtype=np.float32)
+        self.intercept = classifier.intercept_.astype(np.float32)
+        self.classes = classifier.classes_
+
+    def decision_function(self, documents):
+        return self.features.transform(documents) @ self.weights + self.intercept
+
+    def predict(self, documents):
+        return self.classes[np.argmax(self.decision_function(documents), axis=1)]
+
+
+def build_mood_model():
+    # Hashed features keep the model small and need no vocabulary pass; character
+    # n-grams carry transliterated titles (Hindi, Telugu) that word tokens miss.
+    features = make_union(
+        HashingVectorizer(analyzer='word', ngram_range=(1, 2), n_features=2 ** 16,
+                          alternate_sign=False, norm=None, dtype=np.float32),
+        HashingVectorizer(analyzer='char_wb', ngram_range=(2, 4), n_features=2 ** 16,
+                          alternate_sign=False, norm=None, dtype=np.float32),
+    )
+    classifier = SGDClassifier(loss='modified_huber', alpha=1e-5, max_iter=50,
+                               class_weight='balanced', n_jobs=-1, random_state=42)
+    return make_pipeline(features, TfidfTransformer(sublinear_tf=True), classifier)
+
+
+def measure_latency(model, records, batch=LATENCY_BATCH, rounds=50):
+    """
+    Median and p95 wall time (ms) of predict_moods on `batch` records.
+    """
+    sample = records[:batch]
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        predict_moods(model, sample)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {'batch': len(sample), 'median_ms': float(np.median(timings)),
+            'p95_ms': float(np.percentile(timings, 95))}
+
+
+def held_out_split(labels, test_size):
+    """
+    (train, test) row indices for scoring the classifier, or None when the catalogue
+    is too small to hold rows out or the training rows would carry a single label.
+    """
+    if len(labels) < MIN_HELD_OUT_ROWS:
+        return None
+    counts = np.unique(labels, return_counts=True)[1]
+    n_test = int(np.ceil(test_size * len(labels)))
+    # Stratifying needs two rows per label and a row per label on either side
+    stratified = counts.min() >= 2 and min(n_test, len(labels) - n_test) >= len(counts)
+    train_idx, test_idx = train_test_split(np.arange(len(labels)), test_size=test_size,
+                                           random_state=42, stratify=labels if stratified else None)
+    if len(np.unique(labels[train_idx])) < 2:
+        return None
+    return train_idx, test_idx
+
+
+def train_mood_model(df, label='predicted_emoji', test_size=0.2):
+    """
+    Fit the classifier on the catalogue's keyword-derived labels. Scores a held-out
+    split first (when there are enough rows), then refits on every row. Returns
+    (model, report); the model is None, with the reason in report['skipped'], when
+    the catalogue carries fewer than two labels.
+    """
+    records = df[TEXT_FIELDS].to_dict('records')
+    labels = df[label].to_numpy()
+    if df[label].nunique() < 2:
+        return None, {'n_train': int(len(df)), 'skipped': f"{df[label].nunique()} mood label(s) in the catalogue, need 2"}
+
+    report = {'n_train': int(len(df)), 'n_test': 0, 'accuracy': None, 'macro_f1': None}
+    split = held_out_split(labels, test_size)
+    if split is not None:
+        train_idx, test_idx = split
+        pipeline = build_mood_model()
+        start = time.perf_counter()
+        pipeline.fit(track_documents([records[i] for i in train_idx]), labels[train_idx])
+        fit_seconds = time.perf_counter() - start
+        predicted = predict_moods(MoodModel(pipeline), [records[i] for i in test_idx])
+        report = {
+            'n_train': int(len(train_idx)),
+            'n_test': int(len(test_idx)),
+            'accuracy': float(accuracy_score(labels[test_idx], predicted)),
+            'macro_f1': float(f1_score(labels[test_idx], predicted, average='macro')),
+            'fit_seconds': fit_seconds,
+        }
+
+    model = MoodModel(build_mood_model().fit(track_documents(records), labels))
+    report['latency'] = measure_latency(model, records)
+    return model, report
+
+
+def describe_report(report):
+    """
+    One line summarising a train_mood_model report, for the training log.
+    """
+    if 'skipped' in report:
+        return f"no mood classifier: {report['skipped']}"
+    if not report['n_test']:
+        return f"too few tracks ({report['n_train']}) to hold any out; fitted without scoring"
+    return (f"accuracy {report['accuracy']:.3f}, macro F1 {report['macro_f1']:.3f} "
+            f"on {report['n_test']} held-out tracks")
+
+
+def predict_moods(model, records):
+    """
+    Predicted mood emoji for every record in one vectorised call.
+    """
+    if not records:
+        return []
+    return model.predict(track_documents(records)).tolist()
@@ -0,0 +1,230 @@
+import numpy as np
+import pandas as pd
+
+# Most rows scored per request. A larger partition is scored through a random
+# contiguous window of this size, which keeps one ranking pass (matrix-vector product
+# over 32-d float32 embeddings plus top-k) inside a ~20 ms budget on a single core.
+MAX_CANDIDATES = 500_000
+
+# Candidates re-ranked for diversity per request: the top of the personalised ranking,
+# or a random draw from the partition without likes. MMR over this many 32-d vectors
+# fills a 48-track page in about 15 ms on a single core, growing linearly with the pool.
+DIVERSITY_POOL = 20_000
+
+# Relevance vs diversity: 0 ranks by relevance alone, 1 by distance from the picks so far
+DIVERSITY = 0.3
+
+# Tracks allowed per artist and per album in one list
+MAX_PER_ARTIST = 2
+MAX_PER_ALBUM = 1
+
+
+def embed_tracks(catalogue, records):
+    """
+    Content embeddings for track dicts: catalogue rows are looked up, anything else
+    (e.g. search results) goes through the stored text encoder.
+    """
+    embeddings = catalogue.array('embeddings')
+    if embeddings is None or not records:
+        return None
+    vectors = np.zeros((len(records), embeddings.shape[1]), dtype=np.float32)
+    positions = catalogue.positions_of([r['id'] for r in records])
+    known = positions >= 0
+    vectors[known] = embeddings[positions[known]]
+    if known.all():
+        # The encoder (and scikit-learn with it) only loads for tracks outside the catalogue
+        return vectors
+    encoder = catalogue.load_object('text_encoder')
+    if encoder is not None:
+        vectors[~known] = encoder.embed([r for r, k in zip(records, known) if not k])
+    return vectors
+
+
+class TasteProfile:
+    """
+    Running sum of the embeddings of a user's liked tracks. Likes and unlikes adjust
+    it in O(dim), so the profile is never rebuilt from the full list.
+    """
+
+    def __init__(self, dim):
+        self.total = np.zeros(dim, dtype=np.float32)
+        self.members = {}
+
+    @classmethod
+    def from_likes(cls, catalogue, liked_songs):
+        embeddings = catalogue.array('embeddings')
+        if embeddings is None:
+            return None
+        profile = cls(embeddings.shape[1])
+        vectors = embed_tracks(catalogue, liked_songs)
+        for song, vector in zip(liked_songs, vectors if vectors is not None else []):
+            profile._add(song['id'], vector)
+        return profile
+
+    def _add(self, track_id, vector):
+        if track_id not in self.members:
+            self.members[track_id] = vector
+            self.total += vector
+
+    def like(self, catalogue, song):
+        vectors = embed_tracks(catalogue, [song])
+        if vectors is not None:
+            self._add(song['id'], vectors[0])
+
+    def unlike(self, song_id):
+        vector = self.members.pop(song_id, None)
+        if vector is not None:
+            self.total -= vector
+
+    def __len__(self):
+        return len(self.members)
+
+    def vector(self):
+        """
+        Unit-norm taste direction, or None when nothing has been liked.
+        """
+        norm = np.linalg.norm(self.total)
+        if not self.members or norm == 0:
+            return None
+        return self.total / norm
+
+
+def personalized_picks(catalogue, profile, emoji=None, lang=None, k=20,
+                       exclude_ids=(), max_candidates=MAX_CANDIDATES, rng=None):
+    """
+    Row positions of the top-k tracks in the (emoji, lang) partition by cosine similarity
+    to the taste profile, skipping `exclude_ids`. Partition blocks are contiguous, so each
+    block is scored as a view of the memory-mapped embeddings in one matrix-vector product.
+    """
+    embeddings = catalogue.array('embeddings')
+    taste = profile.vector() if profile is not None else None
+    if embeddings is None or taste is None:
+        return np.zeros(0, dtype=np.int64)
+
+    rng = rng or np.random.default_rng()
+    budget = max_candidates
+    windows, scores = [], []
+    for start, stop in catalogue.partitions.ranges(emoji, lang):
+        if budget <= 0:
+            break
+        if stop - start > budget:
+            start = int(rng.integers(start, stop - budget + 1))
+            stop = start + budget
+        budget -= stop - start
+        windows.append((start, stop))
+        scores.append(embeddings[start:stop] @ taste)
+    if not scores:
+        return np.zeros(0, dtype=np.int64)
+    scores = np.concatenate(scores)
+    starts = np.array([w[0] for w in windows], dtype=np.int64)
+    stops = np.array([w[1] for w in windows], dtype=np.int64)
+    bases = np.concatenate([[0], np.cumsum(stops - starts)[:-1]])
+
+    # Mask excluded tracks by mapping their rows into the scored windows
+    n_masked = 0
+    if exclude_ids:
+        excluded = catalogue.positions_of(list(exclude_ids))
+        window = np.searchsorted(starts, excluded, side='right') - 1
+        inside = (excluded >= 0) & (window >= 0)
+        inside[inside] &= excluded[inside] < stops[window[inside]]
+        masked = np.unique(bases[window[inside]] + excluded[inside] - starts[window[inside]])
+        scores[masked] = -np.inf
+        n_masked = len(masked)
+
+    k = min(k, len(scores) - n_masked)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(scores, -k)[-k:]
+    top = top[np.argsort(-scores[top])]
+    # Map offsets in the concatenated scores back to catalogue rows
+    window = np.searchsorted(bases, top, side='right') - 1
+    return starts[window] + top - bases[window]
+
+
+# --- DIVERSITY ---
+def album_codes(df):
+    # One int32 code per (artist, album) pair, so "Greatest Hits" by two artists is two albums
+    albums = df['album'].fillna('').astype(str)
+    codes, _ = pd.factorize(df['artist'].fillna('').astype(str) + '\x1f' + albums)
+    return np.where(albums.to_numpy() == '', -1, codes).astype(np.int32)
+
+
+def mmr_rerank(vectors, relevance, k, diversity=DIVERSITY, groups=()):
+    """
+    Indices of up to `k` rows in pick order by Maximal Marginal Relevance: each step
+    takes the row maximising (1 - diversity) * relevance - diversity * (its highest
+    cosine similarity to the rows already picked), with relevance rescaled to [0, 1].
+
+    `groups` are (codes, cap) pairs of row-aligned integer codes, -1 meaning no group:
+    once `cap` rows of a code are picked, its other rows are skipped. Each step is one
+    matrix-vector product plus a few masks over the pool, so a list costs O(k * n * dim).
+    """
+    n = len(relevance)
+    relevance = np.asarray(relevance, dtype=np.float32)
+    span = relevance.max() - relevance.min() if n else 0
+    relevance = (relevance - relevance.min()) / span if span > 0 else np.zeros(n, dtype=np.float32)
+    gain = (1 - diversity) * relevance
+    closest = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    # Per group: pool-local codes and how many of each have been picked
+    groups = [(np.asarray(codes), cap, {}) for codes, cap in groups]
+    picked = []
+    for _ in range(min(k, n)):
+        score = np.where(available, gain - diversity * closest, -np.inf)
+        best = int(np.argmax(score))
+        if not available[best]:
+            break
+        picked.append(best)
+        available[best] = False
+        np.maximum(closest, vectors @ vectors[best], out=closest)
+        for codes, cap, counts in groups:
+            code = codes[best]
+            if code < 0:
+                continue
+            counts[code] = counts.get(code, 0) + 1
+            if counts[code] >= cap:
+                available &= codes != code
+    return np.asarray(picked, dtype=np.int64)
+
+
+def diverse_picks(catalogue, profile, emoji=None, lang=None, k=20, diversity=DIVERSITY,
+                  exclude_ids=(), pool=DIVERSITY_POOL, rng=None):
+    """
+    Row positions of `k` tracks from the (emoji, lang) partition, re-ranked with
+    mmr_rerank over the catalogue's embeddings. With a taste profile the candidates
+    are its `pool` best matches and relevance is their score; without one they are a
+    random draw in random order. At most MAX_PER_ARTIST tracks per artist,
+    MAX_PER_ALBUM per album and one per near-duplicate cluster are kept, and songs in
+    the clusters of `exclude_ids` are skipped. Empty when there are no embeddings.
+    """
+    embeddings = catalogue.array('embeddings')
+    if embeddings is None:
+        return np.zeros(0, dtype=np.int64)
+    rng = rng or np.random.default_rng()
+    taste = profile.vector() if profile is not None else None
+    if taste is not None:
+        positions = personalized_picks(catalogue, profile, emoji, lang, pool, exclude_ids=exclude_ids, rng=rng)
+    else:
+        positions = catalogue.sample(emoji, lang, pool, rng=rng)
+    if not len(positions):
+        return positions
+
+    clusters = catalogue.array('cluster_id')
+    if clusters is not None and len(exclude_ids):
+        excluded = catalogue.positions_of(list(exclude_ids))
+        positions = positions[~np.isin(clusters[positions], clusters[excluded[excluded >= 0]])]
+    # Rows gathered in storage order read the memory-mapped arrays sequentially
+    positions = np.sort(positions)
+    vectors = np.asarray(embeddings[positions], dtype=np.float32)
+    relevance = vectors @ taste if taste is not None else rng.random(len(positions), dtype=np.float32)
+
+    groups = []
+    artists = catalogue.column('artist') if 'artist' in catalogue else None
+    if hasattr(artists, 'codes'):
+        groups.append((artists.codes[positions], MAX_PER_ARTIST))
+    albums = catalogue.array('album_code')
+    if albums is not None:
+        groups.append((albums[positions], MAX_PER_ALBUM))
+    if clusters is not None:
+        groups.append((clusters[positions], 1))
+    return positions[mmr_rerank(vectors, relevance, k, diversity, groups)]
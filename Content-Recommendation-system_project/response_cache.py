@@ -0,0 +1,73 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join('data', 'itunes_cache.sqlite')
+DEFAULT_TTL = 7 * 24 * 3600  # one week
+
+
+class ResponseCache:
+    """
+    Persistent cache of iTunes search responses keyed by (term, limit).
+
+    Every response is committed as soon as it arrives, so the cache doubles as the
+    crawl checkpoint: an interrupted crawl re-run only fetches what is missing or stale.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Crawler workers write from their own threads, so serialise access ourselves
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    term TEXT NOT NULL,
+                    lim INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    results TEXT NOT NULL,
+                    PRIMARY KEY (term, lim)
+                )
+            """)
+
+    def is_fresh(self, fetched_at, now=None):
+        now = time.time() if now is None else now
+        return self.ttl is None or now - fetched_at < self.ttl
+
+    def get(self, term, limit):
+        """
+        Cached results for (term, limit), or None if missing or older than the TTL.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT fetched_at, results FROM responses WHERE term = ? AND lim = ?",
+                (term, limit)).fetchone()
+        if row is None or not self.is_fresh(row[0]):
+            return None
+        return json.loads(row[1])
+
+    def put(self, term, limit, results):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (term, lim, fetched_at, results) VALUES (?, ?, ?, ?)",
+                (term, limit, time.time(), json.dumps(results)))
+
+    def stale_terms(self, terms, limit):
+        """
+        The subset of `terms` (order preserved) with no fresh entry for `limit`.
+        """
+        with self.lock:
+            fetched = dict(self.conn.execute(
+                "SELECT term, fetched_at FROM responses WHERE lim = ?", (limit,)).fetchall())
+        now = time.time()
+        return [t for t in terms if t not in fetched or not self.is_fresh(fetched[t], now)]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
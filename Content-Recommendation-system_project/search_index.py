@@ -0,0 +1,155 @@
+import re
+
+import numpy as np
+
+# Share of the query's trigrams a track must contain to match (tolerates typos)
+MIN_COVERAGE = 0.5
+
+# Weight of "how much of the track the query covers" when ranking equally good matches,
+# so a short exact title beats a long one that merely contains the words
+SPECIFICITY_WEIGHT = 0.25
+
+# Bonus when the last query word is also a whole word of the track, so a finished
+# word ranks its exact match above the longer words it is a prefix of
+WHOLE_WORD_BONUS = 0.1
+
+# Catalogue arrays holding the index
+INDEX_ARRAYS = ('search_terms', 'search_offsets', 'search_postings', 'search_lengths')
+
+NON_WORD = re.compile(r'[\W_]+')
+
+
+def search_documents(df):
+    # Everything a user is likely to type: title, artist and album
+    return (df['name'].fillna('') + ' ' + df['artist'].fillna('') + ' ' + df['album'].fillna('')).tolist()
+
+
+def trigram_keys(text, prefix_last=False):
+    """
+    Distinct character trigrams of every word in `text`, each packed into one int64
+    (three 21-bit code points, so non-Latin scripts are indexed exactly). Words are
+    padded with spaces; with `prefix_last` the final word gets no trailing pad, so a
+    half-typed word matches every word it starts.
+    """
+    words = NON_WORD.sub(' ', str(text).casefold()).split()
+    keys = set()
+    for i, word in enumerate(words):
+        padded = f" {word}" if prefix_last and i == len(words) - 1 else f" {word} "
+        codes = [ord(c) for c in padded]
+        for j in range(len(codes) - 2):
+            keys.add((codes[j] << 42) | (codes[j + 1] << 21) | codes[j + 2])
+    return keys
+
+
+class SearchIndexBuilder:
+    """
+    Inverted trigram index built from documents fed in row order, in chunks.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.lengths = []
+
+    def add(self, documents):
+        lengths = np.zeros(len(documents), dtype=np.int32)
+        chunk = []
+        for i, text in enumerate(documents):
+            keys = trigram_keys(text)
+            lengths[i] = len(keys)
+            chunk.extend(keys)
+        self.keys.append(np.asarray(chunk, dtype=np.int64))
+        self.lengths.append(lengths)
+
+    def finish(self):
+        """
+        CSR arrays for the catalogue: sorted trigram keys, the offsets of each key's
+        postings, the postings (row positions, ascending per key) and the number of
+        distinct trigrams per row.
+        """
+        lengths = np.concatenate(self.lengths) if self.lengths else np.zeros(0, dtype=np.int32)
+        keys = np.concatenate(self.keys) if self.keys else np.zeros(0, dtype=np.int64)
+        rows = np.repeat(np.arange(len(lengths), dtype=np.int32), lengths)
+        order = np.lexsort((rows, keys))
+        keys, rows = keys[order], rows[order]
+        terms, starts = np.unique(keys, return_index=True)
+        offsets = np.append(starts, len(keys)).astype(np.int64)
+        return {'search_terms': terms, 'search_offsets': offsets,
+                'search_postings': rows, 'search_lengths': lengths}
+
+
+def build_search_index(df):
+    """
+    Index a partition-ordered catalogue frame. Returns arrays for write_catalogue.
+    """
+    builder = SearchIndexBuilder()
+    builder.add(search_documents(df))
+    return builder.finish()
+
+
+class SearchIndex:
+    """
+    Fuzzy, prefix-aware full-text search over the catalogue's trigram index. A track
+    matches when it contains at least MIN_COVERAGE of the query's trigrams; matches are
+    ranked by coverage, then by how much of the track the query accounts for.
+    """
+
+    def __init__(self, terms, offsets, postings, lengths):
+        self.terms = terms
+        self.offsets = offsets
+        self.postings = postings
+        self.lengths = lengths
+
+    @classmethod
+    def from_catalogue(cls, catalogue):
+        # None for catalogues built without an index (legacy or sampled ones)
+        arrays = [catalogue.array(name) for name in INDEX_ARRAYS]
+        return cls(*arrays) if all(a is not None for a in arrays) else None
+
+    def _postings(self, key, ranges):
+        slot = np.searchsorted(self.terms, key)
+        if slot == len(self.terms) or self.terms[slot] != key:
+            return []
+        postings = self.postings[self.offsets[slot]:self.offsets[slot + 1]]
+        if ranges is None:
+            return [postings]
+        # Postings are sorted by row, so each row range is one contiguous slice
+        return [postings[np.searchsorted(postings, start):np.searchsorted(postings, stop)]
+                for start, stop in ranges]
+
+    def _rows(self, keys, ranges):
+        parts = [p for key in keys for p in self._postings(key, ranges) if len(p)]
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int32)
+
+    def search(self, query, limit=10, ranges=None):
+        """
+        Row positions of the best matches for `query`, best first, optionally limited
+        to `ranges` of rows (e.g. one language's partition).
+        """
+        keys = trigram_keys(query, prefix_last=True)
+        if not keys or limit <= 0:
+            return np.zeros(0, dtype=np.int64)
+        rows = self._rows(keys, ranges)
+        if not len(rows):
+            return np.zeros(0, dtype=np.int64)
+        base = int(rows.min())
+        span = int(rows.max()) - base + 1
+        if span <= 4 * len(rows):
+            # Dense enough to count with one bincount over the touched row span
+            counts = np.bincount(rows - base, minlength=span)
+            matched = np.flatnonzero(counts)
+            rows, counts = matched + base, counts[matched]
+        else:
+            rows, counts = np.unique(rows, return_counts=True)
+
+        coverage = counts / len(keys)
+        keep = coverage >= MIN_COVERAGE
+        rows, counts, coverage = rows[keep], counts[keep], coverage[keep]
+        score = coverage + SPECIFICITY_WEIGHT * counts / np.maximum(self.lengths[rows], 1)
+        # The last word's closing trigram(s), only present where it ends a word
+        whole_word = self._rows(trigram_keys(query) - keys, ranges)
+        if len(whole_word) and len(rows):
+            score = score + WHOLE_WORD_BONUS * np.isin(rows, whole_word)
+        if len(rows) > limit:
+            top = np.argpartition(-score, limit - 1)[:limit]
+            rows, score = rows[top], score[top]
+        return rows[np.argsort(-score, kind='stable')].astype(np.int64)
@@ -0,0 +1,33 @@
+import os
+
+import streamlit as st
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+from starlette.routing import Route
+
+from artwork import artwork_response, DEFAULT_ARTWORK_DIR, STATIC_ARTWORK_URL
+
+# Runs app.py with its artwork thumbnails served under long-lived cache headers:
+#   python -m streamlit run serve.py    (or: uvicorn serve:app)
+# Streamlit's own static route, all `streamlit run app.py` has, sends none.
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+
+
+def artwork_routes(root=DEFAULT_ARTWORK_DIR, base_path=''):
+    # Mounted where Streamlit serves static/artwork/, which user routes take precedence over
+    async def artwork(request):
+        found = await run_in_threadpool(artwork_response, root, request.path_params['path'],
+                                        request.headers.get('if-none-match'))
+        if found is None:
+            return Response(status_code=404)
+        status, headers, body = found
+        return Response(body, status_code=status, headers=headers)
+
+    prefix = f"/{base_path.strip('/')}" if base_path.strip('/') else ''
+    return [Route(f"{prefix}/{STATIC_ARTWORK_URL}/{{path:path}}", artwork, methods=['GET'])]
+
+
+app = st.App(APP_SCRIPT, routes=artwork_routes(base_path=st.get_option('server.baseUrlPath')))
+
+if __name__ == "__main__":
+    app.run()
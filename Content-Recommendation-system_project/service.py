@@ -0,0 +1,290 @@
+import argparse
+import json
+import os
+import signal
+import socket
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+
+import numpy as np
+
+from artwork import send_artwork, DEFAULT_ARTWORK_DIR
+from engine import RecommendationEngine, CatalogueWatcher, open_catalogue, preload, RELOAD_INTERVAL
+from liked_store import DEFAULT_USER
+from metrics import REGISTRY, span, incr
+from recommender import DIVERSITY
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8600
+
+# Largest list any endpoint hands out in one response
+MAX_K = 200
+
+# Metric label per endpoint; anything else is counted as 'other' to keep labels bounded
+ROUTES = {'health', 'languages', 'stats', 'metrics', 'recommendations', 'trending', 'similar',
+          'search', 'users', 'artwork'}
+
+
+def to_json(value):
+    # Catalogue columns can hand back NumPy scalars
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class ServiceError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def int_param(params, name, default):
+    try:
+        return max(1, min(MAX_K, int(params.get(name, default))))
+    except ValueError:
+        raise ServiceError(400, f"'{name}' must be an integer")
+
+
+def fraction_param(params, name, default):
+    try:
+        value = float(params.get(name, default))
+    except ValueError:
+        raise ServiceError(400, f"'{name}' must be a number")
+    if not 0 <= value <= 1:
+        raise ServiceError(400, f"'{name}' must be between 0 and 1")
+    return value
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON endpoints over a RecommendationEngine:
+
+        GET    /health
+        GET    /languages
+        GET    /stats
+        GET    /metrics                     (Prometheus text; ?format=json for a snapshot)
+        GET    /recommendations?emoji=&lang=&k=&user=&diversity=
+        GET    /trending?lang=&k=
+        GET    /similar?id=&k=
+        GET    /search?q=&lang=&limit=&source=&exclude=
+                                            (source: all, local or remote; exclude: ids to skip)
+        GET    /artwork/<xx>/<thumbnail>    (image; cached by browsers for a year)
+        GET    /users/<user>/likes
+        PUT    /users/<user>/likes/<id>     (body: the song as JSON)
+        DELETE /users/<user>/likes/<id>
+    """
+
+    # Keep-alive: clients reuse one connection for many requests
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out as separate writes; without this, Nagle plus delayed ACKs
+    # add ~40 ms to every keep-alive response
+    disable_nagle_algorithm = True
+    engine = None
+    artwork_dir = DEFAULT_ARTWORK_DIR
+
+    def log_message(self, format, *args):
+        # One line per request is too much under load; errors are still printed
+        pass
+
+    def send_json(self, status, payload):
+        self.send_body(status, json.dumps(payload, default=to_json).encode('utf-8'), 'application/json')
+
+    def send_body(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b'null')
+        except ValueError:
+            raise ServiceError(400, "body is not valid JSON")
+
+    def dispatch(self, method):
+        url = urlsplit(self.path)
+        parts = [unquote(p) for p in url.path.strip('/').split('/') if p]
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if method == 'GET' and parts == ['metrics'] and params.get('format') != 'json':
+            self.send_body(200, REGISTRY.to_prometheus().encode('utf-8'), 'text/plain; version=0.0.4')
+            return
+        route = parts[0] if parts and parts[0] in ROUTES else 'other'
+        if method == 'GET' and len(parts) == 3 and parts[0] == 'artwork':
+            with span('http_request', route=route, method=method):
+                if not send_artwork(self, self.artwork_dir, '/'.join(parts[1:])):
+                    incr('http_errors', route=route, status=404)
+                    self.send_json(404, {'error': 'no such artwork'})
+            return
+        try:
+            with span('http_request', route=route, method=method):
+                payload = self.route(method, parts, params)
+            self.send_json(200, payload)
+        except ServiceError as e:
+            incr('http_errors', route=route, status=e.status)
+            self.send_json(e.status, {'error': str(e)})
+        except Exception as e:
+            incr('http_errors', route=route, status=500)
+            print(f"Service error on {method} {self.path}: {e!r}")
+            self.send_json(500, {'error': 'internal error'})
+
+    def route(self, method, parts, params):
+        engine = self.engine
+        if method == 'GET' and len(parts) == 1:
+            name = parts[0]
+            if name == 'health':
+                return {'status': 'ok', 'pid': os.getpid()}
+            if name == 'languages':
+                return engine.languages()
+            if name == 'stats':
+                return engine.stats()
+            if name == 'metrics':
+                return REGISTRY.snapshot()
+            if name == 'recommendations':
+                return engine.recommend(params.get('emoji'), params.get('lang'), int_param(params, 'k', 20),
+                                        user=params.get('user'),
+                                        diversity=fraction_param(params, 'diversity', DIVERSITY))
+            if name == 'trending':
+                return engine.trending(params.get('lang'), int_param(params, 'k', 12))
+            if name == 'similar':
+                if 'id' not in params:
+                    raise ServiceError(400, "'id' is required")
+                return engine.similar(params['id'], int_param(params, 'k', 12))
+            if name == 'search':
+                if not params.get('q'):
+                    raise ServiceError(400, "'q' is required")
+                limit = int_param(params, 'limit', 10)
+                source = params.get('source', 'all')
+                if source == 'local':
+                    return engine.search_local(params['q'], params.get('lang'), limit)
+                if source == 'remote':
+                    exclude = [i for i in params.get('exclude', '').split(',') if i]
+                    return engine.search_remote(params['q'], params.get('lang'), limit, exclude_ids=exclude)
+                if source != 'all':
+                    raise ServiceError(400, "'source' must be all, local or remote")
+                return engine.search(params['q'], params.get('lang'), limit)
+        if len(parts) >= 3 and parts[0] == 'users' and parts[2] == 'likes':
+            user = parts[1] or DEFAULT_USER
+            if method == 'GET' and len(parts) == 3:
+                return engine.likes(user)
+            if method == 'PUT' and len(parts) == 4:
+                song = self.read_json()
+                if not isinstance(song, dict):
+                    raise ServiceError(400, "body must be a song object")
+                song['id'] = parts[3]
+                engine.like(user, song)
+                return {'liked': parts[3]}
+            if method == 'DELETE' and len(parts) == 4:
+                engine.unlike(user, parts[3])
+                return {'unliked': parts[3]}
+        raise ServiceError(404, f"no route for {method} /{'/'.join(parts)}")
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_PUT(self):
+        self.dispatch('PUT')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Pending connections queued by the kernel while every worker is busy
+    request_queue_size = 128
+
+
+def bind_socket(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(Server.request_queue_size)
+    return sock
+
+
+def serve_worker(sock, catalogue, artwork_dir=DEFAULT_ARTWORK_DIR, reload_interval=RELOAD_INTERVAL):
+    # Every worker keeps its own metrics; the label lets a scraper sum them
+    REGISTRY.const_labels = {'worker': str(os.getpid())}
+    # SQLite handles must not cross a fork, so each worker opens its own store and cache
+    engine = RecommendationEngine(catalogue)
+    # Threads don't survive a fork, so each worker watches for new versions itself
+    if reload_interval > 0:
+        CatalogueWatcher(engine, interval=reload_interval).start()
+    handler = type('Handler', (RequestHandler,), {'engine': engine, 'artwork_dir': artwork_dir})
+    server = Server(sock.getsockname(), handler, bind_and_activate=False)
+    server.socket = sock
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=1, artwork_dir=DEFAULT_ARTWORK_DIR,
+          reload_interval=RELOAD_INTERVAL):
+    """
+    Pre-fork server: the parent loads the memory-mapped catalogue (and its models)
+    once, binds the port, then forks `workers` processes that accept on the shared
+    socket. Pages of the catalogue are shared between workers through the OS page cache.
+    Workers check for a newly published version every `reload_interval` seconds
+    (0 disables) and swap it in without dropping requests.
+    """
+    catalogue = open_catalogue()
+    if catalogue is None:
+        sys.exit("Dataset not found. Please run `train_model.py` first.")
+    preload(catalogue)
+    sock = bind_socket(host, port)
+    print(f"Serving {len(catalogue)} tracks on http://{host}:{port} with {workers} worker(s)")
+
+    if workers <= 1 or not hasattr(os, 'fork'):
+        serve_worker(sock, catalogue, artwork_dir, reload_interval)
+        return
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            serve_worker(sock, catalogue, artwork_dir, reload_interval)
+            os._exit(0)
+        children.append(pid)
+
+    def stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for pid in children:
+        while True:
+            try:
+                os.waitpid(pid, 0)
+                break
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve recommendations, search and likes over HTTP.")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Worker processes sharing the listening socket.")
+    parser.add_argument('--artwork-dir', default=DEFAULT_ARTWORK_DIR,
+                        help="Thumbnail cache written by train_model.py, served under /artwork.")
+    parser.add_argument('--reload-interval', type=float, default=RELOAD_INTERVAL,
+                        help="Seconds between checks for a newly published catalogue (0 disables hot reload).")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    serve(args.host, args.port, args.workers, args.artwork_dir, args.reload_interval)
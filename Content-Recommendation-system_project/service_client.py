@@ -0,0 +1,80 @@
+from urllib.parse import quote
+
+# Environment variable that switches the app from the in-process engine to the service
+SERVICE_URL_ENV = 'EMOTIFY_SERVICE_URL'
+
+
+class ServiceClient:
+    """
+    HTTP client for service.py with the same methods as RecommendationEngine, so the
+    app can use either. One pooled keep-alive Session is shared by every caller
+    (Streamlit sessions run on separate threads).
+    """
+
+    def __init__(self, base_url, timeout=5, pool_size=32):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        # Imported here so the in-process app, which only reads SERVICE_URL_ENV, never loads requests
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.errors = requests.RequestException
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _request(self, method, path, params=None, json=None):
+        response = self.session.request(method, self.base_url + path, params=params, json=json,
+                                        timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _likes_path(self, user, track_id=None):
+        path = f"/users/{quote(user, safe='')}/likes"
+        return path if track_id is None else f"{path}/{quote(str(track_id), safe='')}"
+
+    def languages(self):
+        return self._request('GET', '/languages')
+
+    def sample(self, emoji=None, lang=None, k=20):
+        return self.recommend(emoji, lang, k)
+
+    def trending(self, lang=None, k=12):
+        return self._request('GET', '/trending', {'lang': lang, 'k': k})
+
+    def recommend(self, emoji=None, lang=None, k=20, user=None, diversity=None):
+        return self._request('GET', '/recommendations', {'emoji': emoji, 'lang': lang, 'k': k, 'user': user,
+                                                         'diversity': diversity})
+
+    def similar(self, track_id, k=12):
+        return self._request('GET', '/similar', {'id': track_id, 'k': k})
+
+    def _search(self, params):
+        try:
+            return self._request('GET', '/search', params)
+        except self.errors:
+            return []
+
+    def search(self, query, lang=None, limit=10):
+        return self._search({'q': query, 'lang': lang, 'limit': limit})
+
+    def search_local(self, query, lang=None, limit=10):
+        return self._search({'q': query, 'lang': lang, 'limit': limit, 'source': 'local'})
+
+    def search_remote(self, query, lang=None, limit=10, exclude_ids=()):
+        params = {'q': query, 'lang': lang, 'limit': limit, 'source': 'remote'}
+        if exclude_ids:
+            params['exclude'] = ','.join(exclude_ids)
+        return self._search(params)
+
+    def likes(self, user):
+        return self._request('GET', self._likes_path(user))
+
+    def like(self, user, song):
+        self._request('PUT', self._likes_path(user, song['id']), json=song)
+
+    def unlike(self, user, track_id):
+        self._request('DELETE', self._likes_path(user, track_id))
+
+    def stats(self):
+        return self._request('GET', '/stats')
@@ -0,0 +1,218 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+# Neighbours kept per track
+TOP_K = 12
+
+# Score matrix cells held at once (64 MB of float32); sets how many rows are scored per block
+BLOCK_CELLS = 16_000_000
+
+# Exact neighbours are quadratic in the catalogue; above this many tracks an inverted
+# file over the dense embeddings finds approximate ones instead
+EXACT_NEIGHBOURS_MAX_ROWS = 20_000
+
+# Inverted file: lists per square root of the catalogue size, lists probed per track,
+# rows and k-means iterations used to fit the list centroids
+IVF_LISTS_PER_SQRT = 2
+IVF_PROBES = 8
+IVF_TRAIN_ROWS = 50_000
+IVF_ITERATIONS = 10
+
+# Width of the dense content embedding used for scoring and re-ranking
+EMBEDDING_DIM = 32
+
+# Share of the similarity carried by audio features when a track has them
+AUDIO_WEIGHT = 0.3
+
+
+def similarity_documents(df):
+    # Artist is repeated so shared artists count for more than a shared word in a title
+    return (df['name'].fillna('') + ' ' + df['artist'].fillna('') + ' ' +
+            df['artist'].fillna('') + ' ' + df['album'].fillna('')).str.lower().tolist()
+
+
+class TextEncoder:
+    """
+    Fitted text pipeline: sparse TF-IDF vectors plus an SVD projection to a small dense
+    embedding, so tracks outside the catalogue (search results) land in the same space.
+    """
+
+    def __init__(self, vectorizer, svd):
+        self.vectorizer = vectorizer
+        self.svd = svd
+
+    def sparse(self, df):
+        return self.vectorizer.transform(similarity_documents(df)).tocsr()
+
+    def project(self, vectors):
+        if self.svd is None:
+            return np.zeros((vectors.shape[0], 0), dtype=np.float32)
+        return normalize(self.svd.transform(vectors)).astype(np.float32)
+
+    def embed(self, records):
+        """
+        Unit-norm dense embeddings (n, dim) for a list of track dicts.
+        """
+        df = pd.DataFrame(records, columns=['name', 'artist', 'album'])
+        return self.project(self.sparse(df))
+
+
+def fit_text_encoder(df, dim=EMBEDDING_DIM):
+    """
+    Fit the encoder on the catalogue. Returns (encoder, sparse vectors, embeddings).
+    """
+    vectorizer = TfidfVectorizer(analyzer='char_wb', ngram_range=(3, 4), min_df=2 if len(df) > 1 else 1,
+                                 sublinear_tf=True, dtype=np.float32)
+    vectors = vectorizer.fit_transform(similarity_documents(df)).tocsr()
+    n_components = min(dim, vectors.shape[1] - 1, vectors.shape[0] - 1)
+    svd = TruncatedSVD(n_components, random_state=42).fit(vectors) if n_components > 0 else None
+    encoder = TextEncoder(vectorizer, svd)
+    return encoder, vectors, encoder.project(vectors)
+
+
+def combine_features(text_vectors, audio=None, audio_weight=AUDIO_WEIGHT):
+    """
+    Append standardised audio features (rows of NaN where unavailable) to the text
+    vectors, weighted so a track's full vector still has unit norm. Sparse text vectors
+    give a sparse result, dense ones (embeddings) a dense one.
+    """
+    if audio is None:
+        return text_vectors
+    audio = np.asarray(audio, dtype=np.float32)
+    available = ~np.isnan(audio).any(axis=1)
+    scaled = np.zeros_like(audio)
+    if available.any():
+        mean = audio[available].mean(axis=0)
+        std = audio[available].std(axis=0) + 1e-6
+        scaled[available] = (audio[available] - mean) / std
+    scaled = normalize(scaled) * np.sqrt(audio_weight)
+    text_scale = np.where(available, np.sqrt(1 - audio_weight), 1.0).astype(np.float32)
+    if not sp.issparse(text_vectors):
+        return np.hstack([text_vectors * text_scale[:, None], scaled]).astype(np.float32)
+    text = sp.diags(text_scale) @ text_vectors
+    return sp.hstack([text, sp.csr_matrix(scaled)], format='csr')
+
+
+def _top_k(block, k):
+    # Column positions and scores of each row's k best, best first
+    top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(block, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+def _empty_neighbours(n, k):
+    return np.full((n, k), -1, dtype=np.int32), np.zeros((n, k), dtype=np.float32)
+
+
+def top_k_neighbours(vectors, k=TOP_K, block_size=None):
+    """
+    Exact cosine top-k for every row of an L2-normalised sparse matrix, computed one
+    block of rows at a time (by default as many as fit BLOCK_CELLS scores). Returns
+    (indices int32, scores float32), both (n, k), best first; rows with fewer than k
+    other tracks are padded with -1 / 0. Quadratic in n: build_similarity_index only
+    uses it up to EXACT_NEIGHBOURS_MAX_ROWS.
+    """
+    n = vectors.shape[0]
+    k_eff = min(k, max(n - 1, 0))
+    indices, scores = _empty_neighbours(n, k)
+    if k_eff == 0:
+        return indices, scores
+
+    block_size = block_size or max(1, BLOCK_CELLS // n)
+    vectors = vectors.tocsr()
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        # Products of these vectors are dense, and sparse x dense is much faster than
+        # sparse x sparse
+        block = np.ascontiguousarray((vectors @ vectors[start:stop].toarray().T).T)
+        # A track is never its own neighbour
+        block[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+        indices[start:stop, :k_eff], scores[start:stop, :k_eff] = _top_k(block, k_eff)
+    return indices, scores
+
+
+def _nearest(vectors, centroids):
+    # Index of each row's most similar centroid, a block of rows at a time
+    step = max(1, BLOCK_CELLS // len(centroids))
+    return np.concatenate([np.argmax(vectors[start:start + step] @ centroids.T, axis=1)
+                           for start in range(0, len(vectors), step)])
+
+
+def _fit_centroids(vectors, n_lists, rng):
+    # Spherical k-means on a sample: unit-norm centroids, seeded from sampled rows
+    sample = vectors[rng.choice(len(vectors), min(len(vectors), IVF_TRAIN_ROWS), replace=False)]
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(IVF_ITERATIONS):
+        assign = _nearest(sample, centroids)
+        members = sp.csr_matrix((np.ones(len(sample), dtype=np.float32), (assign, np.arange(len(sample)))),
+                                shape=(n_lists, len(sample)))
+        sums = members @ sample
+        norms = np.linalg.norm(sums, axis=1)
+        # A list that lost all its rows keeps its old centroid
+        kept = norms > 0
+        centroids[kept] = sums[kept] / norms[kept, None]
+    return centroids
+
+
+def approximate_neighbours(vectors, k=TOP_K, probes=IVF_PROBES, seed=0):
+    """
+    Approximate cosine top-k for every row of dense unit-norm `vectors`, as an inverted
+    file: rows are grouped by their nearest of about IVF_LISTS_PER_SQRT * sqrt(n)
+    k-means centroids, and each list's rows are scored exactly against the rows of the
+    `probes` lists whose centroids are closest to its own. Work grows as n^1.5 rather
+    than n^2. Same return value as top_k_neighbours; seeded, so reproducible.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n = len(vectors)
+    k_eff = min(k, max(n - 1, 0))
+    indices, scores = _empty_neighbours(n, k)
+    if k_eff == 0:
+        return indices, scores
+
+    rng = np.random.default_rng(seed)
+    n_lists = max(1, min(n, int(IVF_LISTS_PER_SQRT * np.sqrt(n))))
+    centroids = _fit_centroids(vectors, n_lists, rng)
+    assign = _nearest(vectors, centroids)
+    order = np.argsort(assign, kind='stable')
+    bounds = np.searchsorted(assign[order], np.arange(n_lists + 1))
+    closeness = centroids @ centroids.T
+    # A list always probes itself
+    np.fill_diagonal(closeness, np.inf)
+    probes = min(probes, n_lists)
+    probed = np.argpartition(-closeness, probes - 1, axis=1)[:, :probes]
+
+    for list_id in range(n_lists):
+        rows = order[bounds[list_id]:bounds[list_id + 1]]
+        if not len(rows):
+            continue
+        candidates = np.concatenate([order[bounds[p]:bounds[p + 1]] for p in probed[list_id]])
+        k_list = min(k_eff, len(candidates) - 1)
+        if k_list <= 0:
+            continue
+        block = vectors[rows] @ vectors[candidates].T
+        block[rows[:, None] == candidates[None, :]] = -np.inf
+        top, top_scores = _top_k(block, k_list)
+        indices[rows, :k_list] = candidates[top]
+        scores[rows, :k_list] = top_scores
+    return indices, scores
+
+
+def build_similarity_index(df, audio=None, k=TOP_K):
+    """
+    Precompute "more like this" neighbours and dense content embeddings for a
+    partition-ordered catalogue frame. Returns (arrays, objects) for write_catalogue.
+    Up to EXACT_NEIGHBOURS_MAX_ROWS tracks the neighbours are exact over the TF-IDF
+    vectors, beyond that approximate over the embeddings.
+    """
+    encoder, text_vectors, embeddings = fit_text_encoder(df)
+    if len(df) <= EXACT_NEIGHBOURS_MAX_ROWS:
+        indices, scores = top_k_neighbours(combine_features(text_vectors, audio), k)
+    else:
+        indices, scores = approximate_neighbours(combine_features(embeddings, audio), k)
+    arrays = {'neighbours': indices, 'neighbour_scores': scores, 'embeddings': embeddings}
+    return arrays, {'text_encoder': encoder}
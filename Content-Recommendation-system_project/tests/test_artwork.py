@@ -0,0 +1,34 @@
+import os
+
+from starlette.applications import Starlette
+from starlette.testclient import TestClient
+
+from artwork import thumbnail_name, thumbnail_path, CACHE_CONTROL, DEFAULT_ARTWORK_DIR, STATIC_ARTWORK_URL
+from serve import APP_SCRIPT, artwork_routes
+
+KEY = '0a' + '1' * 30 + '.webp'
+
+
+def test_artwork_lives_next_to_the_app(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert os.path.isabs(DEFAULT_ARTWORK_DIR)
+    assert DEFAULT_ARTWORK_DIR == os.path.join(os.path.dirname(APP_SCRIPT), 'static', 'artwork')
+
+
+def test_artwork_route_sends_cache_headers(tmp_path):
+    path = thumbnail_path(thumbnail_name(KEY, 160))
+    os.makedirs(tmp_path / os.path.dirname(path))
+    (tmp_path / path).write_bytes(b'webp')
+    client = TestClient(Starlette(routes=artwork_routes(str(tmp_path), base_path='/music/')))
+    url = f"/music/{STATIC_ARTWORK_URL}/{path}"
+
+    response = client.get(url)
+    assert response.status_code == 200 and response.content == b'webp'
+    assert response.headers['cache-control'] == CACHE_CONTROL
+    assert response.headers['content-type'] == 'image/webp'
+
+    again = client.get(url, headers={'If-None-Match': response.headers['etag']})
+    assert again.status_code == 304 and again.headers['cache-control'] == CACHE_CONTROL
+
+    assert client.get(url.replace('-160', '-320')).status_code == 404
+    assert client.get(f"/music/{STATIC_ARTWORK_URL}/0a/../../secret.webp").status_code == 404
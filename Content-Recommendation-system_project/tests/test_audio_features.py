@@ -0,0 +1,164 @@
+import io
+import wave
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from audio_features import (analyse_clip, clip_features, decode_clip, extract_audio_features, open_audio_cache,
+                            DecoderUnavailable, FEATURE_NAMES, MIN_BPM, MAX_BPM, N_FEATURES, SAMPLE_RATE)
+
+RATE = 22050
+SECONDS = 8
+
+
+def wav_bytes(samples, rate=RATE, channels=1):
+    # 16-bit PCM, as the mock iTunes server serves its previews
+    pcm = (np.clip(samples, -1, 1) * 32767).astype('<i2')
+    if channels > 1:
+        pcm = np.repeat(pcm, channels)
+    out = io.BytesIO()
+    with wave.open(out, 'wb') as clip:
+        clip.setnchannels(channels)
+        clip.setsampwidth(2)
+        clip.setframerate(rate)
+        clip.writeframes(pcm.tobytes())
+    return out.getvalue()
+
+
+def sine(freq=440.0, amplitude=0.5, seconds=SECONDS, rate=RATE):
+    t = np.arange(int(seconds * rate)) / rate
+    return amplitude * np.sin(2 * np.pi * freq * t)
+
+
+def noise(amplitude=0.3, seconds=SECONDS, rate=RATE, seed=0):
+    return amplitude * np.random.default_rng(seed).uniform(-1, 1, int(seconds * rate))
+
+
+def clicks(bpm=120, seconds=SECONDS, rate=RATE, seed=0):
+    # Short noise bursts on every beat over a quiet bed
+    samples = noise(0.01, seconds, rate, seed)
+    burst = noise(0.8, 0.03, rate, seed + 1)
+    for start in np.arange(0, seconds, 60 / bpm):
+        begin = int(start * rate)
+        samples[begin:begin + len(burst)] += burst[:len(samples) - begin]
+    return samples
+
+
+def features(data):
+    return dict(zip(FEATURE_NAMES, clip_features(decode_clip(data))))
+
+
+def chroma(values):
+    return np.array([value for name, value in values.items() if name.startswith('chroma_')])
+
+
+def test_sine_features():
+    values = features(wav_bytes(sine(440.0, amplitude=0.5)))
+    assert values['rms_mean'] == pytest.approx(0.5 / np.sqrt(2), rel=0.02)
+    assert values['rms_std'] < 0.01
+    assert values['centroid_mean'] == pytest.approx(440, rel=0.1)
+    assert values['chroma_A'] > 0.9
+    assert chroma(values).sum() == pytest.approx(1.0, rel=1e-4)
+    # A steady tone has no onsets to find a beat in
+    assert values['tempo'] == 0 or MIN_BPM <= values['tempo'] <= MAX_BPM
+
+
+def test_noise_features():
+    values = features(wav_bytes(noise(0.3)))
+    assert values['rms_mean'] == pytest.approx(0.3 / np.sqrt(3), rel=0.05)
+    # White noise is spread over the whole band, so its centroid sits near the middle
+    assert 3000 < values['centroid_mean'] < SAMPLE_RATE / 2
+    assert chroma(values).max() < 0.2
+    assert all(np.isfinite(list(values.values())))
+
+
+@pytest.mark.parametrize('bpm', [90, 120, 140])
+def test_tempo_of_a_click_track(bpm):
+    assert features(wav_bytes(clicks(bpm)))['tempo'] == pytest.approx(bpm, rel=0.05)
+
+
+def test_stereo_and_other_rates_are_resampled():
+    mono = features(wav_bytes(sine(440.0)))
+    stereo = features(wav_bytes(sine(440.0, rate=44100), rate=44100, channels=2))
+    assert stereo['rms_mean'] == pytest.approx(mono['rms_mean'], rel=0.02)
+    assert stereo['centroid_mean'] == pytest.approx(mono['centroid_mean'], rel=0.02)
+
+
+def test_undecodable_clips_are_invalid():
+    assert analyse_clip(b'RIFF\x00\x00\x00\x00WAVEjunk')[0] == 'invalid'
+    # Shorter than one analysis frame
+    assert analyse_clip(wav_bytes(sine(seconds=0.01)))[0] == 'invalid'
+
+
+def test_missing_ffmpeg(monkeypatch):
+    monkeypatch.setattr('audio_features.FFMPEG', 'no-such-ffmpeg')
+    with pytest.raises(DecoderUnavailable):
+        decode_clip(b'ID3\x04\x00 not a wav')
+    assert analyse_clip(b'ID3\x04\x00 not a wav')[0] == 'unavailable'
+
+
+class FakeCrawler:
+    # Serves preview bytes by URL; None (a failed download) for unknown ones
+    max_workers = 2
+
+    def __init__(self, clips):
+        self.clips = clips
+        self.fetched = []
+
+    def get_content(self, url, span_name=None):
+        self.fetched.append(url)
+        return self.clips.get(url)
+
+
+def catalogue(*urls):
+    return pd.DataFrame({'id': [str(i) for i in range(len(urls))], 'preview_url': list(urls)})
+
+
+def test_pipeline_rows_and_checkpoints(tmp_path):
+    cache = open_audio_cache(str(tmp_path / 'audio.sqlite'))
+    crawler = FakeCrawler({'http://x/sine.wav': wav_bytes(sine()), 'http://x/noise.wav': wav_bytes(noise()),
+                           'http://x/bad.wav': b'RIFF\x00\x00\x00\x00WAVEjunk'})
+    df = catalogue('http://x/sine.wav', 'http://x/bad.wav', 'http://x/missing.wav', None, 'http://x/noise.wav')
+    result = extract_audio_features(df, cache=cache, crawler=crawler, max_workers=1)
+    assert result.shape == (5, N_FEATURES) and result.dtype == np.float32
+    assert ~np.isnan(result[[0, 4]]).any()
+    # Undecodable, failed download, no preview
+    assert np.isnan(result[[1, 2, 3]]).all()
+    assert cache.get('1', default='absent') is None
+    assert cache.get('2', default='absent') == 'absent'
+
+    # A re-run only retries the failed download
+    crawler.fetched = []
+    again = extract_audio_features(df, cache=cache, crawler=crawler, max_workers=1)
+    assert crawler.fetched == ['http://x/missing.wav']
+    np.testing.assert_array_equal(np.isnan(again), np.isnan(result))
+
+
+def test_pipeline_without_ffmpeg(tmp_path, monkeypatch):
+    # The analysis runs in spawned processes, which read FFMPEG from the environment
+    monkeypatch.setenv('FFMPEG', 'no-such-ffmpeg')
+    cache = open_audio_cache(str(tmp_path / 'audio.sqlite'))
+    crawler = FakeCrawler({'http://x/a.m4a': b'\x00\x00\x00\x20ftypM4A not really'})
+    result = extract_audio_features(catalogue('http://x/a.m4a'), cache=cache, crawler=crawler, max_workers=1)
+    assert np.isnan(result).all()
+    # Not remembered as undecodable, so it is analysed once ffmpeg is installed
+    assert cache.get('0', default='absent') == 'absent'
+
+
+@pytest.mark.parametrize('analysed', [0, 300])
+def test_training_skips_all_nan_features(tmp_path, monkeypatch, analysed):
+    from benchmarks.synthetic import iter_synthetic_chunks
+    from catalogue import load_catalogue
+    from train_model import train_and_save_pipeline
+
+    def audio_stage(df):
+        audio = np.full((len(df), N_FEATURES), np.nan, dtype=np.float32)
+        audio[:analysed] = np.random.default_rng(0).random((analysed, N_FEATURES))
+        return audio
+
+    monkeypatch.chdir(tmp_path)
+    train_and_save_pipeline(pd.concat(list(iter_synthetic_chunks(1500)), ignore_index=True), audio_stage)
+    catalogue = load_catalogue()
+    assert catalogue.has_artifact('audio_features') == bool(analysed)
+    assert catalogue.has_artifact('neighbours')
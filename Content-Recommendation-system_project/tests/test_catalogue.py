@@ -0,0 +1,90 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import catalogue as catalogue_module
+from benchmarks.synthetic import iter_synthetic_chunks
+from catalogue import (load_catalogue, read_current, write_catalogue, CURRENT_NAME, KEEP_VERSIONS, MANIFEST_NAME,
+                       VERSIONS_DIR)
+from engine import RecommendationEngine
+from liked_store import LikedStore
+from ttl_cache import TTLCache
+
+
+@pytest.fixture
+def df():
+    return pd.concat(list(iter_synthetic_chunks(200)), ignore_index=True)
+
+
+def publish(df, root, tag):
+    return write_catalogue(df, str(root), arrays={'tag': np.full(3, tag)}, objects={'model': {'tag': tag}})
+
+
+def test_old_versions_stay_readable_after_pruning(df, tmp_path):
+    publish(df, tmp_path, 0)
+    first = load_catalogue(str(tmp_path))
+    for tag in range(1, KEEP_VERSIONS + 2):
+        publish(df, tmp_path, tag)
+    assert first.version not in os.listdir(tmp_path / VERSIONS_DIR)
+    # Opened before its version was deleted, so still whole
+    assert first.array('tag').tolist() == [0, 0, 0]
+    assert first.load_object('model') == {'tag': 0}
+    assert len(first.records([0, 1])) == 2
+    assert load_catalogue(str(tmp_path)).load_object('model') == {'tag': KEEP_VERSIONS + 1}
+
+
+def test_flat_layout_is_removed_after_the_pointer(df, tmp_path, monkeypatch):
+    # A catalogue from before versioning: its files straight in the root
+    publish(df, tmp_path, 0)
+    flat = tmp_path / VERSIONS_DIR / read_current(str(tmp_path))['version']
+    for name in os.listdir(flat):
+        os.rename(flat / name, tmp_path / name)
+    os.rmdir(flat)
+    os.remove(tmp_path / CURRENT_NAME)
+    assert load_catalogue(str(tmp_path)).load_object('model') == {'tag': 0}
+
+    seen = []
+    remove = catalogue_module._remove_flat_layout
+
+    def remove_flat_layout(root):
+        # By the time the flat files go, readers already follow the new pointer
+        seen.append(read_current(root)['version'])
+        assert load_catalogue(root).load_object('model') == {'tag': 1}
+        remove(root)
+
+    monkeypatch.setattr(catalogue_module, '_remove_flat_layout', remove_flat_layout)
+    manifest = publish(df, tmp_path, 1)
+    assert seen == [manifest['version']]
+    assert sorted(os.listdir(tmp_path)) == [CURRENT_NAME, VERSIONS_DIR]
+    with open(tmp_path / CURRENT_NAME) as f:
+        assert json.load(f)['version'] == manifest['version']
+    assert not os.path.exists(tmp_path / MANIFEST_NAME)
+
+
+def test_manifest_counts_added_and_removed_ids(df, tmp_path):
+    publish(df, tmp_path, 0)
+    manifest = publish(pd.concat([df.iloc[5:], df.iloc[:3].assign(id=['a', 'b', 'c'])]), tmp_path, 1)
+    assert (manifest['delta']['added'], manifest['delta']['removed']) == (3, 5)
+    assert not any(name.startswith('delta') for name in manifest['arrays'])
+
+
+def test_reload_loads_only_the_models_in_use(df, tmp_path):
+    root = str(tmp_path / 'catalogue')
+    write_catalogue(df, root, objects={'model': {'tag': 0}, 'other': {'tag': 0}})
+    engine = RecommendationEngine(load_catalogue(root), liked_store=LikedStore(str(tmp_path / 'likes.sqlite')),
+                                  search_cache=TTLCache())
+    old_model = engine.catalogue.load_object('model')
+
+    write_catalogue(df, root, objects={'model': {'tag': 0}, 'other': {'tag': 1}})
+    assert engine.reload(root)
+    assert engine.catalogue.loaded_objects() == ['model']
+    assert engine.catalogue.load_object('model') is old_model
+    assert engine.catalogue.load_object('other') == {'tag': 1}
+
+    write_catalogue(df, root, objects={'model': {'tag': 2}, 'other': {'tag': 1}})
+    assert engine.reload(root)
+    assert sorted(engine.catalogue.loaded_objects()) == ['model', 'other']
+    assert engine.catalogue.load_object('model') == {'tag': 2}
@@ -0,0 +1,72 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from crawler import Crawler
+from metrics import REGISTRY, label_key
+from transport import Transport
+
+
+class Handler(BaseHTTPRequestHandler):
+    # Answers each request with the next (status, Retry-After) of the server's script
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests += 1
+        status, retry_after = self.server.script.pop(0) if self.server.script else (200, None)
+        body = b'{"results": []}'
+        self.send_response(status)
+        if retry_after is not None:
+            self.send_header('Retry-After', retry_after)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.script, httpd.requests = [], 0
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def crawler(**kwargs):
+    return Crawler(max_workers=1, rate=1000.0, transport=Transport('live'), **kwargs)
+
+
+def url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/search"
+
+
+def test_retry_after_is_honoured(server):
+    server.script = [(429, '1')]
+    started = time.perf_counter()
+    assert crawler(backoff=0.5, max_retries=2).get_json(url(server), {'term': 'love'}) == {'results': []}
+    assert time.perf_counter() - started >= 1
+    assert server.requests == 2
+
+
+def test_long_retry_after_fails_the_request(server):
+    # Longer than the longest backoff (0.1 * 2 ** 2 = 0.4 s)
+    server.script = [(429, '3600')]
+    errors = REGISTRY.counters.get(('http_errors', label_key({'kind': 'retry_after'})), 0)
+    started = time.perf_counter()
+    assert crawler(backoff=0.1, max_retries=2).get_json(url(server), {'term': 'love'}) is None
+    assert time.perf_counter() - started < 1
+    assert server.requests == 1
+    assert REGISTRY.counters[('http_errors', label_key({'kind': 'retry_after'}))] == errors + 1
+
+
+def test_backoff_without_retry_after(server):
+    server.script = [(503, None), (503, None)]
+    assert crawler(backoff=0.01, max_retries=2).get_json(url(server), {'term': 'love'}) == {'results': []}
+    assert server.requests == 3
+
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from dedup import artist_tokens, cluster_tracks, normalize_title, one_per_cluster
+
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=['name', 'artist'])
+
+
+def test_variant_markers_are_stripped():
+    assert normalize_title('Tum Hi Ho (From "Aashiqui 2")') == ('tum hi ho', True)
+    assert normalize_title('Yesterday - Remastered 2009') == ('yesterday', True)
+    assert normalize_title('Song (feat. Someone)') == ('song', True)
+    assert normalize_title('Hello (Goodbye)') == ('hello goodbye', False)
+    assert normalize_title('(Live)') == ('live', False)
+    assert artist_tokens('Arijit Singh & Shreya Ghoshal feat. Mithoon') == {'arijitsingh', 'shreyaghoshal', 'mithoon'}
+
+
+def test_rereleases_cluster_on_the_unmarked_original():
+    df = frame([
+        ('Yesterday - Remastered 2009', 'The Beatles'),   # 0
+        ('Tum Hi Ho (From "Aashiqui 2")', 'Arijit Singh'),  # 1
+        ('Yesterday', 'The Beatles'),                      # 2
+        ('Tum Hi Ho', 'Arijit Singh, Mithoon'),            # 3
+        ('Yesterday', 'Boyz II Men'),                      # 4: a cover, not a re-release
+        ('Yesterdays', 'Billie Holiday'),                  # 5
+        ('Let It Be', 'The Beatles'),                      # 6
+        ('Tum Hi Ho (Live)', 'Arijit Singh'),              # 7
+    ])
+    clusters = cluster_tracks(df)
+    assert clusters.dtype == np.int32
+    assert clusters.tolist() == [2, 3, 2, 3, 4, 5, 6, 3]
+
+
+def test_clusters_are_linear_in_the_catalogue_and_reproducible():
+    # Many distinct songs by one artist stay apart; each repeated title forms one cluster
+    rng = np.random.default_rng(0)
+    letters = np.array(list('abcdefghijklmnopqrstuvwxyz'))
+    titles = [' '.join(''.join(rng.choice(letters, 6)) for _ in range(2)) for _ in range(300)]
+    df = frame([(t, 'Same Artist') for t in titles] + [(f"{t} (Remix)", 'Same Artist') for t in titles[:50]])
+    clusters = cluster_tracks(df)
+    assert len(set(clusters.tolist())) == 300
+    assert (clusters[300:] == np.arange(50)).all()
+    assert (cluster_tracks(df) == clusters).all()
+    assert len(cluster_tracks(frame([]))) == 0
+
+
+def test_one_per_cluster_keeps_order_and_skips_excluded():
+    clusters = np.array([0, 0, 2, 3, 3, 5])
+    assert one_per_cluster([1, 0, 3, 4, 5], clusters, 3).tolist() == [1, 3, 5]
+    assert one_per_cluster([1, 0, 3, 4, 5], clusters, 3, exclude_positions=[0, -1]).tolist() == [3, 5]
+    assert one_per_cluster([4, 2], None, 1).tolist() == [4]
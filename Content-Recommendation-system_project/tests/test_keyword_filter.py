@@ -0,0 +1,53 @@
+import pandas as pd
+
+from keyword_filter import build_filters, classify_tracks, compile_terms, KeywordFilter
+
+MAPPING = {
+    '😢': {'negative': ['party', 'mix']},
+    '🎉': {'negative': ['sad', 'remix']},
+    '⚡': {},
+}
+GLOBAL = ['karaoke', 'cover']
+
+
+def test_reason_names_the_scope_and_the_longest_term():
+    f = KeywordFilter(GLOBAL, ['mix', 'remix'])
+    assert f.reject_reason("Song (Karaoke Version)") == 'global:karaoke'
+    assert f.reject_reason("Song - Club Remix") == 'mood:remix'
+    assert f.reject_reason("Song") is None
+    # Global rules win over the mood's own list
+    assert f.reject_reason("Cover Remix") == 'global:cover'
+    assert compile_terms([]) is None and KeywordFilter([], []).reject_reason("anything") is None
+
+
+def test_substring_and_word_boundary_modes():
+    substring = KeywordFilter(GLOBAL, ['sad'])
+    words = KeywordFilter(GLOBAL, ['sad'], word_boundary=True)
+    for text in ("Discovery", "Saddle Up", "Coverage"):
+        assert substring.reject_reason(text) is not None
+        assert words.reject_reason(text) is None
+    assert words.reject_reason("So Sad Today") == 'mood:sad'
+    assert words.reject_reason("Live (Cover)") == 'global:cover'
+
+
+def test_classify_matches_reject_reason_row_by_row():
+    f = KeywordFilter(GLOBAL, ['mix', 'remix'], word_boundary=True)
+    texts = pd.Series(["A Remix", None, "karaoke night", "Mixtape", "plain"], index=[5, 3, 9, 1, 0])
+    reasons = f.classify(texts)
+    assert list(reasons.index) == [5, 3, 9, 1, 0]
+    expected = [f.reject_reason('' if pd.isna(t) else t) for t in texts]
+    assert [None if pd.isna(r) else r for r in reasons] == expected == ['mood:remix', None, 'global:karaoke', None, None]
+
+
+def test_classify_tracks_uses_each_rows_mood():
+    frame = pd.DataFrame({
+        'name': ["Party Anthem", "Party Anthem", "Sad Song", "Sad Song", "Song", "Song"],
+        'artist': ["A", "A", "B", "B", "C", "Karaoke Kings"],
+        'album': ["X", "X", "Y", "Y", None, "Z"],
+        'predicted_emoji': ['😢', '🎉', '🎉', '⚡', '🤷', '⚡'],
+    })
+    for word_boundary in (False, True):
+        reasons = classify_tracks(frame, build_filters(MAPPING, GLOBAL, word_boundary))
+        # Unknown moods are never filtered
+        assert [None if pd.isna(r) else r for r in reasons] == \
+            ['mood:party', None, 'mood:sad', None, None, 'global:karaoke']
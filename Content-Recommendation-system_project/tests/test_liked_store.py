@@ -0,0 +1,58 @@
+import json
+import multiprocessing
+
+from liked_store import LikedStore, DEFAULT_USER
+
+SONGS = [{'id': 3, 'name': 'Third'}, {'id': '1', 'name': 'First'}, {'id': 2, 'name': 'Second'}]
+
+
+def write_legacy(tmp_path, songs=SONGS):
+    path = tmp_path / 'liked_songs.json'
+    path.write_text(json.dumps(songs))
+    return str(path)
+
+
+def test_json_is_imported_once_in_order(tmp_path):
+    legacy = write_legacy(tmp_path)
+    store = LikedStore(str(tmp_path / 'likes.sqlite'), legacy_json=legacy)
+    assert [s['name'] for s in store.songs(DEFAULT_USER)] == ['Third', 'First', 'Second']
+    assert store.ids(DEFAULT_USER) == {'1', '2', '3'}
+
+    # Unliked after the import, so a second open must not bring it back
+    store.remove(DEFAULT_USER, 3)
+    assert store.migrate_json(legacy) == 0
+    store.close()
+    reopened = LikedStore(str(tmp_path / 'likes.sqlite'), legacy_json=legacy)
+    assert reopened.ids(DEFAULT_USER) == {'1', '2'}
+
+
+def test_import_keeps_existing_likes_and_other_users(tmp_path):
+    store = LikedStore(str(tmp_path / 'likes.sqlite'), legacy_json=None)
+    store.add(DEFAULT_USER, {'id': '1', 'name': 'Liked in SQLite'})
+    store.add('alice', {'id': '9', 'name': 'Hers'})
+    assert store.migrate_json(write_legacy(tmp_path)) == 3
+    names = {s['id']: s['name'] for s in store.songs(DEFAULT_USER)}
+    assert names['1'] == 'Liked in SQLite' and len(names) == 3
+    assert store.ids('alice') == {'9'}
+    assert store.migrate_json(str(tmp_path / 'missing.json')) == 0
+
+
+def open_store(path, legacy, barrier, results):
+    barrier.wait()
+    store = LikedStore(path, legacy_json=None)
+    results.put(store.migrate_json(legacy))
+    store.close()
+
+
+def test_concurrent_processes_import_once(tmp_path):
+    path, legacy = str(tmp_path / 'likes.sqlite'), write_legacy(tmp_path)
+    LikedStore(path, legacy_json=None).close()
+    ctx = multiprocessing.get_context('fork')
+    barrier, results = ctx.Barrier(4), ctx.Queue()
+    workers = [ctx.Process(target=open_store, args=(path, legacy, barrier, results)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+    assert sorted(results.get(timeout=5) for _ in workers) == [0, 0, 0, 3]
+    assert len(LikedStore(path, legacy_json=None).songs(DEFAULT_USER)) == 3
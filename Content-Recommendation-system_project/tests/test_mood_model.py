@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+
+from mood_model import describe_report, predict_moods, train_mood_model, MIN_HELD_OUT_ROWS
+
+MOODS = ['😊', '😢', '⚡', '❤️', '🎉', '🌙', '🔥']
+
+
+def catalogue(n, moods=MOODS):
+    return pd.DataFrame({
+        'name': [f"{moods[i % len(moods)]} song {i}" for i in range(n)],
+        'artist': [f"Artist {i % 5}" for i in range(n)],
+        'album': [f"Album {i % 3}" for i in range(n)],
+        'language': 'English',
+        'predicted_emoji': [moods[i % len(moods)] for i in range(n)],
+    })
+
+
+@pytest.mark.parametrize('n', [2, 7, 12, MIN_HELD_OUT_ROWS - 1])
+def test_small_catalogue_is_fitted_without_a_held_out_split(n):
+    df = catalogue(n)
+    model, report = train_mood_model(df)
+    assert model is not None
+    assert report['n_test'] == 0 and report['accuracy'] is None
+    assert "fitted without scoring" in describe_report(report)
+    assert len(predict_moods(model, df.to_dict('records'))) == n
+
+
+def test_held_out_split_with_more_labels_than_test_rows():
+    # 10 held-out rows for 7 labels stratify; one label with a single track does not
+    df = catalogue(MIN_HELD_OUT_ROWS)
+    df.loc[0, 'predicted_emoji'] = '🎸'
+    model, report = train_mood_model(df)
+    assert model is not None
+    assert report['n_test'] == 10 and 0 <= report['accuracy'] <= 1
+
+
+def test_single_label_catalogue_has_no_model():
+    model, report = train_mood_model(catalogue(80, moods=['😊']))
+    assert model is None
+    assert describe_report(report).startswith("no mood classifier")
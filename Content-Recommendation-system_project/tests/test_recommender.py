@@ -0,0 +1,81 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from catalogue import Catalogue, partition_frame
+from recommender import album_codes, diverse_picks, mmr_rerank, TasteProfile, MAX_PER_ALBUM, MAX_PER_ARTIST
+
+
+def unit(rows):
+    rows = np.asarray(rows, dtype=np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def test_mmr_without_diversity_ranks_by_relevance():
+    vectors = unit(np.random.default_rng(0).standard_normal((6, 4)))
+    relevance = [0.1, 0.9, 0.5, 0.7, 0.3, 0.8]
+    assert mmr_rerank(vectors, relevance, 4, diversity=0).tolist() == [1, 5, 3, 2]
+    assert mmr_rerank(vectors, relevance, 10, diversity=0).tolist() == [1, 5, 3, 2, 4, 0]
+    assert mmr_rerank(vectors[:0], [], 3).tolist() == []
+
+
+def test_mmr_diversity_skips_near_copies():
+    # Rows 0-2 point the same way; row 3 is less relevant but orthogonal
+    vectors = unit([[1, 0], [1, 0.01], [1, 0.02], [0, 1]])
+    relevance = [1.0, 0.95, 0.9, 0.5]
+    assert mmr_rerank(vectors, relevance, 2, diversity=0).tolist() == [0, 1]
+    assert mmr_rerank(vectors, relevance, 2, diversity=0.5).tolist() == [0, 3]
+
+
+def test_mmr_caps_each_group():
+    vectors = unit(np.eye(6) + 0.01)
+    relevance = [6, 5, 4, 3, 2, 1]
+    artists = np.array([0, 0, 0, 1, 1, -1])
+    albums = np.array([7, 7, 8, 9, 9, -1])
+    # Artist 0 capped at two, album 7 at one, album 9 at one; -1 is never capped
+    picked = mmr_rerank(vectors, relevance, 6, diversity=0, groups=[(artists, 2), (albums, 1)])
+    assert picked.tolist() == [0, 2, 3, 5]
+
+
+def catalogue(n_artists=6, per_album=5, albums_per_artist=3, dim=8, seed=0, clusters=None):
+    rng = np.random.default_rng(seed)
+    rows = [{'id': str(i), 'name': f"Track {i}", 'artist': f"Artist {a}", 'album': f"Album {b}",
+             'language': 'English', 'predicted_emoji': '😊', 'mood_label': 'Happy'}
+            for i, (a, b) in enumerate((a, b) for a in range(n_artists) for b in range(albums_per_artist)
+                                       for _ in range(per_album))]
+    df, _ = partition_frame(pd.DataFrame(rows))
+    embeddings = unit(rng.standard_normal((len(df), dim)))
+    arrays = {'embeddings': embeddings, 'album_code': album_codes(df)}
+    if clusters is not None:
+        arrays['cluster_id'] = clusters
+    return Catalogue.from_frame(df, arrays=arrays)
+
+
+def test_diverse_picks_respect_artist_and_album_caps():
+    cat = catalogue()
+    artists = cat.column('artist')
+    albums = cat.array('album_code')
+    for profile in (None, TasteProfile.from_likes(cat, cat.records([0, 1, 2]))):
+        picks = diverse_picks(cat, profile, k=12, exclude_ids=list(profile.members) if profile else (),
+                              rng=np.random.default_rng(1))
+        assert len(picks) == 12 and len(set(picks.tolist())) == 12
+        assert max(Counter(artists.codes[picks].tolist()).values()) <= MAX_PER_ARTIST
+        assert max(Counter(albums[picks].tolist()).values()) <= MAX_PER_ALBUM
+        if profile is not None:
+            assert not set(cat.records(picks)[i]['id'] for i in range(12)) & set(profile.members)
+    # Six artists at two tracks each is all the caps allow
+    assert len(diverse_picks(cat, None, k=20, rng=np.random.default_rng(1))) == 6 * MAX_PER_ARTIST
+
+
+def test_diverse_picks_keep_one_track_per_cluster():
+    # Rows 0-4 are one song
+    clusters = np.arange(10, dtype=np.int32)
+    clusters[:5] = 0
+    cat = catalogue(n_artists=10, per_album=1, albums_per_artist=1, clusters=clusters)
+    picks = diverse_picks(cat, None, k=10, rng=np.random.default_rng(2))
+    assert len(picks) == 6 and (picks < 5).sum() == 1
+    # Liking one release excludes the whole song
+    liked = cat.records([3])[0]['id']
+    picks = diverse_picks(cat, None, k=10, exclude_ids=[liked], rng=np.random.default_rng(2))
+    assert len(picks) == 5 and not (picks < 5).any()
@@ -0,0 +1,100 @@
+import pandas as pd
+import pytest
+
+from benchmarks.mock_itunes import mock_results
+from response_cache import ResponseCache
+from train_model import build_dataset, merge_catalogue, save_dataset, saved_track_ids, stream_dataset
+
+
+class FakeCrawler:
+    """
+    Answers every term with mock iTunes results; a different `release` gives every
+    term a different set of tracks, as a catalogue that changed since the last crawl.
+    """
+
+    max_workers = 1
+
+    def __init__(self, release=0):
+        self.release = release
+        self.fetched = []
+
+    def search_many(self, terms, limit=10, on_result=None, collect=True):
+        results = {}
+        for term in dict.fromkeys(terms):
+            self.fetched.append(term)
+            term_results = mock_results(f"{term} {self.release}", limit)
+            if on_result is not None:
+                on_result(term, limit, term_results)
+            if collect:
+                results[term] = term_results
+        return results
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'itunes.sqlite'), ttl=3600)
+    yield cache
+    cache.close()
+
+
+def expire(cache):
+    with cache.lock, cache.conn:
+        cache.conn.execute("UPDATE responses SET fetched_at = 0")
+
+
+def ids(df):
+    return set(df['id'])
+
+
+def test_interrupted_refresh_is_completed_by_the_next_one(cache, tmp_path):
+    path = str(tmp_path / 'dataset.csv')
+    save_dataset(build_dataset(crawler=FakeCrawler(0), cache=cache), path)
+    before = ids(pd.read_csv(path, dtype=str))
+
+    # The refresh fetches every (expired) term, then dies before saving anything
+    expire(cache)
+    crawler = FakeCrawler(1)
+    def interrupt(chunk):
+        raise KeyboardInterrupt
+    with pytest.raises(KeyboardInterrupt):
+        stream_dataset(crawler, cache, refresh=True, path=path, enrich=interrupt)
+    assert crawler.fetched
+    assert ids(pd.read_csv(path, dtype=str)) == before
+
+    # Nothing is stale any more, yet the re-run still merges what was fetched
+    rerun = FakeCrawler(1)
+    n_rows, _ = stream_dataset(rerun, cache, refresh=True, path=path)
+    after = ids(pd.read_csv(path, dtype=str))
+    assert rerun.fetched == []
+    assert before < after and n_rows == len(after)
+    assert after - before == ids(build_dataset(crawler=FakeCrawler(1), cache=None)) - before
+
+    # Once merged, a further refresh has nothing to add
+    assert stream_dataset(FakeCrawler(1), cache, refresh=True, path=path)[0] == len(after)
+
+
+def test_refresh_in_memory_rereads_unsaved_terms(cache):
+    existing = build_dataset(crawler=FakeCrawler(0), cache=cache)
+    expire(cache)
+    # Interrupted: fetched and cached, never merged or saved
+    build_dataset(crawler=FakeCrawler(1), cache=cache, saved=saved_track_ids([existing]))
+
+    rerun = FakeCrawler(1)
+    fresh = build_dataset(crawler=rerun, cache=cache, saved=saved_track_ids([existing]))
+    assert rerun.fetched == []
+    merged = merge_catalogue(existing, fresh)
+    assert ids(merged) == ids(existing) | ids(build_dataset(crawler=FakeCrawler(1), cache=None))
+
+    # Once merged, only terms with filtered-out tracks are read again, adding nothing
+    again = build_dataset(crawler=rerun, cache=cache, saved=saved_track_ids([merged]))
+    assert ids(merge_catalogue(merged, again)) == ids(merged)
+
+
+def test_refresh_without_a_dataset_builds_everything(cache, tmp_path):
+    full = build_dataset(crawler=FakeCrawler(0), cache=cache)
+    assert ids(build_dataset(crawler=FakeCrawler(0), cache=cache, saved=saved_track_ids([pd.DataFrame()]))) == ids(full)
+
+    path = str(tmp_path / 'dataset.csv')
+    n_rows, _ = stream_dataset(FakeCrawler(0), cache, refresh=True, path=path)
+    assert n_rows == len(full)
+    assert ids(pd.read_csv(path, dtype=str)) == ids(full)
@@ -0,0 +1,63 @@
+import pandas as pd
+
+from search_index import build_search_index, trigram_keys, SearchIndex, SearchIndexBuilder
+
+TRACKS = pd.DataFrame({
+    'name': ["Love Story", "Lovely", "Bohemian Rhapsody", "Tum Hi Ho", "Love", "Yesterday", "पहला नशा"],
+    'artist': ["Taylor Swift", "Billie Eilish", "Queen", "Arijit Singh", "Various", "The Beatles", "Udit Narayan"],
+    'album': ["Fearless", "Lovely", "A Night at the Opera", "Aashiqui 2", None, "Help!", "Jo Jeeta Wohi Sikandar"],
+})
+
+
+def index(df=TRACKS):
+    arrays = build_search_index(df)
+    return SearchIndex(arrays['search_terms'], arrays['search_offsets'],
+                       arrays['search_postings'], arrays['search_lengths'])
+
+
+def names(rows):
+    return [TRACKS['name'][r] for r in rows]
+
+
+def test_exact_and_prefix_queries():
+    idx = index()
+    assert names(idx.search("bohemian rhapsody", limit=1)) == ["Bohemian Rhapsody"]
+    # A finished word ranks its exact match first, a half-typed one matches longer words
+    assert names(idx.search("love", limit=3))[0] == "Love"
+    assert set(names(idx.search("lov", limit=3))) == {"Love Story", "Lovely", "Love"}
+    assert names(idx.search("beatles", limit=1)) == ["Yesterday"]
+    assert names(idx.search("पहला", limit=1)) == ["पहला नशा"]
+
+
+def test_typos_still_match():
+    idx = index()
+    assert names(idx.search("bohemain rapsody", limit=1)) == ["Bohemian Rhapsody"]
+    assert names(idx.search("arjit singh", limit=1)) == ["Tum Hi Ho"]
+    assert names(idx.search("yesterdya", limit=1)) == ["Yesterday"]
+    assert not len(idx.search("metallica"))
+
+
+def test_limits_ranges_and_empty_queries():
+    idx = index()
+    assert len(idx.search("love", limit=1)) == 1
+    assert not len(idx.search("love", limit=0)) and not len(idx.search("  !! "))
+    # Restricted to rows 2-5, the other "love" tracks are out of range
+    assert names(idx.search("love", ranges=[(2, 5)])) == ["Love"]
+    assert names(idx.search("love", ranges=[(0, 1), (4, 5)])) == ["Love", "Love Story"]
+
+
+def test_chunked_build_matches_one_pass():
+    builder = SearchIndexBuilder()
+    for start in range(0, len(TRACKS), 3):
+        chunk = TRACKS.iloc[start:start + 3]
+        builder.add((chunk['name'].fillna('') + ' ' + chunk['artist'].fillna('') + ' ' +
+                     chunk['album'].fillna('')).tolist())
+    chunked, whole = builder.finish(), build_search_index(TRACKS)
+    for name, values in whole.items():
+        assert chunked[name].tolist() == values.tolist()
+
+
+def test_trigrams_pad_words_and_casefold():
+    assert trigram_keys("AB") == trigram_keys("ab") == {(32 << 42) | (97 << 21) | 98, (97 << 42) | (98 << 21) | 32}
+    # Without the trailing pad, the last word is a prefix
+    assert trigram_keys("ab", prefix_last=True) == {(32 << 42) | (97 << 21) | 98}
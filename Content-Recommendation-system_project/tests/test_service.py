@@ -0,0 +1,98 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+import requests
+
+from artwork import thumbnail_name, thumbnail_path, CACHE_CONTROL
+from benchmarks.synthetic import build_synthetic_catalogue
+from load_test import free_port
+
+SERVICE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'service.py')
+THUMB = thumbnail_path(thumbnail_name('ab' + '0' * 30 + '.webp', 160))
+
+
+@pytest.fixture(scope='module')
+def service(tmp_path_factory):
+    # Two pre-forked workers over a synthetic catalogue, run from a scratch directory
+    # so the likes store and search cache start empty
+    root = tmp_path_factory.mktemp('service')
+    build_synthetic_catalogue(str(root / 'catalogue'), 2000)
+    os.makedirs(root / 'artwork' / os.path.dirname(THUMB))
+    (root / 'artwork' / THUMB).write_bytes(b'webp')
+    port = free_port()
+    process = subprocess.Popen([sys.executable, SERVICE, '--port', str(port), '--workers', '2',
+                                '--artwork-dir', str(root / 'artwork'), '--reload-interval', '0'],
+                               cwd=root, stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        try:
+            requests.get(f"{url}/health", timeout=1)
+            break
+        except requests.RequestException:
+            assert process.poll() is None, "service.py exited during startup"
+            time.sleep(0.1)
+    yield process, url
+    process.terminate()
+    process.wait(10)
+
+
+def get(url, path, status=200, **params):
+    response = requests.get(f"{url}{path}", params=params, timeout=10)
+    assert response.status_code == status, response.text
+    return response.json()
+
+
+def test_requests_are_answered_by_forked_workers(service):
+    process, url = service
+    pids = {get(url, '/health')['pid'] for _ in range(20)}
+    assert process.pid not in pids and len(pids) <= 2
+
+
+def test_browsing_endpoints(service):
+    _, url = service
+    languages = get(url, '/languages')
+    assert languages
+    picks = get(url, '/recommendations', k=5, lang=languages[0])
+    assert 0 < len(picks) <= 5 and all(p['language'] == languages[0] for p in picks)
+    assert len(get(url, '/trending', k=3)) == 3
+    similar = get(url, '/similar', id=picks[0]['id'], k=4)
+    assert len(similar) == 4 and picks[0]['id'] not in {s['id'] for s in similar}
+    assert get(url, '/search', q=picks[0]['name'], source='local', limit=3)
+    assert get(url, '/stats')
+
+
+def test_bad_requests(service):
+    _, url = service
+    assert 'integer' in get(url, '/recommendations', 400, k='many')['error']
+    assert get(url, '/recommendations', 400, diversity=2)['error']
+    assert get(url, '/similar', 400)['error'] == "'id' is required"
+    assert get(url, '/search', 400, q='x', source='elsewhere')['error']
+    assert get(url, '/nowhere', 404)['error']
+
+
+def test_likes_are_shared_by_every_worker(service):
+    _, url = service
+    song = get(url, '/trending', k=1)[0]
+    response = requests.put(f"{url}/users/alice/likes/{song['id']}", json=song, timeout=10)
+    assert response.json() == {'liked': song['id']}
+    # Fresh connections land on either worker; all of them read the same store
+    for _ in range(10):
+        assert [s['id'] for s in get(url, '/users/alice/likes')] == [song['id']]
+    assert get(url, '/users/bob/likes') == []
+    picks = get(url, '/recommendations', k=10, user='alice')
+    assert song['id'] not in {p['id'] for p in picks}
+    requests.delete(f"{url}/users/alice/likes/{song['id']}", timeout=10)
+    assert get(url, '/users/alice/likes') == []
+
+
+def test_artwork_and_metrics(service):
+    _, url = service
+    response = requests.get(f"{url}/artwork/{THUMB}", timeout=10)
+    assert response.content == b'webp' and response.headers['Cache-Control'] == CACHE_CONTROL
+    assert requests.get(f"{url}/artwork/ab/missing.webp", timeout=10).status_code == 404
+    metrics = requests.get(f"{url}/metrics", timeout=10)
+    assert metrics.headers['Content-Type'].startswith('text/plain') and 'http_request' in metrics.text
+    assert isinstance(get(url, '/metrics', format='json'), dict)
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.mock_itunes import mock_results
+from catalogue import IdSet, track_keys
+from response_cache import ResponseCache
+from train_model import build_dataset, stream_dataset, Reservoir
+
+
+class MockCrawler:
+    max_workers = 1
+
+    def search_many(self, terms, limit=10, on_result=None, collect=True):
+        results = {}
+        for term in dict.fromkeys(terms):
+            term_results = mock_results(term, limit)
+            if on_result is not None:
+                on_result(term, limit, term_results)
+            if collect:
+                results[term] = term_results
+        return results
+
+
+def test_idset_matches_a_python_set():
+    rng = np.random.default_rng(0)
+    ids, expected = IdSet(), set()
+    for _ in range(40):
+        keys = rng.integers(-500, 500, rng.integers(0, 60))
+        new = ids.add_new(keys)
+        # First occurrence of each key not seen before
+        first = [k not in expected and k not in keys[:i] for i, k in enumerate(keys)]
+        assert new.tolist() == first
+        expected.update(keys.tolist())
+        assert len(ids) == len(expected) and ids.nbytes == 8 * len(expected)
+    probe = np.arange(-600, 600)
+    assert ids.contains(probe).tolist() == [k in expected for k in probe]
+    # Runs are merged as they grow, so there are O(log n) of them
+    assert len(ids.runs) <= int(np.log2(len(ids))) + 1
+    assert not IdSet().contains([1, 2]).any()
+
+
+def test_track_keys_are_exact():
+    keys = track_keys(['123', 123, '0123', 'abc', '9' * 18, '9' * 19])
+    assert keys[0] == keys[1] == 123
+    assert len(set(keys.tolist())) == 5
+    # Non-numeric ids hash into the negative range, clear of numeric ones
+    assert keys[2] < 0 and keys[3] < 0 and keys[5] < 0 and keys[4] > 0
+
+
+@pytest.mark.parametrize('chunk_rows', [7, 100000])
+def test_stream_matches_the_in_memory_build(tmp_path, chunk_rows):
+    expected = build_dataset(crawler=MockCrawler(), cache=None)
+    cache = ResponseCache(str(tmp_path / 'itunes.sqlite'), ttl=None)
+    path = str(tmp_path / 'data' / 'dataset.csv')
+    n_rows, sample = stream_dataset(MockCrawler(), cache, path=path, chunk_rows=chunk_rows, sample_rows=50)
+    cache.close()
+
+    streamed = pd.read_csv(path, dtype=str)
+    # Same rows in the same order: filters applied and the first occurrence of each id kept
+    assert n_rows == len(streamed) == len(expected)
+    assert streamed['id'].tolist() == expected['id'].astype(str).tolist()
+    assert streamed['image_url'].tolist() == expected['image_url'].tolist()
+    assert len(sample) == 50 and set(sample['id']) <= set(streamed['id'])
+
+
+def test_reservoir_keeps_a_uniform_sample():
+    reservoir = Reservoir(100, seed=1)
+    for start in range(0, 10000, 250):
+        reservoir.add(pd.DataFrame({'row': np.arange(start, start + 250)}))
+    rows = reservoir.frame['row']
+    assert len(rows) == 100 and rows.is_unique
+    # Drawn from the whole stream, not just its start or end
+    assert rows.min() < 2500 and rows.max() > 7500
@@ -0,0 +1,149 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from metrics import REGISTRY, label_key
+from transport import Cassette, Transport, INJECTED_ERROR_STATUS, request_key
+
+
+def counter(name, **labels):
+    return REGISTRY.counters.get((name, label_key(labels)), 0)
+
+
+class Handler(BaseHTTPRequestHandler):
+    # /ok answers JSON echoing the query, /busy a 503
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith('/busy'):
+            status, body = 503, b'busy'
+        else:
+            status, body = 200, json.dumps({'path': self.path}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def cassette(tmp_path):
+    cassette = Cassette(str(tmp_path / 'cassette.sqlite'))
+    yield cassette
+    cassette.close()
+
+
+# --- KEYS ---
+def test_key_ignores_query_order_and_method_case():
+    assert (request_key('GET', 'https://itunes.apple.com/search?term=love&limit=10') ==
+            request_key('get', 'https://itunes.apple.com/search?limit=10&term=love'))
+    assert (request_key('GET', 'https://itunes.apple.com/search?term=love') !=
+            request_key('GET', 'https://itunes.apple.com/search?term=rain'))
+    assert (request_key('GET', 'https://itunes.apple.com/search?term=love') !=
+            request_key('POST', 'https://itunes.apple.com/search?term=love'))
+
+
+def test_key_drops_json_context_and_key_order():
+    url = 'https://music.youtube.com/youtubei/v1/search?alt=json'
+    first = json.dumps({'context': {'client': {'clientVersion': '1.20260101'}}, 'query': 'song', 'params': 'x'})
+    later = json.dumps({'params': 'x', 'query': 'song', 'context': {'client': {'clientVersion': '1.20261018'}}})
+    assert request_key('POST', url, first) == request_key('POST', url, later.encode('utf-8'))
+    assert request_key('POST', url, first) != request_key('POST', url, json.dumps({'query': 'other'}))
+    # Bodies that only look like JSON are keyed as they are
+    assert request_key('POST', url, '{not json') != request_key('POST', url, '{not json!')
+
+
+# --- RECORD AND REPLAY ---
+def test_record_then_replay(server, cassette):
+    recorder = Transport('record', cassette).session()
+    assert recorder.get(f"{server}/ok?b=2&a=1").json() == {'path': '/ok?b=2&a=1'}
+    assert recorder.get(f"{server}/busy").status_code == 503
+    # Transient answers are not recorded
+    assert len(cassette) == 1
+
+    hits, misses = counter('transport_replay', result='hit'), counter('transport_replay', result='miss')
+    replayer = Transport('replay', cassette).session()
+    response = replayer.get(f"{server}/ok?a=1&b=2")
+    assert response.status_code == 200
+    assert response.json() == {'path': '/ok?b=2&a=1'}
+    with pytest.raises(requests.ConnectionError):
+        replayer.get(f"{server}/busy")
+    assert counter('transport_replay', result='hit') == hits + 1
+    assert counter('transport_replay', result='miss') == misses + 1
+
+
+def test_streamed_responses_are_not_recorded(server, cassette):
+    response = Transport('record', cassette).session().get(f"{server}/ok", stream=True)
+    assert response.json() == {'path': '/ok'}
+    assert len(cassette) == 0
+
+
+# --- FAULT INJECTION ---
+def replay_outcomes(cassette, url, calls, **options):
+    session = Transport('replay', cassette, **options).session()
+    outcomes = []
+    for _ in range(calls):
+        try:
+            outcomes.append(session.get(url).status_code)
+        except requests.ConnectionError:
+            outcomes.append('failure')
+    return outcomes
+
+
+def test_fault_injection_is_seeded(server, cassette):
+    Transport('record', cassette).session().get(f"{server}/ok")
+    options = dict(error_rate=0.2, failure_rate=0.1, seed=7)
+    failures, errors = counter('transport_injected', kind='failure'), counter('transport_injected', kind='error')
+    first = replay_outcomes(cassette, f"{server}/ok", 500, **options)
+    assert counter('transport_injected', kind='failure') == failures + first.count('failure')
+    assert counter('transport_injected', kind='error') == errors + first.count(INJECTED_ERROR_STATUS)
+    assert 0.05 < first.count('failure') / 500 < 0.15
+    assert 0.15 < first.count(INJECTED_ERROR_STATUS) / 500 < 0.25
+    assert first.count(200) == 500 - first.count('failure') - first.count(INJECTED_ERROR_STATUS)
+    assert first == replay_outcomes(cassette, f"{server}/ok", 500, **options)
+    assert first != replay_outcomes(cassette, f"{server}/ok", 500, **dict(options, seed=8))
+
+
+def test_no_faults_by_default(server, cassette):
+    Transport('record', cassette).session().get(f"{server}/ok")
+    assert set(replay_outcomes(cassette, f"{server}/ok", 50)) == {200}
+
+
+# --- SPECS ---
+def test_spec_parses_replay_options(tmp_path):
+    path = tmp_path / 'cassette.sqlite'
+    transport = Transport.from_spec(f"replay:{path}?latency=0.01&jitter=0.5&error_rate=0.02&seed=3")
+    adapter = transport.adapter
+    assert (adapter.latency, adapter.jitter, adapter.error_rate, adapter.failure_rate) == (0.01, 0.5, 0.02, 0.0)
+    assert transport.cassette.path == str(path)
+    assert Transport.from_spec(None).mode == 'live'
+
+
+@pytest.mark.parametrize('spec', ['replay:{path}?latency=0.1&errors=0.5', 'record:{path}?seed=1', 'live:?seed=1'])
+def test_spec_rejects_unknown_options(tmp_path, spec):
+    with pytest.raises(ValueError, match='unknown option'):
+        Transport.from_spec(spec.format(path=tmp_path / 'cassette.sqlite'))
+
+
+@pytest.mark.parametrize('mode', ['record', 'replay'])
+def test_cassette_is_required(tmp_path, monkeypatch, mode):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(ValueError, match='cassette'):
+        Transport.from_spec(mode)
+    with pytest.raises(ValueError, match='cassette'):
+        Transport(mode)
+    assert not (tmp_path / 'data').exists()
@@ -0,0 +1,87 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ttl_cache import TTLCache
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def start_loads(cache, key, loader, n):
+    # n concurrent get_or_load calls; returns their futures once all but the first wait
+    pool = ThreadPoolExecutor(n)
+    first = pool.submit(cache.get_or_load, key, loader)
+    wait_for(lambda: cache.stats()['inflight'] == 1)
+    rest = [pool.submit(cache.get_or_load, key, loader) for _ in range(n - 1)]
+    wait_for(lambda: cache.stats()['coalesced'] == n - 1)
+    pool.shutdown(wait=False)
+    return [first] + rest
+
+
+def test_concurrent_misses_run_the_loader_once():
+    cache, release, calls = TTLCache(), threading.Event(), []
+    def loader():
+        calls.append(1)
+        release.wait(5)
+        return {'value': 1}
+
+    futures = start_loads(cache, 'k', loader, 4)
+    release.set()
+    assert [f.result(5) for f in futures] == [{'value': 1}] * 4
+    assert len(calls) == 1
+    assert cache.get_or_load('k', loader) == {'value': 1}
+    stats = cache.stats()
+    assert (stats['misses'], stats['coalesced'], stats['hits'], stats['inflight']) == (1, 3, 1, 0)
+
+
+def test_loader_error_reaches_every_waiter_and_is_not_cached():
+    cache, release = TTLCache(), threading.Event()
+    def failing():
+        release.wait(5)
+        raise ValueError("boom")
+
+    futures = start_loads(cache, 'k', failing, 3)
+    release.set()
+    for future in futures:
+        with pytest.raises(ValueError, match="boom"):
+            future.result(5)
+    assert cache.stats()['errors'] == 1
+    assert cache.get_or_load('k', lambda: 2) == 2
+
+
+def test_failed_write_through_releases_the_key(tmp_path):
+    cache, release = TTLCache(path=str(tmp_path / 'cache.sqlite')), threading.Event()
+    def unserialisable():
+        release.wait(5)
+        return object()
+
+    futures = start_loads(cache, 'k', unserialisable, 3)
+    release.set()
+    for future in futures:
+        with pytest.raises(TypeError):
+            future.result(5)
+    stats = cache.stats()
+    assert (stats['errors'], stats['inflight']) == (1, 0)
+    # A later call is not left waiting on the failed load
+    assert cache.get_or_load('k', lambda: [1, 2]) == [1, 2]
+    assert TTLCache(path=str(tmp_path / 'cache.sqlite')).get('k') == [1, 2]
+
+
+def test_entries_expire_and_evict_oldest():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+    assert cache.stats()['evictions'] == 1
+
+    cache.entries['a'] = (time.time() - 61, 1)
+    assert cache.get('a', 'missing') == 'missing'
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+import requests
+
+from crawler import MAX_CONSECUTIVE_FAILURES
+from ttl_cache import TTLCache
+from video_enrichment import enrich_video_ids
+from video_prefetch import VideoIdResolver, YouTubeSearch, video_key
+
+
+class FakeYTMusic:
+    """
+    Stand-in for YTMusic: answers from `videos` ({query: videoId}), finds nothing for
+    other queries, and raises a connection error for queries in `broken`. Queries past
+    the first `slow_after` take `delay` seconds.
+    """
+
+    def __init__(self, videos=None, broken=(), slow_after=None, delay=0.2):
+        self.videos = videos or {}
+        self.broken = set(broken)
+        self.slow_after = slow_after
+        self.delay = delay
+        self.queries = []
+        self.lock = threading.Lock()
+
+    def search(self, query, filter=None, limit=20):
+        with self.lock:
+            self.queries.append(query)
+            slow = self.slow_after is not None and len(self.queries) > self.slow_after
+        if slow:
+            time.sleep(self.delay)
+        if query in self.broken:
+            raise requests.ConnectionError(f"unreachable: {query}")
+        video_id = self.videos.get(query)
+        return [{'videoId': video_id}] if video_id else []
+
+
+def tracks(*pairs):
+    return pd.DataFrame({'name': [name for name, _ in pairs], 'artist': [artist for _, artist in pairs]})
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return TTLCache(maxsize=64, ttl=3600, path=str(tmp_path / 'video_cache.sqlite'))
+
+
+def enrich(df, yt, cache, **kwargs):
+    # No waiting between retries and no rate limit worth speaking of
+    options = dict(max_workers=1, rate=1000.0, max_retries=1, backoff=0.0)
+    options.update(kwargs)
+    return enrich_video_ids(df, search_fn=YouTubeSearch(yt), cache=cache, **options)
+
+
+def test_hit_is_stored_and_cached(cache):
+    yt = FakeYTMusic({'Song Artist audio': 'vid123'})
+    df = enrich(tracks(('Song', 'Artist')), yt, cache)
+    assert df['video_id'].tolist() == ['vid123']
+    assert cache.get(video_key('Song', 'Artist')) == 'vid123'
+
+
+def test_miss_is_cached(cache):
+    yt = FakeYTMusic()
+    df = enrich(tracks(('Nothing', 'Nobody')), yt, cache)
+    assert df['video_id'].tolist() == [None]
+    # The song-filtered search and the general fallback
+    assert len(yt.queries) == 2
+    assert cache.get(video_key('Nothing', 'Nobody'), default='absent') is None
+
+    # A later run answers "no video" from the cache
+    enrich(tracks(('Nothing', 'Nobody')), yt, cache)
+    assert len(yt.queries) == 2
+
+
+def test_transport_error_is_not_cached(cache):
+    yt = FakeYTMusic({'Song Artist audio': 'vid123'}, broken={'Song Artist audio'})
+    df = enrich(tracks(('Song', 'Artist')), yt, cache)
+    assert df['video_id'].tolist() == [None]
+    # One attempt plus one retry
+    assert len(yt.queries) == 2
+    assert cache.get(video_key('Song', 'Artist'), default='absent') == 'absent'
+
+    # Once the network is back the next run looks it up again
+    yt.broken.clear()
+    df = enrich(tracks(('Song', 'Artist')), yt, cache)
+    assert df['video_id'].tolist() == ['vid123']
+
+
+def test_failure_streak_stops_early(cache):
+    pairs = [(f"Song {i}", 'Artist') for i in range(MAX_CONSECUTIVE_FAILURES + 10)]
+    yt = FakeYTMusic(broken={f"{name} {artist} audio" for name, artist in pairs},
+                     slow_after=MAX_CONSECUTIVE_FAILURES)
+    state = {}
+    df = enrich(tracks(*pairs), yt, cache, max_retries=0, state=state)
+    assert state['stopped']
+    assert df['video_id'].isna().all()
+    # Queued lookups are cancelled; with one worker at most one more was already running
+    assert len(yt.queries) <= MAX_CONSECUTIVE_FAILURES + 1
+    queried = len(yt.queries)
+
+    # Later chunks of a stopped run only read the cache
+    enrich(tracks(('Song', 'Artist')), yt, cache, state=state)
+    assert len(yt.queries) == queried
+
+
+def test_existing_ids_are_kept(cache):
+    yt = FakeYTMusic()
+    df = tracks(('Song', 'Artist'))
+    df['video_id'] = ['known']
+    assert enrich(df, yt, cache)['video_id'].tolist() == ['known']
+    assert yt.queries == []
+
+
+def test_resolver_caches_misses_but_not_errors(cache):
+    yt = FakeYTMusic({'Song Artist audio': 'vid123'}, broken={'Down Artist audio'})
+    resolver = VideoIdResolver(YouTubeSearch(yt), cache, max_workers=1)
+    assert resolver.resolve('Song', 'Artist') == 'vid123'
+    assert resolver.resolve('Nothing', 'Nobody') is None
+    assert resolver.resolve('Down', 'Artist') is None
+    assert resolver.cached('Song', 'Artist') == 'vid123'
+    assert cache.get(video_key('Nothing', 'Nobody'), default='absent') is None
+    assert cache.get(video_key('Down', 'Artist'), default='absent') == 'absent'
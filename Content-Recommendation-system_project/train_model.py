@@ -1,10 +1,28 @@
 import pandas as pd
 import numpy as np
-import joblib
 import os
-import requests
-import time
-from sklearn.ensemble import RandomForestClassifier
+import argparse
+import atexit
+import itertools
+import tempfile
+from collections import Counter
+from functools import partial
+
+from artwork import DEFAULT_ARTWORK_DIR
+from artwork_enrichment import ArtworkStore, enrich_artwork
+from audio_features import extract_audio_features, open_audio_cache, FEATURE_NAMES, DEFAULT_AUDIO_CACHE_PATH
+from catalogue import write_catalogue, partition_frame, CatalogueWriter, IdSet, track_keys, CATALOGUE_DIR
+from crawler import Crawler
+from dedup import cluster_tracks
+from keyword_filter import build_filters, classify_tracks
+from metrics import REGISTRY, span, incr
+from mood_model import train_mood_model, describe_report
+from recommender import album_codes
+from search_index import build_search_index
+from similarity import build_similarity_index, fit_text_encoder
+from response_cache import ResponseCache, DEFAULT_CACHE_PATH, DEFAULT_TTL
+from video_enrichment import enrich_video_ids, open_video_cache
+from video_prefetch import DEFAULT_VIDEO_CACHE_PATH
 
 # Emoji Configuration
 EMOJI_MAPPING = {
@@ -84,24 +102,36 @@ DEFAULT_TERMS = {
 # Languages to support
 LANGUAGES = ['English', 'Hindi', 'Spanish', 'Korean', 'Telugu']
 
-def fetch_from_itunes(term, limit=10):
+# Common Negative Filters
+GLOBAL_NEGATIVE = ['karaoke', 'tribute', 'cover', 'ringtone', 'podcast', 'commentary']
+
+# Match negative keywords as whole words instead of substrings ('cover' vs 'discover')
+FILTER_WORD_BOUNDARY = False
+
+# Results requested per search term
+CRAWL_LIMIT = 12
+
+DATASET_PATH = os.path.join('data', 'music_dataset.csv')
+DATASET_COLUMNS = ['id', 'name', 'artist', 'album', 'image_url', 'preview_url',
+                   'predicted_emoji', 'mood_label', 'language', 'video_id', 'artwork']
+
+# Candidate tracks per chunk on the streaming path (--stream); bounds its peak memory
+STREAM_CHUNK_ROWS = 50_000
+
+# Streamed datasets up to this size are trained in memory exactly as before. Larger ones
+# fit the mood model and text encoder on a sample and skip the exact "more like this"
+# index, whose cost grows with the square of the catalogue.
+IN_MEMORY_TRAIN_MAX_ROWS = 500_000
+
+# Tracks sampled while streaming, for that sampled training
+TRAIN_SAMPLE_ROWS = 200_000
+
+def fetch_from_itunes(term, limit=10, crawler=None):
     """
     Search iTunes API for tracks.
     """
-    url = "https://itunes.apple.com/search"
-    params = {
-        'term': term,
-        'media': 'music',
-        'entity': 'song',
-        'limit': limit
-    }
-    try:
-        response = requests.get(url, params=params, timeout=10)
-        if response.status_code == 200:
-            return response.json().get('results', [])
-    except Exception as e:
-        print(f"Error fetching {term}: {e}")
-    return []
+    crawler = crawler or Crawler(max_workers=1)
+    return crawler.search(term, limit=limit)
 
 def get_search_terms(mood_label, lang):
     if mood_label in LOCALIZED_TERMS and lang in LOCALIZED_TERMS[mood_label]:
@@ -113,100 +143,501 @@ def get_search_terms(mood_label, lang):
         return base_terms
     return [f"{term} {lang}" for term in base_terms]
 
-def build_dataset():
+def build_crawl_plan():
+    """
+    Every (language, emoji, term) query the crawl makes, in the order results are merged.
+    """
+    plan = []
+    for lang in LANGUAGES:
+        for emoji, data in EMOJI_MAPPING.items():
+            for term in get_search_terms(data['label'], lang):
+                plan.append((lang, emoji, term))
+    return plan
+
+def terms_to_fetch(unique_terms, cache=None):
+    # Everything not fresh in the cache has to go out to iTunes
+    to_fetch = unique_terms if cache is None else cache.stale_terms(unique_terms, CRAWL_LIMIT)
+    print(f"{len(unique_terms)} unique terms, {len(to_fetch)} to fetch")
+    if cache is not None:
+        incr('crawl_cache', len(unique_terms) - len(to_fetch), result='hit')
+        incr('crawl_cache', len(to_fetch), result='miss')
+    return to_fetch
+
+def saved_track_ids(chunks):
+    # IdSet of every track id in the saved dataset (given as frames), for a refresh
+    saved = IdSet()
+    for chunk in chunks:
+        if 'id' in chunk:
+            saved.add_new(track_keys(chunk['id']))
+    return saved
+
+def has_unsaved_tracks(results, saved):
+    # Whether a cached term returned any track the saved dataset lacks. A refresh cut
+    # short after fetching leaves such terms fresh in the cache but not yet merged.
+    ids = [str(item.get('trackId')) for item in results]
+    return bool(ids) and not saved.contains(track_keys(ids)).all()
+
+def fetch_responses(terms, crawler, cache=None, saved=None):
+    """
+    Resolve {term: results} for every distinct term, serving fresh entries from the
+    cache and fetching the rest. Each fetched response is checkpointed into the cache
+    as it lands. With `saved` (a refresh: the IdSet of the saved dataset's ids),
+    cached terms whose tracks are all saved already are left out of the result.
+    """
+    unique_terms = list(dict.fromkeys(terms))
+    to_fetch = terms_to_fetch(unique_terms, cache)
+    
+    responses = {}
+    if cache is not None:
+        pending = set(to_fetch)
+        for term in unique_terms:
+            if term not in pending:
+                results = cache.get(term, CRAWL_LIMIT) or []
+                if saved is None or has_unsaved_tracks(results, saved):
+                    responses[term] = results
+    
+    on_result = cache.put if cache is not None else None
+    responses.update(crawler.search_many(to_fetch, limit=CRAWL_LIMIT, on_result=on_result))
+    return responses
+
+def track_record(item, lang, emoji, mood_label):
+    # Basic info
+    return {
+        'id': str(item.get('trackId')),
+        'name': item.get('trackName', ''),
+        'artist': item.get('artistName', ''),
+        'album': item.get('collectionName', ''),
+        'image_url': item.get('artworkUrl100'),
+        'preview_url': item.get('previewUrl'),
+        'predicted_emoji': emoji,
+        'mood_label': mood_label,
+        'language': lang # Tag with language
+    }
+
+def iter_track_records(plan, get_results):
+    """
+    Candidate track dicts for every (language, emoji, term) of `plan`, in plan order.
+    `get_results(term)` returns the term's raw iTunes results, or None to skip it.
+    """
+    for lang, emoji, term in plan:
+        results = get_results(term)
+        if results is None:
+            continue
+        mood_label = EMOJI_MAPPING[emoji]['label']
+        for item in results:
+            yield track_record(item, lang, emoji, mood_label)
+
+def build_dataset(crawler=None, cache=None, saved=None):
+    """
+    Crawl and filter the catalogue. For a refresh pass `saved`, the IdSet of the saved
+    dataset's ids (see saved_track_ids): only stale or newly added terms are fetched,
+    and the returned frame holds just the tracks of those terms and of cached ones not
+    merged yet, ready for merge_catalogue.
+    """
     print("Fetching data from iTunes (Free API)...")
-    all_tracks = []
     
-    # Common Negative Filters
-    GLOBAL_NEGATIVE = ['karaoke', 'tribute', 'cover', 'ringtone', 'podcast', 'commentary']
+    # Fetch every distinct term once, concurrently, then walk the plan in its original
+    # order so first-seen ids (and therefore drop_duplicates) behave exactly as before.
+    plan = build_crawl_plan()
+    print(f"{len(plan)} planned queries")
+    responses = fetch_responses([term for _, _, term in plan], crawler or Crawler(),
+                                cache=cache, saved=saved)
     
-    for lang in LANGUAGES:
-        print(f"--- Fetching {lang} songs ---")
-        for emoji, data in EMOJI_MAPPING.items():
-            mood_label = data['label']
-            terms = get_search_terms(mood_label, lang)
-            
-            for term in terms:
-                results = fetch_from_itunes(term, limit=12)
-                
-                for item in results:
-                    song_name = item.get('trackName', '')
-                    artist_name = item.get('artistName', '')
-                    collection_name = item.get('collectionName', '')
-                    full_text = f"{song_name} {artist_name} {collection_name}".lower()
-                    
-                    # 1. Global Negative Filter
-                    if any(bad in full_text for bad in GLOBAL_NEGATIVE):
-                        continue
-                        
-                    # 2. Mood Specific Negative Filter
-                    is_bad_match = False
-                    if 'negative' in data:
-                        for neg in data['negative']:
-                            if neg in full_text:
-                                is_bad_match = True
-                                break
-                    if is_bad_match:
-                        # Extra check: if looking for 'Party' but found 'Acoustic', skip.
-                        # But for Hindi Party, 'Remix' is actually GOOD. 
-                        # So we might need to relax 'negative' for some languages?
-                        # For now, strict filtering is safer for quality.
-                        continue
-
-                    # Basic info
-                    track_info = {
-                        'id': str(item.get('trackId')),
-                        'name': song_name,
-                        'artist': artist_name,
-                        'album': collection_name,
-                        'image_url': item.get('artworkUrl100').replace('100x100', '600x600'),
-                        'preview_url': item.get('previewUrl'),
-                        'predicted_emoji': emoji, 
-                        'mood_label': mood_label,
-                        'language': lang # Tag with language
-                    }
-                    all_tracks.append(track_info)
-                time.sleep(0.1) 
+    df = pd.DataFrame(list(iter_track_records(plan, responses.get)))
+    if df.empty:
+        return df
+    df = apply_filters(df)
+    df['image_url'] = df['image_url'].str.replace('100x100', '600x600', regex=False)
             
     # Remove duplicates
-    df = pd.DataFrame(all_tracks).drop_duplicates(subset=['id'])
-    return df
-
-def train_and_save_pipeline(df):
-    # Since we don't have audio features (valence/energy) from iTunes,
-    # We can't train a feature-based Classifier in the same way.
-    # However, the app relies on 'predicted_emoji' column which we now have directly.
-    # To keep the code consistent with app expectation of a "model",
-    # We'll just save the labeled dataset.
-    # If we really wanted a model, we'd need audio analysis (librosa) which is too heavy.
-    # For this use case, Keyword Mapping IS the model.
-    
-    print("Training model... (Skipped: Using Direct Labeling)")
-    
-    # We create a dummy model object just to satisfy the file structure if needed,
-    # but the app mainly uses the dataframe + labeled column.
-    
-    artifacts = {
-        'model': None, # No RF model needed for keyword lookup
-        'data': df
-    }
+    return df.drop_duplicates(subset=['id'])
+
+def apply_filters(df, word_boundary=FILTER_WORD_BOUNDARY):
+    """
+    Drop tracks matching a global or mood-specific negative keyword and print how many
+    each rule rejected.
+    """
+    # Strict filtering is safer for quality, even though e.g. 'Remix' is actually GOOD
+    # for Hindi Party; relaxing 'negative' per language would go in EMOJI_MAPPING.
+    filters = build_filters(EMOJI_MAPPING, GLOBAL_NEGATIVE, word_boundary)
+    kept, rejected = filter_tracks(df, filters)
+    if not rejected.empty:
+        print(f"Filtered out {len(rejected)} of {len(df)} tracks:")
+        for rule, count in rejected.value_counts().items():
+            print(f"  {rule}: {count}")
+    return kept
+
+def filter_tracks(df, filters):
+    """
+    Split `df` with prebuilt keyword filters. Returns (kept rows, reject reason of
+    every dropped row).
+    """
+    with span('apply_filters'):
+        reasons = classify_tracks(df, filters)
+    rejected = reasons.dropna()
+    incr('tracks_checked', len(df))
+    for rule, count in rejected.value_counts().items():
+        incr('tracks_filtered', int(count), rule=rule)
+    return df[reasons.isna()].reset_index(drop=True), rejected
+
+def load_saved_dataset(path=DATASET_PATH):
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    return pd.read_csv(path, dtype={'id': str, 'video_id': str, 'artwork': str})
+
+def merge_catalogue(existing, fresh):
+    """
+    Merge freshly crawled tracks into the existing catalogue by `id`. Existing rows keep
+    their mood label; ids not seen before are appended.
+    """
+    if existing.empty:
+        return fresh
+    if fresh.empty:
+        return existing
+    merged = pd.concat([existing, fresh], ignore_index=True)
+    return merged.drop_duplicates(subset=['id'], keep='first').reset_index(drop=True)
+
+def save_dataset(df, path=DATASET_PATH):
+    # Write to a temp file first so an interrupted run never leaves a truncated CSV
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def train_and_save_pipeline(df, audio_features=None):
+    # iTunes gives no valence/energy, so the keyword-derived 'predicted_emoji' labels are
+    # the training targets and the text metadata is the input. The classifier then labels
+    # tracks that never went through the crawl filters, e.g. live search results in the
+    # app, which have no audio to go on. `audio_features(df)` (the optional preview
+    # analysis stage) returns a row-aligned matrix that is stored with the catalogue
+    # for downstream models and blended into "more like this".
+    
+    # Partition-sort first so anything row-aligned we compute matches the stored order
+    df, _ = partition_frame(df)
+    
+    audio = None
+    if audio_features is not None:
+        with span('stage', stage='audio_features'):
+            audio = audio_features(df)
+        if np.isnan(audio).any(axis=1).all():
+            # Nothing was analysed (e.g. no ffmpeg, or no network): all-NaN features
+            # would only add an empty block to every similarity vector
+            print("  no track has audio features; the catalogue is published without them")
+            audio = None
+    
+    print("Training mood classifier...")
+    with span('stage', stage='mood_model'):
+        model, report = train_mood_model(df)
+    print(f"  {describe_report(report)}")
+    if model is not None:
+        print(f"  inference {report['latency']['median_ms']:.2f} ms per {report['latency']['batch']}-track batch")
+    
+    print("Building similar-songs index...")
+    with span('stage', stage='similarity'):
+        arrays, objects = build_similarity_index(df, audio=audio)
+    extra = {'mood_model': report}
+    if audio is not None:
+        arrays['audio_features'] = audio
+        extra['audio_features'] = FEATURE_NAMES
     
-    joblib.dump(artifacts, 'model.pkl')
-    print(f"Model and Dataset with {len(df)} songs saved to model.pkl")
+    print("Building search index...")
+    with span('stage', stage='search_index'):
+        arrays.update(build_search_index(df))
+    
+    # The same song crawled under several track ids (soundtrack and compilation
+    # re-releases, remasters) is kept, but clustered so lists show it once
+    print("Clustering near-duplicate releases...")
+    with span('stage', stage='dedup'):
+        arrays['cluster_id'] = cluster_tracks(df)
+    print(f"  {int((arrays['cluster_id'] != np.arange(len(df))).sum())} tracks are other releases "
+          f"of a song already in the catalogue")
+    # Integer album codes for the per-album cap when Top Picks are re-ranked for diversity
+    arrays['album_code'] = album_codes(df)
+    
+    # The labeled dataset is published as a memory-mappable columnar catalogue
+    # (see catalogue.py) instead of a pickled DataFrame, so app workers can share it.
+    if model is not None:
+        objects['mood_model'] = model
+    with span('stage', stage='publish'):
+        manifest = write_catalogue(df, CATALOGUE_DIR,
+                                   arrays=arrays,
+                                   objects=objects,
+                                   extra=extra)
+    print(f"Catalogue with {manifest['n_rows']} songs published to {CATALOGUE_DIR}/ as version {manifest['version']}")
+
+class Reservoir:
+    """
+    Uniform random sample of at most `size` rows from a stream of DataFrame chunks.
+    Every row draws a random priority and the `size` lowest are kept (bottom-k).
+    """
+
+    def __init__(self, size, seed=42):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.frame = pd.DataFrame()
+        self.priorities = np.zeros(0)
+
+    def add(self, chunk):
+        priorities = self.rng.random(len(chunk))
+        if len(self.priorities) >= self.size:
+            # Only rows beating the current worst kept row can get in
+            beats = priorities < self.priorities.max()
+            chunk, priorities = chunk[beats], priorities[beats]
+        frame = pd.concat([self.frame, chunk], ignore_index=True)
+        priorities = np.concatenate([self.priorities, priorities])
+        if len(priorities) > self.size:
+            keep = np.argpartition(priorities, self.size - 1)[:self.size]
+            frame, priorities = frame.iloc[keep].reset_index(drop=True), priorities[keep]
+        self.frame, self.priorities = frame, priorities
+
+def iter_chunks(records, chunk_rows=STREAM_CHUNK_ROWS):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == chunk_rows:
+            yield pd.DataFrame(chunk)
+            chunk = []
+    if chunk:
+        yield pd.DataFrame(chunk)
+
+def iter_clean_chunks(chunks, seen, rejected, word_boundary=FILTER_WORD_BOUNDARY):
+    """
+    Filter and deduplicate candidate chunks as they stream past. `seen` (an IdSet)
+    holds every id already let through, so the first occurrence of an id wins across
+    the whole stream, as with build_dataset's drop_duplicates. Reject counts per rule
+    are added to the `rejected` Counter.
+    """
+    filters = build_filters(EMOJI_MAPPING, GLOBAL_NEGATIVE, word_boundary)
+    for chunk in chunks:
+        chunk, reasons = filter_tracks(chunk, filters)
+        rejected.update(reasons.value_counts().to_dict())
+        chunk = chunk[seen.add_new(track_keys(chunk['id']))].reset_index(drop=True)
+        if chunk.empty:
+            continue
+        chunk['image_url'] = chunk['image_url'].str.replace('100x100', '600x600', regex=False)
+        yield chunk
+
+def iter_dataset_chunks(path=DATASET_PATH, chunk_rows=STREAM_CHUNK_ROWS):
+    # Every column is text; reading it as such keeps the chunks' dtypes consistent
+    return pd.read_csv(path, dtype=str, chunksize=chunk_rows)
+
+def stream_dataset(crawler, cache, refresh=False, path=DATASET_PATH, chunk_rows=STREAM_CHUNK_ROWS,
+                   enrich=None, sample_rows=TRAIN_SAMPLE_ROWS):
+    """
+    Bounded-memory version of build_dataset, merge_catalogue and save_dataset.
+
+    Responses are checkpointed into `cache` as they land and read back term by term,
+    candidate tracks are filtered and deduplicated `chunk_rows` at a time, and every
+    clean chunk is passed through `enrich` (e.g. video ids) and appended to the dataset
+    CSV. With `refresh` only stale terms are crawled, cached terms whose tracks are all
+    saved are skipped, and the existing dataset streams through first, so its rows win
+    as in merge_catalogue. Returns (rows written, Reservoir sample of them).
+    """
+    print("Fetching data from iTunes (Free API), streaming...")
+    plan = build_crawl_plan()
+    print(f"{len(plan)} planned queries")
+    to_fetch = terms_to_fetch(list(dict.fromkeys(term for _, _, term in plan)), cache)
+    crawler.search_many(to_fetch, limit=CRAWL_LIMIT, on_result=cache.put, collect=False)
+
+    # A failed term has nothing (fresh) in the cache and is skipped
+    fetched = set(to_fetch)
+    saved = None
+    if refresh:
+        saved = saved_track_ids(pd.read_csv(path, usecols=['id'], dtype=str, chunksize=chunk_rows)
+                                if os.path.exists(path) else [])
+    def get_results(term):
+        results = cache.get(term, CRAWL_LIMIT)
+        if saved is not None and term not in fetched and results and not has_unsaved_tracks(results, saved):
+            return None
+        return results
+
+    seen, rejected, sample = IdSet(), Counter(), Reservoir(sample_rows)
+    chunks = iter_clean_chunks(iter_chunks(iter_track_records(plan, get_results), chunk_rows), seen, rejected)
+    if refresh and os.path.exists(path):
+        existing = (chunk[seen.add_new(track_keys(chunk['id']))] for chunk in iter_dataset_chunks(path, chunk_rows))
+        chunks = itertools.chain(existing, chunks)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    n_rows = 0
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        for chunk in chunks:
+            if enrich is not None:
+                chunk = enrich(chunk)
+            chunk = chunk.reindex(columns=DATASET_COLUMNS)
+            chunk.to_csv(f, header=n_rows == 0, index=False)
+            sample.add(chunk)
+            n_rows += len(chunk)
+
+    if rejected:
+        print(f"Filtered out {sum(rejected.values())} tracks:")
+        for rule, count in rejected.most_common():
+            print(f"  {rule}: {count}")
+    print(f"{n_rows} unique tracks written ({seen.nbytes / 1e6:.1f} MB of ids held for dedup)")
+    # Same atomic swap as save_dataset; an empty crawl leaves the old dataset alone
+    if n_rows:
+        os.replace(tmp_path, path)
+    else:
+        os.remove(tmp_path)
+    return n_rows, sample.frame
+
+def train_from_sample(sample, path=DATASET_PATH, chunk_rows=STREAM_CHUNK_ROWS):
+    """
+    Train and publish a catalogue too large for memory: the mood model and text
+    encoder are fitted on `sample`, and the dataset streams into a CatalogueWriter with
+    each chunk's embeddings. The exact neighbour index and near-duplicate clusters are
+    skipped, so "more like this" is unavailable and re-releases are not collapsed on
+    such catalogues.
+    """
+    print(f"Training mood classifier on a {len(sample)}-track sample...")
+    with span('stage', stage='mood_model'):
+        model, report = train_mood_model(sample)
+    print(f"  {describe_report(report)}")
+
+    print("Fitting text encoder and embedding the catalogue...")
+    with span('stage', stage='similarity'):
+        encoder, _, _ = fit_text_encoder(sample)
+    with span('stage', stage='publish'):
+        writer = CatalogueWriter(CATALOGUE_DIR)
+        for chunk in iter_dataset_chunks(path, chunk_rows):
+            writer.append(chunk, arrays={'embeddings': encoder.project(encoder.sparse(chunk))})
+        objects = {'text_encoder': encoder}
+        if model is not None:
+            objects['mood_model'] = model
+        manifest = writer.close(objects=objects,
+                                extra={'mood_model': report, 'trained_on_sample': len(sample)})
+    print(f"Catalogue with {manifest['n_rows']} songs published to {CATALOGUE_DIR}/ as version {manifest['version']}")
+
+def stream_main(args):
+    # Without the on-disk cache, responses still go through a throwaway one so the
+    # crawl never holds them all in memory
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.no_cache:
+            cache = ResponseCache(os.path.join(tmp, 'responses.sqlite'), ttl=None)
+        else:
+            cache = ResponseCache(args.cache, ttl=args.ttl_hours * 3600)
+        enrichers = []
+        if not args.skip_video_ids:
+            enrichers.append(partial(enrich_video_ids, cache=open_video_cache(args.video_cache),
+                                     max_workers=args.video_workers, rate=args.video_rate, state={}))
+        if not args.skip_artwork:
+            enrichers.append(partial(enrich_artwork, store=ArtworkStore(args.artwork_dir),
+                                     crawler=artwork_crawler(args), state={}))
+        def enrich(chunk):
+            for enricher in enrichers:
+                chunk = enricher(chunk)
+            return chunk
+        with span('stage', stage='crawl'):
+            n_rows, sample = stream_dataset(Crawler(), cache, refresh=args.refresh and not args.no_cache,
+                                            chunk_rows=args.chunk_rows, enrich=enrich)
+        cache.close()
+
+    if not n_rows:
+        print("iTunes returned no tracks. Check internet.")
+        return
+    print(f"Dataset saved with {n_rows} songs.")
+    if n_rows <= IN_MEMORY_TRAIN_MAX_ROWS:
+        train_and_save_pipeline(load_saved_dataset(), audio_stage(args))
+    else:
+        train_from_sample(sample, chunk_rows=args.chunk_rows)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Crawl iTunes and build the mood catalogue.")
+    parser.add_argument('--refresh', action='store_true',
+                        help="Only refetch stale or newly added terms and merge them into the existing catalogue.")
+    parser.add_argument('--ttl-hours', type=float, default=DEFAULT_TTL / 3600,
+                        help="How long a cached iTunes response stays fresh.")
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH, help="Path of the response cache.")
+    parser.add_argument('--no-cache', action='store_true', help="Ignore the response cache and refetch everything.")
+    parser.add_argument('--refilter', action='store_true',
+                        help="Re-apply the current keyword rules to the saved catalogue without crawling.")
+    parser.add_argument('--skip-video-ids', action='store_true',
+                        help="Don't resolve YouTube video ids (the app then looks them up at play time).")
+    parser.add_argument('--video-cache', default=DEFAULT_VIDEO_CACHE_PATH,
+                        help="Path of the video id cache; lets an interrupted enrichment resume.")
+    parser.add_argument('--video-workers', type=int, default=4, help="Concurrent video id lookups.")
+    parser.add_argument('--video-rate', type=float, default=4.0, help="Video id lookups per second.")
+    parser.add_argument('--skip-artwork', action='store_true',
+                        help="Don't download artwork thumbnails (cards then load the full-size iTunes artwork).")
+    parser.add_argument('--artwork-dir', default=DEFAULT_ARTWORK_DIR,
+                        help="Content-addressed thumbnail cache; lets an interrupted download resume.")
+    parser.add_argument('--artwork-workers', type=int, default=8, help="Concurrent artwork downloads.")
+    parser.add_argument('--artwork-rate', type=float, default=20.0, help="Artwork downloads per second.")
+    parser.add_argument('--audio-features', action='store_true',
+                        help="Decode the preview clips (needs ffmpeg) and store audio features with the catalogue.")
+    parser.add_argument('--audio-workers', type=int, default=os.cpu_count() or 1,
+                        help="Processes analysing previews.")
+    parser.add_argument('--audio-cache', default=DEFAULT_AUDIO_CACHE_PATH,
+                        help="Per-track feature checkpoints; lets an interrupted extraction resume.")
+    parser.add_argument('--stream', action='store_true',
+                        help="Bounded-memory ingestion: crawl, filter, dedupe and write the dataset in chunks.")
+    parser.add_argument('--chunk-rows', type=int, default=STREAM_CHUNK_ROWS,
+                        help="Tracks per chunk with --stream.")
+    parser.add_argument('--metrics-out',
+                        help="Write crawl/filter/training metrics here on exit (.prom for Prometheus text, else JSON).")
+    return parser.parse_args()
+
+def add_video_ids(df, args):
+    # Enrichment stage: resolve play-time video ids once, offline
+    if args.skip_video_ids:
+        return df
+    with span('stage', stage='video_ids'):
+        return enrich_video_ids(df, cache=open_video_cache(args.video_cache),
+                                max_workers=args.video_workers, rate=args.video_rate)
+
+def artwork_crawler(args):
+    return Crawler(max_workers=args.artwork_workers, rate=args.artwork_rate, per_host=args.artwork_workers)
+
+def add_artwork(df, args):
+    # Enrichment stage: download artwork once and keep card-sized thumbnails locally
+    if args.skip_artwork:
+        return df
+    with span('stage', stage='artwork'):
+        return enrich_artwork(df, store=ArtworkStore(args.artwork_dir), crawler=artwork_crawler(args))
+
+def audio_stage(args):
+    # Optional: previews are slow to fetch and decode, so this runs only when asked for
+    if not args.audio_features:
+        return None
+    return partial(extract_audio_features, cache=open_audio_cache(args.audio_cache),
+                   max_workers=args.audio_workers)
 
 def main():
-    df = build_dataset()
+    args = parse_args()
+    if args.metrics_out:
+        # Registered up front so failed and early-exit runs are reported too
+        atexit.register(REGISTRY.write, args.metrics_out)
+    if args.stream and not args.refilter:
+        stream_main(args)
+        return
+    if args.refilter:
+        df = add_artwork(add_video_ids(apply_filters(load_saved_dataset()), args), args)
+        save_dataset(df)
+        print(f"Dataset re-filtered: {len(df)} songs kept.")
+        train_and_save_pipeline(df, audio_stage(args))
+        return
+    
+    cache = None if args.no_cache else ResponseCache(args.cache, ttl=args.ttl_hours * 3600)
+    
+    # A refresh rebuilds from the cache whatever the saved dataset lacks, so one that
+    # was interrupted (or has no dataset to refresh) still ends up with every track
+    existing = load_saved_dataset() if args.refresh and cache is not None else None
+    with span('stage', stage='crawl'):
+        df = build_dataset(cache=cache, saved=saved_track_ids([existing]) if existing is not None else None)
+    
+    if existing is not None:
+        print(f"Refresh found {len(df)} tracks; merging into {len(existing)} existing songs.")
+        df = merge_catalogue(existing, df)
     
     if df.empty:
         print("iTunes returned no tracks. Check internet.")
         return
 
-    # Create data directory if not exists
-    os.makedirs('data', exist_ok=True)
-    df.to_csv('data/music_dataset.csv', index=False)
+    df = add_artwork(add_video_ids(df, args), args)
+    save_dataset(df)
     print(f"Dataset saved with {len(df)} songs.")
     
-    train_and_save_pipeline(df)
+    train_and_save_pipeline(df, audio_stage(args))
 
 if __name__ == "__main__":
     main()
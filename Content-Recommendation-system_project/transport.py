@@ -0,0 +1,271 @@
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from http.client import responses as STATUS_REASONS
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from metrics import incr
+
+# How outgoing HTTP calls (iTunes, artwork, previews, YouTube Music) are made:
+#   live                               straight to the network (default)
+#   record:data/cassette.sqlite        live, and every response is saved to the cassette
+#   replay:data/cassette.sqlite?latency=0.05&jitter=0.5&error_rate=0.02&failure_rate=0.01&seed=1
+#                                      answered from the cassette, never touching the network
+TRANSPORT_ENV = 'EMOTIFY_TRANSPORT'
+
+# Query options a replay spec accepts, with their types
+REPLAY_OPTIONS = {'latency': float, 'jitter': float, 'error_rate': float, 'failure_rate': float, 'seed': int}
+
+# Transient answers are not recorded; replay injects its own errors instead
+UNRECORDED_STATUS = {429, 500, 502, 503, 504}
+
+# Status of the injected HTTP errors
+INJECTED_ERROR_STATUS = 503
+
+
+def request_key(method, url, body=None):
+    """
+    Cassette key of a request: method, URL with its query parameters sorted, and body.
+    JSON bodies lose their top-level 'context', which YouTube Music stamps with the
+    client version and date, so a recording keeps matching on later days.
+    """
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    body = body.encode('utf-8') if isinstance(body, str) else (body or b'')
+    if body[:1] == b'{':
+        try:
+            payload = json.loads(body)
+            payload.pop('context', None)
+            body = json.dumps(payload, sort_keys=True).encode('utf-8')
+        except ValueError:
+            pass
+    digest = hashlib.sha256(f"{method.upper()} {parts.scheme}://{parts.netloc}{parts.path}?{query}\n".encode('utf-8'))
+    digest.update(body)
+    return digest.hexdigest()
+
+
+class Cassette:
+    """
+    Recorded HTTP responses in one SQLite file, keyed by request_key. Bodies are stored
+    zlib-compressed and only the Content-Type header is kept, so a crawl's worth of
+    JSON stays small. Safe to share between threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    method TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    status INTEGER NOT NULL,
+                    content_type TEXT,
+                    body BLOB NOT NULL,
+                    elapsed REAL NOT NULL,
+                    recorded_at REAL NOT NULL
+                )
+            """)
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def get(self, key):
+        """
+        (status, content type, body, seconds the live call took), or None if not recorded.
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT status, content_type, body, elapsed FROM responses WHERE key = ?",
+                                    (key,)).fetchone()
+        if row is None:
+            return None
+        status, content_type, body, elapsed = row
+        return status, content_type, zlib.decompress(body), elapsed
+
+    def put(self, key, method, url, status, content_type, body, elapsed):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, method, url, status, content_type, body, elapsed, recorded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, method, url, status, content_type, zlib.compress(body, 6), elapsed, time.time()))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def build_response(request, status, content_type, body):
+    response = requests.Response()
+    response.status_code = status
+    response.reason = STATUS_REASONS.get(status, '')
+    response.headers = CaseInsensitiveDict({'Content-Type': content_type} if content_type else {})
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response._content = body
+    response.url = request.url
+    response.request = request
+    return response
+
+
+class RecordingAdapter(HTTPAdapter):
+    """
+    Sends requests to the network as usual and saves every answer (bar transient
+    errors) to a cassette. Streamed responses (stream=True) pass through unrecorded:
+    saving one would mean reading the whole body before the caller sees any of it.
+    Nothing in the crawler, the iTunes search or YouTube Music streams.
+    """
+
+    def __init__(self, cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def send(self, request, stream=False, **kwargs):
+        started = time.perf_counter()
+        response = super().send(request, stream=stream, **kwargs)
+        if stream:
+            return response
+        body = response.content
+        if response.status_code not in UNRECORDED_STATUS:
+            self.cassette.put(request_key(request.method, request.url, request.body), request.method,
+                              request.url, response.status_code, response.headers.get('Content-Type'), body,
+                              time.perf_counter() - started)
+            incr('transport_recorded')
+        # The body is already decoded; a replayed copy must not claim to be compressed
+        response.headers.pop('Content-Encoding', None)
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    Answers requests from a cassette without touching the network. Every call waits
+    `latency` seconds (varied by +/- `jitter` as a fraction), then `error_rate` of calls
+    get an HTTP 503 and `failure_rate` a connection error; all drawn from one seeded
+    generator, so a single-threaded run is reproducible. A request that was never
+    recorded fails like an unreachable host.
+    """
+
+    def __init__(self, cassette, latency=0.0, jitter=0.0, error_rate=0.0, failure_rate=0.0, seed=None):
+        super().__init__()
+        self.cassette = cassette
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        with self.lock:
+            delay = self.latency * (1 + self.jitter * (2 * self.rng.random() - 1))
+            draw = self.rng.random()
+        if delay > 0:
+            time.sleep(delay)
+        if draw < self.failure_rate:
+            incr('transport_injected', kind='failure')
+            raise requests.ConnectionError(f"injected connection failure for {request.url}", request=request)
+        if draw < self.failure_rate + self.error_rate:
+            incr('transport_injected', kind='error')
+            return build_response(request, INJECTED_ERROR_STATUS, 'text/plain', b'injected error')
+        recorded = self.cassette.get(request_key(request.method, request.url, request.body))
+        if recorded is None:
+            incr('transport_replay', result='miss')
+            raise requests.ConnectionError(f"no recording for {request.method} {request.url}", request=request)
+        incr('transport_replay', result='hit')
+        status, content_type, body, _ = recorded
+        return build_response(request, status, content_type, body)
+
+    def close(self):
+        pass
+
+
+class Transport:
+    """
+    Where outgoing HTTP calls go: 'live', 'record' (live, saving every response to a
+    Cassette) or 'replay' (answered from one, with injected latency and errors; see
+    ReplayAdapter). session() gives a requests.Session routed accordingly, which the
+    crawler, the live iTunes search and the YouTube Music client all use.
+    """
+
+    def __init__(self, mode='live', cassette=None, **replay_options):
+        if mode not in ('live', 'record', 'replay'):
+            raise ValueError(f"unknown transport mode {mode!r}")
+        if mode != 'live' and cassette is None:
+            raise ValueError(f"transport mode {mode!r} needs a cassette")
+        self.mode = mode
+        self.cassette = cassette
+        if mode == 'record':
+            self.adapter = RecordingAdapter(self.cassette)
+        elif mode == 'replay':
+            self.adapter = ReplayAdapter(self.cassette, **replay_options)
+        else:
+            self.adapter = None
+        self._local = threading.local()
+
+    @classmethod
+    def from_spec(cls, spec):
+        """
+        Transport from a spec such as 'live', 'record:data/cassette.sqlite' or
+        'replay:data/cassette.sqlite?latency=0.05&error_rate=0.02&seed=1'. Raises
+        ValueError for a spec without a cassette path or with options it doesn't know.
+        """
+        mode, _, rest = (spec or 'live').partition(':')
+        path, _, query = rest.partition('?')
+        options = dict(parse_qsl(query, keep_blank_values=True))
+        unknown = sorted(set(options) - set(REPLAY_OPTIONS) if mode == 'replay' else options)
+        if unknown:
+            raise ValueError(f"unknown option(s) {', '.join(unknown)} in transport spec {spec!r}")
+        if mode in ('record', 'replay') and not path:
+            raise ValueError(f"transport spec {spec!r} needs a cassette path, e.g. '{mode}:data/cassette.sqlite'")
+        replay_options = {name: REPLAY_OPTIONS[name](value) for name, value in options.items()}
+        cassette = Cassette(path) if mode in ('record', 'replay') else None
+        return cls(mode, cassette, **replay_options)
+
+    def session(self):
+        session = requests.Session()
+        if self.adapter is not None:
+            session.mount('http://', self.adapter)
+            session.mount('https://', self.adapter)
+        return session
+
+    def thread_session(self):
+        # requests.Session is not safe to share across threads, so keep one per thread
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self.session()
+        return session
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_transport():
+    """
+    The process-wide transport, configured by EMOTIFY_TRANSPORT (live when unset).
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Transport.from_spec(os.environ.get(TRANSPORT_ENV))
+        return _default
+
+
+def set_transport(transport):
+    # E.g. for benchmarks that record and replay within one process
+    global _default
+    with _default_lock:
+        _default = transport
@@ -0,0 +1,135 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class TTLCache:
+    """
+    Thread-safe bounded cache with per-entry TTL and LRU eviction.
+
+    get_or_load() is single-flight: when several threads (Streamlit sessions) miss on
+    the same key at once, only the first runs the loader and the rest wait for its
+    result. With `path`, entries are also written through to SQLite so they survive
+    restarts and are shared by every server process on the box. Values must be
+    JSON-serialisable when persistence is on, and loader exceptions are never cached.
+    """
+
+    def __init__(self, maxsize=1024, ttl=600, path=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (stored_at, value)
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'coalesced': 0,
+                         'evictions': 0, 'errors': 0}
+        self.conn = None
+        if path:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+            with self.conn:
+                self.conn.execute("PRAGMA journal_mode=WAL")
+                self.conn.execute("""
+                    CREATE TABLE IF NOT EXISTS cache (
+                        key TEXT PRIMARY KEY,
+                        stored_at REAL NOT NULL,
+                        value TEXT NOT NULL
+                    )
+                """)
+
+    def _fresh(self, stored_at, now):
+        return self.ttl is None or now - stored_at < self.ttl
+
+    def _store(self, key, value, stored_at):
+        # Caller holds the lock
+        self.entries[key] = (stored_at, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.counters['evictions'] += 1
+
+    def _lookup(self, key, now):
+        # Caller holds the lock. Memory first, then the on-disk tier.
+        entry = self.entries.get(key)
+        if entry is not None:
+            if self._fresh(entry[0], now):
+                self.entries.move_to_end(key)
+                self.counters['hits'] += 1
+                return True, entry[1]
+            del self.entries[key]
+        if self.conn is not None:
+            row = self.conn.execute("SELECT stored_at, value FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and self._fresh(row[0], now):
+                value = json.loads(row[1])
+                self._store(key, value, row[0])
+                self.counters['disk_hits'] += 1
+                return True, value
+        return False, None
+
+    def get(self, key, default=None):
+        with self.lock:
+            found, value = self._lookup(key, time.time())
+        return value if found else default
+
+    def put(self, key, value):
+        now = time.time()
+        # Serialised first, so a value that can't be persisted isn't kept in memory either
+        payload = json.dumps(value) if self.conn is not None else None
+        with self.lock:
+            if self.conn is not None:
+                with self.conn:
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO cache (key, stored_at, value) VALUES (?, ?, ?)",
+                        (key, now, payload))
+            self._store(key, value, now)
+
+    def get_or_load(self, key, loader):
+        """
+        Cached value for `key`, calling `loader()` at most once per key at a time.
+        """
+        with self.lock:
+            found, value = self._lookup(key, time.time())
+            if found:
+                return value
+            pending = self.inflight.get(key)
+            if pending is None:
+                pending = Future()
+                self.inflight[key] = pending
+                self.counters['misses'] += 1
+                owner = True
+            else:
+                self.counters['coalesced'] += 1
+                owner = False
+
+        if not owner:
+            return pending.result()
+
+        # A failing loader or write-through reaches every waiter; the key is always
+        # released so the next call tries again
+        try:
+            value = loader()
+            self.put(key, value)
+        except BaseException as e:
+            with self.lock:
+                self.counters['errors'] += 1
+            pending.set_exception(e)
+            raise
+        else:
+            pending.set_result(value)
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+        return value
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats['size'] = len(self.entries)
+            stats['inflight'] = len(self.inflight)
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_rate'] = (stats['hits'] + stats['disk_hits'] + stats['coalesced']) / lookups if lookups else 0.0
+        return stats
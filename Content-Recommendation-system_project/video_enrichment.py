@@ -0,0 +1,84 @@
+import time
+
+import pandas as pd
+
+from crawler import TokenBucket, run_until_failure_streak
+from ttl_cache import TTLCache
+from video_prefetch import YouTubeSearch, video_key, DEFAULT_VIDEO_CACHE_PATH, VIDEO_ID_TTL
+
+
+def open_video_cache(path=DEFAULT_VIDEO_CACHE_PATH, ttl=VIDEO_ID_TTL):
+    # Same table the app's resolver reads, so ids found here are hits there too
+    return TTLCache(maxsize=4096, ttl=ttl, path=path)
+
+
+def lookup_with_retries(search_fn, name, artist, bucket, max_retries=3, backoff=1.0):
+    """
+    Rate-limited lookup with exponential backoff. Returns (True, video_id), or
+    (False, last exception) when every attempt raised.
+    """
+    for attempt in range(max_retries + 1):
+        bucket.acquire()
+        try:
+            return True, search_fn(name, artist)
+        except Exception as e:
+            if attempt == max_retries:
+                return False, e
+            time.sleep(backoff * (2 ** attempt))
+
+
+def enrich_video_ids(df, search_fn=None, cache=None, max_workers=4, rate=4.0,
+                     max_retries=3, backoff=1.0, state=None):
+    """
+    Resolve a YouTube videoId for every row of `df` into a `video_id` column.
+
+    Rows that already have an id are kept. Every answer (including "no match") is written
+    to the persistent cache as soon as it arrives, so an interrupted run resumes where it
+    stopped; failed lookups are left empty and retried on the next run. When a dataset is
+    enriched chunk by chunk, pass one `state` dict to every call: once a chunk has
+    stopped early, later chunks only fill ids from the cache.
+    """
+    state = {} if state is None else state
+    search_fn = search_fn or YouTubeSearch()
+    cache = cache or open_video_cache()
+    existing = df['video_id'] if 'video_id' in df.columns else pd.Series(None, index=df.index, dtype=object)
+    keys = [video_key(n, a) for n, a in zip(df['name'], df['artist'])]
+
+    resolved, pending = {}, {}
+    for key, name, artist, current in zip(keys, df['name'], df['artist'], existing):
+        if key in resolved or key in pending:
+            continue
+        if isinstance(current, str) and current:
+            resolved[key] = current
+            continue
+        cached = cache.get(key, default=cache)
+        if cached is not cache:
+            resolved[key] = cached
+        else:
+            pending[key] = (name, artist)
+
+    if state.get('stopped'):
+        pending = {}
+    print(f"Resolving video ids: {len(resolved)} known, {len(pending)} to look up...")
+    bucket = TokenBucket(rate)
+    failed = 0
+    last_error = None
+    def lookup(key):
+        name, artist = pending[key]
+        return lookup_with_retries(search_fn, name, artist, bucket, max_retries, backoff)
+    for key, found, result in run_until_failure_streak(lookup, pending, max_workers, state,
+                                                       noun='lookups', progress='looked up'):
+        if found:
+            cache.put(key, result)
+            resolved[key] = result
+        else:
+            failed += 1
+            last_error = result
+
+    df = df.copy()
+    # Object dtype keeps this a string column even when nothing resolved
+    df['video_id'] = pd.Series([resolved.get(k) for k in keys], index=df.index, dtype=object)
+    print(f"  {df['video_id'].notna().sum()}/{len(df)} rows have a video id ({failed} lookups failed)")
+    if last_error is not None:
+        print(f"  last error: {last_error}")
+    return df
@@ -0,0 +1,140 @@
+import os
+import threading
+import uuid
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import span, incr
+
+# Shared by the app and the training-time enrichment stage
+DEFAULT_VIDEO_CACHE_PATH = os.path.join('data', 'video_cache.sqlite')
+
+# Resolved ids (and "not found" answers) are kept for a month
+VIDEO_ID_TTL = 30 * 24 * 3600
+
+# Most recently warmed scopes the resolver remembers; the oldest is cancelled and
+# forgotten beyond this, even if its session never ended cleanly
+MAX_SCOPES = 256
+
+
+def video_key(name, artist):
+    return f"{(name or '').strip().lower()}|{(artist or '').strip().lower()}"
+
+
+class YouTubeSearch:
+    """
+    Search client: call with (name, artist) to get a YouTube videoId, or None when
+    nothing matches. Transport errors are raised so callers can retry and so they are
+    never cached as "no video". Any object with a YTMusic-style search() can be passed in.
+    """
+
+    def __init__(self, yt=None):
+        self.yt = yt
+        self.lock = threading.Lock()
+
+    def __call__(self, name, artist):
+        if self.yt is None:
+            # ytmusicapi is imported on the first search that needs it (e.g. the app's
+            # first Play of a track without a stored id), never at startup
+            with self.lock:
+                if self.yt is None:
+                    from ytmusicapi import YTMusic
+                    from transport import get_transport
+                    self.yt = YTMusic(requests_session=get_transport().session())
+        query = f"{name} {artist} audio"
+        with span('youtube_search'):
+            results = self.yt.search(query, filter='songs', limit=1)
+            if results:
+                return results[0]['videoId']
+            # Fallback to general search if song filter fails
+            results = self.yt.search(query, limit=1)
+        if results:
+            return results[0]['videoId']
+        return None
+
+
+class VideoIdResolver:
+    """
+    (name, artist) -> YouTube videoId lookups backed by a persistent TTLCache, plus a
+    bounded background pool that warms the cache for whatever grid a session is showing.
+
+    Warming is scoped (the app uses one scope per session and grid): a new warm() call
+    for the same scope cancels the jobs from the previous one that have not started
+    yet, so paging or switching views never leaves a backlog of lookups for cards
+    nobody can see. Only the MAX_SCOPES most recently warmed scopes are remembered.
+    """
+
+    def __init__(self, search_fn, cache, max_workers=4, max_scopes=MAX_SCOPES):
+        # search_fn(name, artist) -> videoId or None; raises on transport errors
+        self.search_fn = search_fn
+        self.cache = cache
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='video-prefetch')
+        self.lock = threading.Lock()
+        self.max_scopes = max_scopes
+        self.scopes = OrderedDict()  # scope -> (frozenset of keys, [futures]), least recently warmed first
+
+    def cached(self, name, artist):
+        return self.cache.get(video_key(name, artist))
+
+    def resolve(self, name, artist):
+        """
+        Video id for a track, from the cache when possible. Returns None if not found
+        or if the lookup failed (failures are not cached).
+        """
+        try:
+            return self.cache.get_or_load(video_key(name, artist), lambda: self.search_fn(name, artist))
+        except Exception as e:
+            incr('http_errors', kind='youtube')
+            print(f"YouTube Search Error: {e}")
+            return None
+
+    def _warm_one(self, name, artist):
+        if self.cache.get(video_key(name, artist)) is None:
+            self.resolve(name, artist)
+
+    def warm(self, scope, songs):
+        """
+        Queue background lookups for `songs` (dicts with name/artist) under `scope`.
+        Re-warming the same set of songs is a no-op.
+        """
+        keys = frozenset(video_key(s.get('name'), s.get('artist')) for s in songs)
+        with self.lock:
+            previous = self.scopes.get(scope)
+            if previous is not None and previous[0] == keys:
+                self.scopes.move_to_end(scope)
+                return
+            if previous is not None:
+                for future in previous[1]:
+                    future.cancel()
+            futures = [self.pool.submit(self._warm_one, s.get('name'), s.get('artist'))
+                       for s in songs if s.get('name')]
+            self.scopes[scope] = (keys, futures)
+            self.scopes.move_to_end(scope)
+            while len(self.scopes) > self.max_scopes:
+                for future in self.scopes.popitem(last=False)[1][1]:
+                    future.cancel()
+
+    def cancel(self, scope):
+        """
+        Cancel the queued lookups of `scope` and of its sub-scopes ('<scope>:<grid>'),
+        and forget them.
+        """
+        with self.lock:
+            names = [name for name in self.scopes if name == scope or name.startswith(f"{scope}:")]
+            removed = [self.scopes.pop(name) for name in names]
+        for _, futures in removed:
+            for future in futures:
+                future.cancel()
+
+
+class SessionScope:
+    """
+    Prefetch scope of one app session, kept in its session state. When Streamlit
+    drops the session (a while after the browser disconnects) this object is garbage
+    collected, and whatever the session still had queued on `resolver` is cancelled.
+    """
+
+    def __init__(self, resolver):
+        self.name = uuid.uuid4().hex
+        weakref.finalize(self, resolver.cancel, self.name)